@@ -0,0 +1,290 @@
+"""Asyncio database module.
+
+Async counterpart of atlas_db.context and atlas_db.helpers, for asyncio
+services that would otherwise run every query in a thread executor::
+
+    async with AsyncDbQueryContext() as db:
+        project = await db.scalar(select(Project).where(Project.code == "P"))
+
+    project = await get_project("P")
+
+Sqlite databases are reached with aiosqlite driver, an optional dependency
+only needed by this module. Engines are created once by database path and
+must be used from a single event loop, call dispose_engines before closing it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from atlas_db import context
+from atlas_db import migrations
+from atlas_db.errors import MissingDbAssetError
+from atlas_db.errors import MissingDbProjectError
+from atlas_db.errors import MissingDbPublishError
+from atlas_db.errors import MissingDbTaskError
+from atlas_db.helpers import add_publish
+from atlas_db.models import Asset
+from atlas_db.models import AssetType
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishType
+from atlas_db.models import Task
+from atlas_db.models import TaskType
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy.ext.asyncio import AsyncEngine
+    from sqlalchemy.ext.asyncio import AsyncSession
+
+
+_engine_by_url: dict[str, AsyncEngine] = {}
+# Serializes engine creation, replaced by dispose_engines with the event loop.
+_engine_lock = asyncio.Lock()
+
+
+def is_available() -> bool:
+    """Return True if aiosqlite driver is installed."""
+    return importlib.util.find_spec("aiosqlite") is not None
+
+
+def _async_url(url: str) -> str:
+    """Return aiosqlite url of given sqlite url."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite":
+        msg = f"Async contexts only support sqlite databases, not {parsed!r}."
+        raise ValueError(msg)
+    return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+
+
+async def get_engine(read_only: bool = False) -> AsyncEngine:
+    """Return async engine of database, or of snapshot file if read_only and set.
+
+    Database schema is created or migrated when its engine is created, the
+    engine is only shared once its upgrade succeeded.
+    """
+    if not is_available():
+        msg = "atlas_db.aio needs aiosqlite, install it with: pip install aiosqlite"
+        raise ImportError(msg)
+
+    snapshot_path = context.get_snapshot_path() if read_only else None
+    if snapshot_path is not None:
+        url = f"sqlite+aiosqlite:///file:{snapshot_path}?mode=ro&immutable=1&uri=true"
+    else:
+        url = _async_url(context.get_db_path())
+
+    engine = _engine_by_url.get(url)
+    if engine is not None:
+        return engine
+
+    async with _engine_lock:
+        engine = _engine_by_url.get(url)
+        if engine is None:
+            engine = create_async_engine(url)
+            if snapshot_path is None:
+                try:
+                    async with engine.begin() as connection:
+                        await connection.run_sync(migrations.upgrade)
+                except BaseException:
+                    await engine.dispose()
+                    raise
+            _engine_by_url[url] = engine
+
+    return engine
+
+
+async def dispose_engines():
+    """Close every async engine connection."""
+    global _engine_lock
+    engines = list(_engine_by_url.values())
+    _engine_by_url.clear()
+    _engine_lock = asyncio.Lock()
+    for engine in engines:
+        await engine.dispose()
+
+
+class AsyncDbCommitContext:
+    """Async database commit context.
+
+    Changes are committed on exit, or rolled back if an exception is raised.
+    Loaded objects are not expired on commit.
+    """
+
+    def __init__(self):
+        self._session: AsyncSession | None = None
+
+    async def __aenter__(self) -> AsyncSession:
+        session_factory = async_sessionmaker(await get_engine(), expire_on_commit=False)
+        self._session = session_factory()
+        return self._session
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                await self._session.commit()
+            else:
+                await self._session.rollback()
+        finally:
+            await self._session.close()
+
+
+class AsyncDbQueryContext:
+    """Async database query context.
+
+    Served from snapshot file when one is set (see context.set_snapshot_path),
+    if read_only or opened in a context.read_only block.
+    """
+
+    def __init__(self, read_only: bool = False):
+        self._read_only = read_only
+        self._session: AsyncSession | None = None
+
+    async def __aenter__(self) -> AsyncSession:
+        session_factory = async_sessionmaker(
+            await get_engine(read_only=self._read_only or context.is_read_only()),
+            expire_on_commit=False,
+        )
+        self._session = session_factory()
+        return self._session
+
+    async def __aexit__(self, *args, **kwargs):
+        await self._session.close()
+
+
+async def get_project(code: str, include_inactive: bool = False) -> Project:
+    """Get project by code."""
+    statement = select(Project).where(Project.code == code)
+    if not include_inactive:
+        statement = statement.where(Project.active)
+    async with AsyncDbQueryContext() as db:
+        project = await db.scalar(statement)
+    if project is None:
+        msg = f"Project {code!r} does not exist."
+        raise MissingDbProjectError(msg)
+    return project
+
+
+async def get_asset(
+    project_code: str,
+    code: str,
+    asset_type_code: str,
+    include_inactive: bool = False,
+) -> Asset:
+    """Get asset by project, asset and asset type codes."""
+    statement = (
+        select(Asset)
+        .join(Project)
+        .join(AssetType)
+        .where(
+            Project.code == project_code,
+            Asset.code == code,
+            AssetType.code == asset_type_code,
+        )
+    )
+    if not include_inactive:
+        statement = statement.where(Asset.active)
+    async with AsyncDbQueryContext() as db:
+        asset = await db.scalar(statement)
+    if asset is None:
+        msg = f"Asset {code!r} ({asset_type_code}) does not exist in {project_code!r}."
+        raise MissingDbAssetError(msg)
+    return asset
+
+
+async def get_assets(
+    project_code: str,
+    assets: Iterable[tuple[str, str]],
+    include_inactive: bool = False,
+) -> dict[tuple[str, str], Asset]:
+    """Get assets by (asset code, asset type code) pairs, with a single query.
+
+    Missing assets are not in returned dict.
+    """
+    keys = list(assets)
+    if not keys:
+        return {}
+    statement = (
+        select(Asset, AssetType.code)
+        .join(Project)
+        .join(AssetType)
+        .where(
+            Project.code == project_code,
+            tuple_(Asset.code, AssetType.code).in_(keys),
+        )
+    )
+    if not include_inactive:
+        statement = statement.where(Asset.active)
+    async with AsyncDbQueryContext() as db:
+        rows = (await db.execute(statement)).all()
+    return {(asset.code, asset_type_code): asset for asset, asset_type_code in rows}
+
+
+async def get_task(
+    asset_id: int, task_type_code: str, include_inactive: bool = False
+) -> Task:
+    """Get task of asset by task type code."""
+    statement = (
+        select(Task)
+        .join(TaskType)
+        .where(Task.asset_id == asset_id, TaskType.code == task_type_code)
+    )
+    if not include_inactive:
+        statement = statement.where(Task.active)
+    async with AsyncDbQueryContext() as db:
+        task = await db.scalar(statement)
+    if task is None:
+        msg = f"Task {task_type_code!r} of asset {asset_id} does not exist."
+        raise MissingDbTaskError(msg)
+    return task
+
+
+async def get_latest_publish(
+    task_id: int, publish_type_code: str, include_inactive: bool = False
+) -> Publish:
+    """Get last version publish of task by publish type code."""
+    statement = (
+        select(Publish)
+        .join(PublishType)
+        .where(Publish.task_id == task_id, PublishType.code == publish_type_code)
+        .order_by(Publish.version.desc())
+        .limit(1)
+    )
+    if not include_inactive:
+        statement = statement.where(Publish.active)
+    async with AsyncDbQueryContext() as db:
+        publish = await db.scalar(statement)
+    if publish is None:
+        msg = f"Task {task_id} has no {publish_type_code!r} publish."
+        raise MissingDbPublishError(msg)
+    return publish
+
+
+async def register_publish(
+    task_id: int,
+    publish_type_code: str,
+    path: str,
+    size: int,
+    release: str,
+    code: str | None = None,
+) -> Publish:
+    """Add next version publish of task and publish type, return it.
+
+    See helpers.add_publish.
+    """
+    async with AsyncDbCommitContext() as db:
+        publish = await db.run_sync(
+            add_publish, task_id, publish_type_code, path, size, release, code
+        )
+
+    return publish
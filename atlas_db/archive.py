@@ -0,0 +1,267 @@
+"""Publish archive module.
+
+Move superseded and inactive publishes out of publish table into
+publish_archive table, so hot publish queries, path unique checks and task
+scans only walk recent data::
+
+    archive_publishes(RetentionPolicy(keep_versions=3, min_age_days=90))
+
+Archived publishes are only returned by lookups called with
+include_archive=True, and can be moved back with restore_publishes. Their
+ids, paths and versions stay reserved, new publishes never reuse them.
+Their dependency edges are moved to publish_dependency_archive table, and
+back once both ends are restored. Their files are not touched, storage_stats
+and the rollup only count publish table.
+"""
+
+from __future__ import annotations
+
+import array
+
+from datetime import UTC
+from datetime import datetime
+from datetime import timedelta
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from sqlalchemy import and_
+from sqlalchemy import delete
+from sqlalchemy import exists
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from atlas_db.changes import log_bulk_changes
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.errors import DbPublishAlreadyExistError
+from atlas_db.models import CHANGE_DELETE
+from atlas_db.models import CHANGE_INSERT
+from atlas_db.models import Publish
+from atlas_db.models import PublishArchive
+from atlas_db.models import PublishDependency
+from atlas_db.models import PublishDependencyArchive
+from atlas_db.stats import apply_rollup_delta
+from atlas_db.stats import publish_rollup_deltas
+
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from sqlalchemy import ScalarSelect
+    from sqlalchemy.orm import Session
+
+
+BATCH_SIZE = 5000
+
+# Columns shared by publish and publish archive tables.
+_COLUMNS = [column.key for column in Publish.__table__.columns]
+
+
+class RetentionPolicy(NamedTuple):
+    """Publishes kept in publish table.
+
+    Publishes younger than min_age_days are always kept. Older ones are
+    archived when they are not one of the keep_versions last versions of their
+    version stream, or when they are inactive and archive_inactive.
+    """
+
+    keep_versions: int = 3
+    min_age_days: float = 90.0
+    archive_inactive: bool = True
+
+
+def archive_candidates(policy: RetentionPolicy) -> array.array:
+    """Return ids of publishes to archive with given policy."""
+    cutoff = datetime.now(tz=UTC) - timedelta(days=policy.min_age_days)
+    ranked = select(
+        Publish.id,
+        Publish.active,
+        Publish.created_at,
+        func.row_number()
+        .over(
+            partition_by=Publish.version_stream(),
+            order_by=Publish.version.desc(),
+        )
+        .label("rank"),
+    ).subquery()
+
+    superseded = ranked.c.rank > policy.keep_versions
+    if policy.archive_inactive:
+        superseded = or_(superseded, ~ranked.c.active)
+
+    with DbQueryContext() as db:
+        ids = array.array(
+            "q",
+            db.scalars(
+                select(ranked.c.id)
+                .where(ranked.c.created_at < cutoff, superseded)
+                .order_by(ranked.c.id)
+            ),
+        )
+    return ids
+
+
+def next_version(task_id: int, publish_type_id: int) -> ScalarSelect:
+    """Return next version of task and publish type, archived versions included."""
+    return (
+        func.max(
+            *(
+                select(func.coalesce(func.max(model.version), 0))
+                .where(model.task_id == task_id, model.publish_type_id == publish_type_id)
+                .scalar_subquery()
+                for model in (Publish, PublishArchive)
+            )
+        )
+        + 1
+    )
+
+
+def check_path_available(db: Session, path: str):
+    """Raise DbPublishAlreadyExistError if a publish, archived or not, uses path."""
+    for model in (Publish, PublishArchive):
+        if db.scalar(select(model.id).where(model.path == path)) is not None:
+            msg = f"Publish path {path!r} already exists."
+            raise DbPublishAlreadyExistError(msg)
+
+
+def _move_dependencies(db: Session, ids: Sequence[int], archive: bool):
+    """Move dependency edges of moved publishes of given ids along with them.
+
+    Archived edges are restored once both their publishes are in publish table.
+    """
+    if archive:
+        source, target = PublishDependency, PublishDependencyArchive
+        moved = or_(source.publish_id.in_(ids), source.dependency_id.in_(ids))
+    else:
+        source, target = PublishDependencyArchive, PublishDependency
+        restored = select(Publish.id)
+        moved = and_(
+            or_(source.publish_id.in_(ids), source.dependency_id.in_(ids)),
+            source.publish_id.in_(restored),
+            source.dependency_id.in_(restored),
+        )
+    publish_ids = db.scalars(select(source.publish_id).where(moved).distinct()).all()
+    if not publish_ids:
+        return
+    db.execute(
+        sqlite_insert(target)
+        .from_select(
+            ["publish_id", "dependency_id"],
+            select(source.publish_id, source.dependency_id).where(moved),
+        )
+        .on_conflict_do_nothing()
+    )
+    db.execute(delete(source).where(moved).execution_options(synchronize_session=False))
+    log_bulk_changes(
+        db, PublishDependency, publish_ids, CHANGE_DELETE if archive else CHANGE_INSERT
+    )
+
+
+def _move(
+    source: type[Publish | PublishArchive],
+    target: type[Publish | PublishArchive],
+    ids: Sequence[int],
+) -> int:
+    """Move publishes of given ids from source table to target table, return count.
+
+    Archived publishes whose path or id is used by a publish again are not
+    moved. Dependency edges of publishes follow them in the same transaction.
+    """
+    with DbCommitContext() as db:
+        if target is Publish:
+            ids = db.scalars(
+                select(PublishArchive.id).where(
+                    PublishArchive.id.in_(ids),
+                    ~exists().where(
+                        or_(
+                            Publish.path == PublishArchive.path,
+                            Publish.id == PublishArchive.id,
+                        )
+                    ),
+                )
+            ).all()
+        deltas = publish_rollup_deltas(db, source, ids, -1 if source is Publish else 1)
+        db.execute(
+            insert(target).from_select(
+                _COLUMNS,
+                select(*(getattr(source, name) for name in _COLUMNS)).where(
+                    source.id.in_(ids)
+                ),
+            )
+        )
+        db.execute(
+            delete(source)
+            .where(source.id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        _move_dependencies(db, ids, archive=target is PublishArchive)
+        log_bulk_changes(
+            db, Publish, ids, CHANGE_DELETE if target is PublishArchive else CHANGE_INSERT
+        )
+        apply_rollup_delta(db, deltas)
+    return len(ids)
+
+
+def archive_publishes(
+    policy: RetentionPolicy | None = None, batch_size: int = BATCH_SIZE
+) -> int:
+    """Move publishes past retention policy to archive, return archived count.
+
+    Candidates are selected once, then moved by batches of batch_size in their
+    own transaction, so writers are never locked out for long and an
+    interrupted run keeps already archived batches.
+    """
+    ids = archive_candidates(policy or RetentionPolicy())
+    for start in range(0, len(ids), batch_size):
+        _move(Publish, PublishArchive, ids[start : start + batch_size].tolist())
+    return len(ids)
+
+
+def restore_publishes(ids: Sequence[int], batch_size: int = BATCH_SIZE) -> int:
+    """Move archived publishes of given ids back to publish table, return count.
+
+    Archived publishes whose path or id was used again are skipped.
+    """
+    ids = list(ids)
+    return sum(
+        _move(PublishArchive, Publish, ids[start : start + batch_size])
+        for start in range(0, len(ids), batch_size)
+    )
+
+
+def publish_by_path(
+    path: str, include_archive: bool = False
+) -> Publish | PublishArchive | None:
+    """Return publish of given path, searched in archive only if include_archive."""
+    with DbQueryContext() as db:
+        db.expire_on_commit = False
+        publish = db.scalar(select(Publish).where(Publish.path == path))
+        if publish is None and include_archive:
+            publish = db.scalar(select(PublishArchive).where(PublishArchive.path == path))
+    return publish
+
+
+def task_publishes(
+    task_id: int, publish_type_id: int | None = None, include_archive: bool = False
+) -> list[Publish | PublishArchive]:
+    """Return task publishes sorted by version, with archived ones if include_archive."""
+    models = (Publish, PublishArchive) if include_archive else (Publish,)
+    publishes = []
+    with DbQueryContext() as db:
+        db.expire_on_commit = False
+        for model in models:
+            statement = select(model).where(model.task_id == task_id)
+            if publish_type_id is not None:
+                statement = statement.where(model.publish_type_id == publish_type_id)
+            publishes.extend(db.scalars(statement))
+    publishes.sort(key=lambda publish: (publish.publish_type_id, publish.version))
+    return publishes
+
+
+def archive_count() -> int:
+    """Return archived publish count."""
+    with DbQueryContext() as db:
+        return db.scalar(select(func.count(PublishArchive.id)))
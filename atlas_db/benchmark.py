@@ -0,0 +1,702 @@
+"""Database benchmark module.
+
+Generate a synthetic show in a temporary database and time atlas_db hot
+paths on it. Results are written as json and can be compared across runs::
+
+    python -m atlas_db.benchmark --assets 2000 --output before.json
+    python -m atlas_db.benchmark --assets 2000 --output after.json
+    python -m atlas_db.benchmark --compare before.json after.json
+
+Write stress runs many producer processes registering publishes at once,
+directly then through a single writer (see atlas_db.writer)::
+
+    python -m atlas_db.benchmark --only get_project --write-stress --producers 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from collections import defaultdict
+from datetime import UTC
+from datetime import datetime
+from typing import TYPE_CHECKING
+from typing import Any
+
+import sqlalchemy
+
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from atlas_db import aio
+from atlas_db import archive
+from atlas_db import context
+from atlas_db import dependencies
+from atlas_db import helpers
+from atlas_db import paging
+from atlas_db import path_index
+from atlas_db import writer
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Asset
+from atlas_db.models import AssetType
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishType
+from atlas_db.models import Task
+from atlas_db.models import TaskType
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from atlas_db.models import Base
+
+
+DEFAULT_SCALE = {
+    "projects": 2,
+    "asset_types": 5,
+    "assets": 500,  # By project.
+    "task_types": 5,
+    "publish_types": 2,
+    "versions": 5,  # By task and publish type.
+}
+DEFAULT_REPEAT = 50
+BULK_SIZE = 100  # Assets created by bulk insert benchmark run.
+CONCURRENT_REQUESTS = 64  # Lookups run concurrently by asyncio benchmarks.
+INSERT_CHUNK_SIZE = 10000
+DEPENDENCIES_BY_PUBLISH = 3  # Dependencies of each publish in dependency graph.
+PAGE_SIZE = 100  # Entities by page of paging benchmarks.
+STRESS_PRODUCERS = 64  # Processes writing concurrently in write stress.
+STRESS_WRITES = 50  # Publishes registered by each write stress producer.
+
+# Benchmark name: factory returning the timed callable from generated show data.
+BENCHMARKS: dict[str, Callable[[dict[str, Any]], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str):
+    """Register decorated factory as named benchmark."""
+
+    def decorator(factory: Callable[[dict[str, Any]], Callable[[], Any]]):
+        BENCHMARKS[name] = factory
+        return factory
+
+    return decorator
+
+
+def _code(index: int) -> str:
+    """Return a lowercase letters code from index, matching entity code patterns."""
+    letters = ""
+    index += 26 * 26
+    while index:
+        index, rest = divmod(index, 26)
+        letters = chr(ord("a") + rest) + letters
+    return letters
+
+
+def generate_show(scale: dict[str, int]) -> dict[str, Any]:
+    """Fill current database with a synthetic show of given scale.
+
+    Return generated entity codes, used by benchmarks to pick entities.
+    """
+    project_codes = [f"P{index}" for index in range(scale["projects"])]
+    asset_type_codes = [_code(index)[-3:] for index in range(scale["asset_types"])]
+    task_type_codes = [_code(index) for index in range(scale["task_types"])]
+    publish_type_codes = [
+        f"pub{_code(index).capitalize()}" for index in range(scale["publish_types"])
+    ]
+
+    with DbCommitContext() as db:
+        db.add_all(
+            [Project(code, code.lower(), {}) for code in project_codes]
+            + [AssetType(code, code) for code in asset_type_codes]
+            + [TaskType(code, code) for code in task_type_codes]
+            + [PublishType(code, code, ".bin") for code in publish_type_codes]
+        )
+
+    for asset_type_code in asset_type_codes:
+        helpers.set_task_templates(asset_type_code, task_type_codes)
+
+    asset_codes = [f"asset_{index:06d}" for index in range(scale["assets"])]
+    for project_code in project_codes:
+        helpers.create_assets(
+            project_code,
+            [
+                (code, asset_type_codes[index % len(asset_type_codes)])
+                for index, code in enumerate(asset_codes)
+            ],
+        )
+
+    with DbQueryContext() as db:
+        task_ids = db.scalars(select(Task.id)).all()
+        publish_type_ids = db.scalars(select(PublishType.id)).all()
+
+    rows = (
+        {
+            "code": "bench",
+            "path": f"/show/{task_id}/{publish_type_id}/v{version:03d}.bin",
+            "version": version,
+            "release": "bench",
+            "size": random.randint(1, 1 << 30),
+            "publish_type_id": publish_type_id,
+            "task_id": task_id,
+        }
+        for task_id in task_ids
+        for publish_type_id in publish_type_ids
+        for version in range(1, scale["versions"] + 1)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == INSERT_CHUNK_SIZE:
+            with DbCommitContext() as db:
+                db.execute(insert(Publish), chunk)
+            chunk = []
+    if chunk:
+        with DbCommitContext() as db:
+            db.execute(insert(Publish), chunk)
+
+    return {
+        "scale": scale,
+        "project_codes": project_codes,
+        "asset_type_codes": asset_type_codes,
+        "asset_codes": asset_codes,
+        "task_type_codes": task_type_codes,
+        "publish_type_codes": publish_type_codes,
+    }
+
+
+def _pick_asset(show: dict[str, Any]) -> tuple[Project, str, AssetType]:
+    """Return a random project, asset code and asset type from show."""
+    project = helpers.get_project(random.choice(show["project_codes"]))
+    index = random.randrange(len(show["asset_codes"]))
+    asset_type_codes = show["asset_type_codes"]
+    asset_type = helpers.get_asset_type(asset_type_codes[index % len(asset_type_codes)])
+    return project, show["asset_codes"][index], asset_type
+
+
+@benchmark("get_project")
+def _bench_get_project(show: dict[str, Any]) -> Callable[[], Any]:
+    return lambda: helpers.get_project(random.choice(show["project_codes"]))
+
+
+@benchmark("project_get_asset")
+def _bench_get_asset(show: dict[str, Any]) -> Callable[[], Any]:
+    project, asset_code, asset_type = _pick_asset(show)
+    return lambda: project.get_asset(asset_code, asset_type)
+
+
+@benchmark("asset_get_task")
+def _bench_get_task(show: dict[str, Any]) -> Callable[[], Any]:
+    project, asset_code, asset_type = _pick_asset(show)
+    asset = project.get_asset(asset_code, asset_type)
+    task_type = helpers.get_task_type(random.choice(show["task_type_codes"]))
+    return lambda: asset.get_task(task_type)
+
+
+@benchmark("task_latest_publish")
+def _bench_latest_publish(show: dict[str, Any]) -> Callable[[], Any]:
+    project, asset_code, asset_type = _pick_asset(show)
+    asset = project.get_asset(asset_code, asset_type)
+    task = asset.get_task(helpers.get_task_type(show["task_type_codes"][0]))
+    publish_type = helpers.entity_by_code(PublishType, show["publish_type_codes"][0])
+    return lambda: task.get_latest_publish(publish_type)
+
+
+@benchmark("bulk_create_assets")
+def _bench_bulk_insert(show: dict[str, Any]) -> Callable[[], Any]:
+    counter = iter(range(sys.maxsize))
+
+    def _create():
+        run = next(counter)
+        helpers.create_assets(
+            show["project_codes"][0],
+            [
+                (f"bulk_{run:06d}_{index:04d}", show["asset_type_codes"][0])
+                for index in range(BULK_SIZE)
+            ],
+        )
+
+    return _create
+
+
+@benchmark("entity_tree_query")
+def _bench_entity_tree_query(_show: dict[str, Any]) -> Callable[[], Any]:
+    def _load():
+        # Same query as atlas_db_ui EntityTreeModel for tasks.
+        with DbQueryContext() as db:
+            return (
+                db.query(Task, Asset.code, TaskType.name, Task.active)
+                .select_from(Task)
+                .join(Asset)
+                .join(TaskType)
+                .all()
+            )
+
+    return _load
+
+
+def _random_publish_path() -> str:
+    """Return path of a random generated publish."""
+    with DbQueryContext() as db:
+        count = db.query(Publish).count()
+        return db.scalar(select(Publish.path).offset(random.randrange(count)).limit(1))
+
+
+@benchmark("publish_path_query")
+def _bench_publish_path_query(_show: dict[str, Any]) -> Callable[[], Any]:
+    path = _random_publish_path()
+
+    def _query():
+        with DbQueryContext() as db:
+            return db.execute(
+                select(Publish.id, Publish.version, Publish.size).where(
+                    Publish.path == path
+                )
+            ).first()
+
+    return _query
+
+
+@benchmark("publish_path_index_lookup")
+def _bench_publish_path_index(show: dict[str, Any]) -> Callable[[], Any]:
+    path = _random_publish_path()
+    index_path = os.path.join(show["directory"], "publish_paths.idx")
+    path_index.build_index(index_path)
+    index = path_index.PublishPathIndex(index_path)
+    return lambda: index.lookup(path)
+
+
+def _pick_assets(show: dict[str, Any], count: int) -> list[tuple[str, str]]:
+    """Return count random (asset code, asset type code) pairs of show."""
+    asset_type_codes = show["asset_type_codes"]
+    indexes = [random.randrange(len(show["asset_codes"])) for _ in range(count)]
+    return [
+        (show["asset_codes"][index], asset_type_codes[index % len(asset_type_codes)])
+        for index in indexes
+    ]
+
+
+@benchmark("executor_concurrent_lookups")
+def _bench_executor_lookups(show: dict[str, Any]) -> Callable[[], Any]:
+    project = helpers.get_project(show["project_codes"][0])
+    asset_types = {
+        code: helpers.get_asset_type(code) for code in show["asset_type_codes"]
+    }
+    assets = _pick_assets(show, CONCURRENT_REQUESTS)
+    loop = asyncio.new_event_loop()
+
+    async def _lookups():
+        # Asyncio services calling sync api from the default executor.
+        return await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    None, project.get_asset, code, asset_types[asset_type_code]
+                )
+                for code, asset_type_code in assets
+            )
+        )
+
+    return lambda: loop.run_until_complete(_lookups())
+
+
+if aio.is_available():
+
+    @benchmark("async_concurrent_lookups")
+    def _bench_async_lookups(show: dict[str, Any]) -> Callable[[], Any]:
+        project_code = show["project_codes"][0]
+        assets = _pick_assets(show, CONCURRENT_REQUESTS)
+        loop = asyncio.new_event_loop()
+
+        async def _lookups():
+            return await asyncio.gather(
+                *(
+                    aio.get_asset(project_code, code, asset_type_code)
+                    for code, asset_type_code in assets
+                )
+            )
+
+        return lambda: loop.run_until_complete(_lookups())
+
+
+def _random_task_id() -> int:
+    """Return id of a random generated task."""
+    with DbQueryContext() as db:
+        count = db.query(Task).count()
+        return db.scalar(select(Task.id).offset(random.randrange(count)).limit(1))
+
+
+@benchmark("task_publishes_query")
+def _bench_task_publishes(_show: dict[str, Any]) -> Callable[[], Any]:
+    task_id = _random_task_id()
+    return lambda: archive.task_publishes(task_id)
+
+
+def _last_page_cursor(
+    model: type[Base], filters: dict[str, Any], order_by: str | None = None
+) -> str:
+    """Return cursor of the last page of model entities, found with an offset."""
+    sort_column = getattr(model, order_by or "id")
+    statement = select(sort_column, model.id).where(model.active)
+    for name, value in filters.items():
+        statement = statement.where(getattr(model, name) == value)
+    with DbQueryContext() as db:
+        count = db.scalar(
+            select(sqlalchemy.func.count()).select_from(statement.subquery())
+        )
+        value, key = db.execute(
+            statement.order_by(sort_column, model.id)
+            .offset(max(count - PAGE_SIZE - 1, 0))
+            .limit(1)
+        ).one()
+    return paging.encode_cursor(sort_column.key, False, value, key)
+
+
+@benchmark("publish_first_page_query")
+def _bench_publish_first_page(_show: dict[str, Any]) -> Callable[[], Any]:
+    return lambda: paging.page(Publish, limit=PAGE_SIZE)
+
+
+@benchmark("publish_last_page_query")
+def _bench_publish_last_page(_show: dict[str, Any]) -> Callable[[], Any]:
+    cursor = _last_page_cursor(Publish, {})
+    return lambda: paging.page(Publish, after=cursor, limit=PAGE_SIZE)
+
+
+@benchmark("project_asset_last_page_query")
+def _bench_project_asset_last_page(show: dict[str, Any]) -> Callable[[], Any]:
+    project = helpers.get_project(random.choice(show["project_codes"]))
+    filters = {"project_id": project.id}
+    cursor = _last_page_cursor(Asset, filters, "code")
+    return lambda: paging.page(
+        Asset, filters, after=cursor, limit=PAGE_SIZE, order_by="code"
+    )
+
+
+def _dependency_show(show: dict[str, Any]):
+    """Add a layered dependency graph to show publishes, once.
+
+    Publishes of each task type depend on random publishes of the previous task
+    type, like a rig on models and a lookdev on rigs.
+    """
+    if "publish_layers" in show:
+        return
+    with DbQueryContext() as db:
+        rows = db.execute(
+            select(Publish.id, Task.task_type_id).join(Task, Publish.task_id == Task.id)
+        ).all()
+    publish_ids_by_task_type = defaultdict(list)
+    for publish_id, task_type_id in rows:
+        publish_ids_by_task_type[task_type_id].append(publish_id)
+    layers = [publish_ids_by_task_type[key] for key in sorted(publish_ids_by_task_type)]
+
+    dependencies.add_dependencies(
+        (publish_id, random.choice(previous))
+        for previous, layer in itertools.pairwise(layers)
+        for publish_id in layer
+        for _ in range(DEPENDENCIES_BY_PUBLISH)
+    )
+    show["publish_layers"] = layers
+
+
+@benchmark("publish_upstream_query")
+def _bench_publish_upstream(show: dict[str, Any]) -> Callable[[], Any]:
+    _dependency_show(show)
+    publish_id = random.choice(show["publish_layers"][-1])
+    return lambda: dependencies.upstream(publish_id)
+
+
+@benchmark("publish_downstream_query")
+def _bench_publish_downstream(show: dict[str, Any]) -> Callable[[], Any]:
+    _dependency_show(show)
+    publish_id = random.choice(show["publish_layers"][0])
+    return lambda: dependencies.downstream(publish_id)
+
+
+@benchmark("publish_downstream_cached_query")
+def _bench_publish_downstream_cached(show: dict[str, Any]) -> Callable[[], Any]:
+    _dependency_show(show)
+    publish_id = random.choice(show["publish_layers"][0])
+    return lambda: dependencies.downstream(publish_id, cache=True)
+
+
+def _archive_show(show: dict[str, Any]):
+    """Archive all but last version of show publishes, once."""
+    if "archived" not in show:
+        show["archived"] = archive.archive_publishes(
+            archive.RetentionPolicy(keep_versions=1, min_age_days=0)
+        )
+
+
+# Registered after publish table benchmarks, they run on the archived show.
+@benchmark("archived_publish_path_query")
+def _bench_archived_publish_path_query(show: dict[str, Any]) -> Callable[[], Any]:
+    _archive_show(show)
+    return _bench_publish_path_query(show)
+
+
+@benchmark("archived_task_publishes_query")
+def _bench_archived_task_publishes(show: dict[str, Any]) -> Callable[[], Any]:
+    _archive_show(show)
+    return _bench_task_publishes(show)
+
+
+def _stress_producer(
+    db_path: str,
+    writer_address: str | None,
+    task_ids: list[int],
+    publish_type_code: str,
+    writes: int,
+    barrier,
+    results,
+):
+    """Register publishes as fast as possible, put (latencies, failures) in results."""
+    context.set_db_path(db_path)
+    if writer_address is None:
+        os.environ.pop(writer.WRITER_ADDRESS_ENV, None)
+    else:
+        os.environ[writer.WRITER_ADDRESS_ENV] = writer_address
+    mode = "direct" if writer_address is None else "writer"
+    context.get_engine()
+    barrier.wait()
+
+    latencies = []
+    failures = 0
+    for index in range(writes):
+        start = time.perf_counter()
+        try:
+            writer.register_publish(
+                random.choice(task_ids),
+                publish_type_code,
+                f"/stress/{mode}/{os.getpid()}/{index}.bin",
+                1,
+                "stress",
+            )
+        except Exception:  # noqa: BLE001
+            failures += 1
+        else:
+            latencies.append((time.perf_counter() - start) * 1000.0)
+    results.put((latencies, failures))
+
+
+def write_stress(
+    show: dict[str, Any],
+    producers: int = STRESS_PRODUCERS,
+    writes: int = STRESS_WRITES,
+    single_writer: bool = False,
+) -> dict[str, float]:
+    """Register publishes from producer processes at once, return throughput.
+
+    Producers write directly to the database, or through a writer service run
+    in this process with single_writer. Failed writes are the ones still
+    locked out after their retries.
+    """
+    with DbQueryContext() as db:
+        task_ids = db.scalars(select(Task.id).limit(1000)).all()
+
+    loop = service = thread = None
+    address = None
+    if single_writer:
+        address = f"unix:{os.path.join(show['directory'], 'writer.sock')}"
+        service = writer.WriterService(address)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        asyncio.run_coroutine_threadsafe(service.start(), loop).result()
+
+    # Spawned producers do not inherit this process database connections.
+    mp_context = multiprocessing.get_context("spawn")
+    barrier = mp_context.Barrier(producers + 1)
+    results = mp_context.Queue()
+    processes = [
+        mp_context.Process(
+            target=_stress_producer,
+            args=(
+                context.get_db_path(),
+                address,
+                task_ids,
+                show["publish_type_codes"][0],
+                writes,
+                barrier,
+                results,
+            ),
+        )
+        for _ in range(producers)
+    ]
+    try:
+        for process in processes:
+            process.start()
+        barrier.wait()
+        start = time.perf_counter()
+        outcomes = [results.get() for _ in processes]
+        elapsed = time.perf_counter() - start
+        for process in processes:
+            process.join()
+    finally:
+        if single_writer:
+            asyncio.run_coroutine_threadsafe(service.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    latencies = sorted(
+        latency for producer_latencies, _ in outcomes for latency in producer_latencies
+    )
+    failures = sum(failed for _, failed in outcomes)
+    result = {
+        "producers": producers,
+        "writes": len(latencies),
+        "failed": failures,
+        "total_s": elapsed,
+        "writes_per_s": len(latencies) / elapsed,
+    }
+    if latencies:
+        result.update(
+            median_ms=statistics.median(latencies),
+            p95_ms=latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+            max_ms=latencies[-1],
+        )
+    return result
+
+
+def time_operation(operation: Callable[[], Any], repeat: int) -> dict[str, float]:
+    """Run operation repeat times and return its timing statistics in ms."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append((time.perf_counter() - start) * 1000.0)
+
+    timings.sort()
+    return {
+        "runs": repeat,
+        "min_ms": timings[0],
+        "median_ms": statistics.median(timings),
+        "mean_ms": statistics.fmean(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max_ms": timings[-1],
+    }
+
+
+def run_benchmarks(
+    scale: dict[str, int] | None = None,
+    repeat: int = DEFAULT_REPEAT,
+    names: list[str] | None = None,
+    seed: int = 0,
+    producers: int = 0,
+) -> dict[str, Any]:
+    """Generate a show in a temporary database and run benchmarks on it.
+
+    Write stress is run last, in both modes, when producers is not 0.
+    """
+    scale = {**DEFAULT_SCALE, **(scale or {})}
+    random.seed(seed)
+    previous_db_path = context.get_db_path()
+    results: dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory(prefix="atlas_bench_") as directory:
+        context.set_db_path(f"sqlite:///{os.path.join(directory, 'bench.db')}")
+        try:
+            start = time.perf_counter()
+            show = generate_show(scale)
+            show["directory"] = directory
+            results["generate_show"] = {
+                "runs": 1,
+                "total_ms": (time.perf_counter() - start) * 1000.0,
+            }
+            for name in names or BENCHMARKS:
+                operation = BENCHMARKS[name](show)
+                results[name] = time_operation(operation, repeat)
+            if producers:
+                results["direct_write_stress"] = write_stress(show, producers)
+                results["writer_write_stress"] = write_stress(
+                    show, producers, single_writer=True
+                )
+        finally:
+            context.get_engine().dispose()
+            context.set_db_path(previous_db_path)
+
+    return {
+        "meta": {
+            "date": datetime.now(tz=UTC).isoformat(),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+            "scale": scale,
+            "repeat": repeat,
+            "seed": seed,
+            "producers": producers,
+        },
+        "results": results,
+    }
+
+
+def compare_results(old: dict[str, Any], new: dict[str, Any]) -> list[str]:
+    """Return one line by benchmark with old and new median and their ratio."""
+    lines = []
+    for name, new_stats in new["results"].items():
+        old_stats = old["results"].get(name)
+        if old_stats is None or "median_ms" not in new_stats:
+            continue
+        ratio = new_stats["median_ms"] / max(old_stats["median_ms"], 1e-9)
+        lines.append(
+            f"{name:<24} {old_stats['median_ms']:>10.3f} ms "
+            f"{new_stats['median_ms']:>10.3f} ms  x{ratio:.2f}"
+        )
+    return lines
+
+
+def main(argv: list[str] | None = None):
+    """Benchmark command line entry point."""
+    parser = argparse.ArgumentParser(description="Atlas database benchmark.")
+    for key, value in DEFAULT_SCALE.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=value)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument(
+        "--write-stress", action="store_true", help="Run write stress benchmarks."
+    )
+    parser.add_argument("--producers", type=int, default=STRESS_PRODUCERS)
+    parser.add_argument("--output", help="Json result file path, stdout if not set.")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files."
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as stream:
+            old = json.load(stream)
+        with open(args.compare[1], encoding="utf-8") as stream:
+            new = json.load(stream)
+        print("\n".join(compare_results(old, new)))
+        return
+
+    scale = {key: getattr(args, key) for key in DEFAULT_SCALE}
+    result = run_benchmarks(
+        scale,
+        args.repeat,
+        args.only,
+        producers=args.producers if args.write_stress else 0,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as stream:
+            json.dump(result, stream, indent=4)
+    else:
+        print(json.dumps(result, indent=4))
+
+
+if __name__ == "__main__":
+    main()
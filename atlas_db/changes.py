@@ -0,0 +1,88 @@
+"""Database change feed module."""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import select
+
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import ChangeLog
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy import Row
+    from sqlalchemy.orm import Session
+
+    from atlas_db.models import Base
+
+
+def last_sequence() -> int:
+    """Return last change sequence number, 0 if no change was logged."""
+    with DbQueryContext() as db:
+        sequence = db.scalar(select(func.max(ChangeLog.sequence)))
+
+    return sequence or 0
+
+
+def changes_since(
+    sequence: int,
+    entity_type: type[Base] | None = None,
+    limit: int | None = None,
+) -> list[Row]:
+    """Return changes logged after given sequence number, oldest first.
+
+    Rows hold sequence, entity_type (table name), entity_id and operation.
+    """
+    statement = (
+        select(
+            ChangeLog.sequence,
+            ChangeLog.entity_type,
+            ChangeLog.entity_id,
+            ChangeLog.operation,
+        )
+        .where(ChangeLog.sequence > sequence)
+        .order_by(ChangeLog.sequence)
+        .limit(limit)
+    )
+    if entity_type is not None:
+        statement = statement.where(ChangeLog.entity_type == entity_type.__tablename__)
+
+    with DbQueryContext() as db:
+        rows = db.execute(statement).all()
+
+    return rows
+
+
+def prune_changes(sequence: int) -> int:
+    """Delete changes logged up to given sequence number, return deleted count."""
+    with DbCommitContext() as db:
+        result = db.execute(delete(ChangeLog).where(ChangeLog.sequence <= sequence))
+
+    return result.rowcount
+
+
+def log_bulk_changes(
+    db: Session, entity_type: type[Base], ids: Iterable[int], operation: str
+):
+    """Log changes of entities written by bulk statements.
+
+    Bulk insert and update statements bypass the session flush, so their
+    changes must be logged explicitly, in the same transaction.
+    """
+    rows = [
+        {
+            "entity_type": entity_type.__tablename__,
+            "entity_id": entity_id,
+            "operation": operation,
+        }
+        for entity_id in ids
+    ]
+    if rows:
+        db.execute(insert(ChangeLog), rows)
@@ -2,42 +2,241 @@
 
 from __future__ import annotations
 
+import contextlib
+import functools
 import os
+import random
+import threading
+import time
+
+from contextvars import ContextVar
+from typing import TYPE_CHECKING
+from typing import Any
 
 from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 
-from atlas_db.models import Base
+from atlas_db import migrations
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Iterator
+
+    from sqlalchemy import Engine
+    from sqlalchemy.orm import Session
+    from sqlalchemy.orm import SessionTransaction
 
 
 _db_path = f"sqlite:///{os.path.dirname(__file__)}/test_alchemy.db"
+# Read only snapshot file served to read only query contexts, see atlas_db.snapshot.
+_snapshot_path: str | None = os.environ.get("ATLAS_DB_SNAPSHOT") or None
+# Query contexts opened in a read_only block are read only, per thread and task.
+_read_only: ContextVar[bool] = ContextVar("atlas_db_read_only", default=False)
+
+# Snapshot memory map size, whole catalog is usually mapped.
+SNAPSHOT_MMAP_SIZE = 1 << 30
+
+# Default unit of work retry count and first backoff delay in seconds.
+LOCKED_RETRIES = 5
+LOCKED_BACKOFF = 0.05
+
+_engine_by_path: dict[str, Engine] = {}
+_snapshot_engine_by_path: dict[str, Engine] = {}
+_engine_lock = threading.Lock()
+_local = threading.local()
+
+
+def _on_connect(dbapi_connection, _connection_record):
+    """Disable pysqlite transaction handling, broken with savepoints."""
+    dbapi_connection.isolation_level = None
+
+
+def _on_begin(connection):
+    """Emit BEGIN ourselves as pysqlite does not anymore."""
+    connection.exec_driver_sql("BEGIN")
+
+
+def get_db_path() -> str:
+    """Return database url used by contexts."""
+    return _db_path
+
+
+def set_db_path(path: str):
+    """Set database url used by next contexts, like "sqlite:///path/atlas.db"."""
+    global _db_path
+    _db_path = path
+
+
+def get_snapshot_path() -> str | None:
+    """Return snapshot file path served to read only query contexts, if any."""
+    return _snapshot_path
+
+
+def set_snapshot_path(path: str | None):
+    """Serve read only query contexts from given snapshot file, or database if None.
+
+    Other query contexts and commit contexts always use the database.
+    """
+    global _snapshot_path
+    _snapshot_path = path
+
+
+def is_read_only() -> bool:
+    """Return True if called in a read_only block."""
+    return _read_only.get()
+
+
+@contextlib.contextmanager
+def read_only() -> Iterator[None]:
+    """Make query contexts opened in block read only, served from snapshot if set.
+
+    Snapshot can be older than the database: reads deciding what to write, like
+    duplicate checks or change polling, must not be made in this block.
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def _on_snapshot_connect(dbapi_connection, _connection_record):
+    """Memory map snapshot file and forbid writes."""
+    dbapi_connection.execute(f"PRAGMA mmap_size={SNAPSHOT_MMAP_SIZE}")
+    dbapi_connection.execute("PRAGMA query_only=1")
+
+
+def get_snapshot_engine(path: str) -> Engine:
+    """Return read only engine of given snapshot file, created once by path."""
+    with _engine_lock:
+        engine = _snapshot_engine_by_path.get(path)
+        if engine is None:
+            # Snapshot is never modified in place, it's replaced by a new file.
+            engine = create_engine(f"sqlite:///file:{path}?mode=ro&immutable=1&uri=true")
+            event.listen(engine, "connect", _on_snapshot_connect)
+            _snapshot_engine_by_path[path] = engine
+
+    return engine
+
+
+def get_engine() -> Engine:
+    """Return database engine, created once by database path."""
+    with _engine_lock:
+        engine = _engine_by_path.get(_db_path)
+        if engine is None:
+            engine = create_engine(_db_path)
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _on_connect)
+                event.listen(engine, "begin", _on_begin)
+            _upgrade_schema(engine)
+            _engine_by_path[_db_path] = engine
+
+    return engine
+
+
+def _upgrade_schema(
+    engine: Engine, retries: int = LOCKED_RETRIES, backoff: float = LOCKED_BACKOFF
+):
+    """Create or migrate engine database schema, see atlas_db.migrations.
+
+    Processes starting together race for the write lock, losers retry and
+    find the schema already upgraded.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with engine.begin() as connection:
+                migrations.upgrade(connection)
+        except OperationalError as error:
+            if attempt == retries or not is_locked_error(error):
+                raise
+        else:
+            return
+        time.sleep(backoff * 2**attempt * random.uniform(1.0, 1.5))
+
+
+def _session_stack() -> list[Session]:
+    """Return current thread commit session stack."""
+    if not hasattr(_local, "sessions"):
+        _local.sessions = []
+    return _local.sessions
+
+
+def in_transaction() -> bool:
+    """Return True if a commit context is already opened in current thread."""
+    return bool(_session_stack())
+
+
+def is_locked_error(error: Exception) -> bool:
+    """Return True if error is a sqlite "database is locked" error."""
+    return isinstance(error, OperationalError) and "database is locked" in str(error)
 
 
 class Db:
     """Database Innit."""
 
-    def __init__(self):
-        engine = create_engine(_db_path)
-        self.Session = sessionmaker(engine)
-        Base.metadata.create_all(bind=engine)
+    def __init__(self, read_only: bool = False):
+        if read_only and _snapshot_path is not None:
+            self.Session = sessionmaker(get_snapshot_engine(_snapshot_path))
+        else:
+            self.Session = sessionmaker(get_engine())
         self._session = None
 
 
 class DbCommitContext(Db):
-    """Database add object context."""
+    """Database add object context.
+
+    Changes are committed on exit, or rolled back if an exception is raised.
+    A context opened inside another one in the same thread joins the outer
+    transaction through a savepoint: its changes are only committed with the
+    outer context, and an error only rolls back the inner savepoint.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._savepoint: SessionTransaction | None = None
 
     def __enter__(self):
+        sessions = _session_stack()
+        if sessions:
+            self._session = sessions[-1]
+            self._savepoint = self._session.begin_nested()
+            return self._session
+
         self._session = self.Session()
         self._session.expire_on_commit = False
+        sessions.append(self._session)
         return self._session
 
-    def __exit__(self, *args, **kwargs):
-        self._session.commit()
-        self._session.close()
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._savepoint is not None:
+            if exc_type is None:
+                self._savepoint.commit()
+            else:
+                self._savepoint.rollback()
+            return
+
+        try:
+            if exc_type is None:
+                self._session.commit()
+            else:
+                self._session.rollback()
+        finally:
+            _session_stack().pop()
+            self._session.close()
 
 
 class DbQueryContext(Db):
-    """Database add object context."""
+    """Database add object context.
+
+    Served from snapshot file when one is set (see set_snapshot_path), if
+    read_only or opened in a read_only block.
+    """
+
+    def __init__(self, read_only: bool = False):
+        super().__init__(read_only=read_only or is_read_only())
 
     def __enter__(self):
         self._session = self.Session()
@@ -45,3 +244,61 @@ class DbQueryContext(Db):
 
     def __exit__(self, *args, **kwargs):
         self._session.close()
+
+
+def run_in_transaction[T](
+    func: Callable[[Session], T],
+    retries: int = LOCKED_RETRIES,
+    backoff: float = LOCKED_BACKOFF,
+) -> T:
+    """Run func with a commit context session as single unit of work.
+
+    Whole unit is rolled back and run again, with exponential backoff, when
+    database is locked by another writer. Inside an already opened commit
+    context, func joins the outer transaction and retry is left to the outer
+    unit of work.
+    """
+    if in_transaction():
+        with DbCommitContext() as db:
+            return func(db)
+
+    for attempt in range(retries):
+        try:
+            with DbCommitContext() as db:
+                return func(db)
+        except OperationalError as error:
+            if not is_locked_error(error):
+                raise
+        time.sleep(backoff * 2**attempt * random.uniform(1.0, 1.5))
+
+    # Last attempt, its error is raised as is.
+    with DbCommitContext() as db:
+        return func(db)
+
+
+def unit_of_work[T](
+    retries: int = LOCKED_RETRIES, backoff: float = LOCKED_BACKOFF
+) -> Callable[[Callable[..., T]], Callable[..., T]]:
+    """Decorate function to run it as a single transaction.
+
+    Every commit context opened by the function, directly or through helpers,
+    joins this transaction, so it is committed once, rolled back as a whole on
+    error and retried when database is locked.
+
+    Query contexts are not part of it: a DbQueryContext opened inside the
+    function uses its own session and connection, and does not see writes of
+    the unit not committed yet. Read them from the commit context session.
+    """
+
+    def decorator(func: Callable[..., T]) -> Callable[..., T]:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> T:
+            return run_in_transaction(
+                lambda _db: func(*args, **kwargs),
+                retries=retries,
+                backoff=backoff,
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,335 @@
+"""Publish deduplication module.
+
+Find publishes with identical content and the storage they waste::
+
+    report = dedup_report("P")
+    for line in report.summary_lines():
+        print(line)
+
+Candidates are grouped by size in SQL first, only files sharing their size
+with another publish are hashed, in parallel, reusing checksums stored by
+atlas_db.verify when files did not change since. Colliding sizes are processed
+by chunks, so the publish table is never loaded at once. Archived publishes
+are not scanned.
+"""
+
+from __future__ import annotations
+
+import argparse
+import array
+import time
+
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from sqlalchemy import bindparam
+from sqlalchemy import func
+from sqlalchemy import or_
+from sqlalchemy import select
+from sqlalchemy import update
+
+from atlas_db.changes import log_bulk_changes
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import CHANGE_UPDATE
+from atlas_db.models import Asset
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import Task
+from atlas_db.verify import verify_row
+from atlas_db.verify import write_digests
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from collections.abc import Sequence
+
+    from sqlalchemy import Select
+
+
+BATCH_SIZE = 1000
+# Colliding sizes fetched by candidate query.
+SIZE_CHUNK_SIZE = 500
+# Smaller publishes are not worth deduplicating, empty files all match.
+MIN_SIZE = 1
+
+_CANONICAL_STATEMENT = (
+    update(Publish.__table__)
+    .where(Publish.__table__.c.id == bindparam("b_id"))
+    .values(canonical_id=bindparam("b_canonical_id"))
+)
+
+
+class DuplicateSet(NamedTuple):
+    """Publishes with identical content, canonical one (lowest id) first.
+
+    project_codes holds the project code of each publish of publish_ids.
+    """
+
+    size: int
+    checksum: str
+    publish_ids: tuple[int, ...]
+    project_codes: tuple[str, ...]
+
+    @property
+    def canonical_id(self) -> int:
+        """Return id of the publish other ones duplicate."""
+        return self.publish_ids[0]
+
+    @property
+    def reclaimable(self) -> int:
+        """Return bytes freed by keeping canonical publish file only."""
+        return self.size * (len(self.publish_ids) - 1)
+
+
+class DedupTotals:
+    """Duplicate set count, duplicate publish count and reclaimable bytes."""
+
+    __slots__ = ("sets", "duplicates", "reclaimable")
+
+    def __init__(self):
+        self.sets = 0
+        self.duplicates = 0
+        self.reclaimable = 0
+
+
+class DedupReport:
+    """Deduplication result, totals overall and by project.
+
+    Duplicates and reclaimable bytes are counted in the projects of the non
+    canonical publishes, a set is counted in every project it spans.
+    """
+
+    def __init__(self):
+        self.total = DedupTotals()
+        self.by_project: dict[str, DedupTotals] = defaultdict(DedupTotals)
+        self.elapsed = 0.0
+        # (publish id, path, error) of files that could not be read.
+        self.errors: list[tuple[int, str, str]] = []
+
+    def add(self, duplicate_set: DuplicateSet):
+        """Count duplicate set in totals."""
+        self.total.sets += 1
+        self.total.duplicates += len(duplicate_set.publish_ids) - 1
+        self.total.reclaimable += duplicate_set.reclaimable
+        for project_code in set(duplicate_set.project_codes):
+            self.by_project[project_code].sets += 1
+        for project_code in duplicate_set.project_codes[1:]:
+            totals = self.by_project[project_code]
+            totals.duplicates += 1
+            totals.reclaimable += duplicate_set.size
+
+    def summary_lines(self) -> list[str]:
+        """Return report lines, one by project then overall total."""
+        lines = [
+            f"{project_code:<16} {totals.sets:>8} sets {totals.duplicates:>8} "
+            f"duplicates {totals.reclaimable / 1e9:>10.3f} GB reclaimable"
+            for project_code, totals in sorted(self.by_project.items())
+        ]
+        lines.append(
+            f"{'total':<16} {self.total.sets:>8} sets {self.total.duplicates:>8} "
+            f"duplicates {self.total.reclaimable / 1e9:>10.3f} GB reclaimable, "
+            f"{len(self.errors)} errors in {self.elapsed:.3f} s"
+        )
+        return lines
+
+
+def _scoped(
+    statement: Select, project_code: str | None, include_inactive: bool
+) -> Select:
+    """Return publish statement joined to project and filtered by scope."""
+    statement = (
+        statement.join(Task, Publish.task_id == Task.id)
+        .join(Asset, Task.asset_id == Asset.id)
+        .join(Project, Asset.project_id == Project.id)
+    )
+    if project_code is not None:
+        statement = statement.where(Project.code == project_code)
+    if not include_inactive:
+        statement = statement.where(Publish.active)
+    return statement
+
+
+def colliding_sizes(
+    project_code: str | None = None,
+    include_inactive: bool = False,
+    min_size: int = MIN_SIZE,
+) -> array.array:
+    """Return sorted sizes shared by several publishes."""
+    statement = (
+        _scoped(select(Publish.size), project_code, include_inactive)
+        .where(Publish.size >= min_size)
+        .group_by(Publish.size)
+        .having(func.count(Publish.id) > 1)
+        .order_by(Publish.size)
+    )
+    with DbQueryContext() as db:
+        return array.array("q", db.scalars(statement))
+
+
+def _candidates(
+    sizes: Sequence[int], project_code: str | None, include_inactive: bool
+) -> list[tuple]:
+    """Return (id, path, size, mtime_ns, checksum, project code) of given sizes."""
+    statement = _scoped(
+        select(
+            Publish.id,
+            Publish.path,
+            Publish.size,
+            Publish.mtime_ns,
+            Publish.checksum,
+            Project.code,
+        ),
+        project_code,
+        include_inactive,
+    ).where(Publish.size.in_(sizes))
+    with DbQueryContext() as db:
+        return [tuple(row) for row in db.execute(statement)]
+
+
+def duplicate_sets(
+    project_code: str | None = None,
+    include_inactive: bool = False,
+    min_size: int = MIN_SIZE,
+    workers: int | None = None,
+    errors: list[tuple[int, str, str]] | None = None,
+) -> Iterator[DuplicateSet]:
+    """Yield sets of publishes with identical content, by increasing size.
+
+    Files sharing their size with another publish are hashed by workers
+    threads, unless their stored checksum is still valid. New checksums are
+    stored as atlas_db.verify does. Unreadable files are skipped and appended
+    to errors as (publish id, path, error) when given.
+    """
+    sizes = colliding_sizes(project_code, include_inactive, min_size)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(sizes), SIZE_CHUNK_SIZE):
+            rows = _candidates(
+                sizes[start : start + SIZE_CHUNK_SIZE].tolist(),
+                project_code,
+                include_inactive,
+            )
+            digests = executor.map(verify_row, (row[:5] for row in rows), repeat(True))
+
+            # (publish id, project code) by (size, checksum).
+            copies_by_content = defaultdict(list)
+            changed = []
+            for row, digest in zip(rows, digests, strict=True):
+                publish_id, path, size, mtime_ns, checksum, code = row
+                if digest is not None:
+                    if digest.error is not None:
+                        if errors is not None:
+                            errors.append((publish_id, path, digest.error))
+                        continue
+                    if (digest.size, digest.mtime_ns, digest.checksum) != (
+                        size,
+                        mtime_ns,
+                        checksum,
+                    ):
+                        changed.append(digest)
+                    size, checksum = digest.size, digest.checksum
+                copies_by_content[size, checksum].append((publish_id, code))
+
+            if changed:
+                write_digests(changed)
+
+            for (size, checksum), copies in sorted(copies_by_content.items()):
+                if len(copies) > 1:
+                    copies.sort()
+                    publish_ids, project_codes = zip(*copies, strict=True)
+                    yield DuplicateSet(size, checksum, publish_ids, project_codes)
+
+
+def _clear_canonical(project_code: str | None, include_inactive: bool):
+    """Reset canonical id of publishes in scope, or referencing publishes in scope."""
+    scope = _scoped(select(Publish.id), project_code, include_inactive)
+    with DbCommitContext() as db:
+        ids = db.scalars(
+            update(Publish)
+            .where(
+                Publish.canonical_id.is_not(None),
+                or_(Publish.id.in_(scope), Publish.canonical_id.in_(scope)),
+            )
+            .values(canonical_id=None)
+            .returning(Publish.id)
+            .execution_options(synchronize_session=False)
+        ).all()
+        log_bulk_changes(db, Publish, ids, CHANGE_UPDATE)
+
+
+def _write_canonical(rows: list[dict[str, int]]):
+    """Store canonical ids, rows hold b_id and b_canonical_id."""
+    with DbCommitContext() as db:
+        db.execute(_CANONICAL_STATEMENT, rows)
+        log_bulk_changes(db, Publish, [row["b_id"] for row in rows], CHANGE_UPDATE)
+
+
+def dedup_report(
+    project_code: str | None = None,
+    include_inactive: bool = False,
+    min_size: int = MIN_SIZE,
+    workers: int | None = None,
+    record: bool = False,
+) -> DedupReport:
+    """Return duplicate publish report, of given project or across all.
+
+    With record, publish canonical_id is set to the canonical publish id of
+    its duplicate set, canonical publish included. It is reset first for
+    publishes of scope and publishes referencing them, so sets spanning other
+    projects are only recorded by a run across all projects.
+    """
+    report = DedupReport()
+    start = time.perf_counter()
+    if record:
+        _clear_canonical(project_code, include_inactive)
+
+    pending = []
+    for duplicate_set in duplicate_sets(
+        project_code, include_inactive, min_size, workers, report.errors
+    ):
+        report.add(duplicate_set)
+        if not record:
+            continue
+        pending.extend(
+            {"b_id": publish_id, "b_canonical_id": duplicate_set.canonical_id}
+            for publish_id in duplicate_set.publish_ids
+        )
+        if len(pending) >= BATCH_SIZE:
+            _write_canonical(pending)
+            pending = []
+    if pending:
+        _write_canonical(pending)
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def main(argv: list[str] | None = None):
+    """Deduplication report command line entry point."""
+    parser = argparse.ArgumentParser(description="Atlas publish deduplication.")
+    parser.add_argument("--project", help="Project code, every project if not set.")
+    parser.add_argument("--include-inactive", action="store_true")
+    parser.add_argument("--min-size", type=int, default=MIN_SIZE)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument(
+        "--record", action="store_true", help="Store publish canonical ids."
+    )
+    args = parser.parse_args(argv)
+
+    report = dedup_report(
+        args.project,
+        include_inactive=args.include_inactive,
+        min_size=args.min_size,
+        workers=args.workers,
+        record=args.record,
+    )
+    for publish_id, path, error in report.errors:
+        print(f"Publish {publish_id} {path}: {error}")
+    print("\n".join(report.summary_lines()))
+
+
+if __name__ == "__main__":
+    main()
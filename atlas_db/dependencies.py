@@ -0,0 +1,265 @@
+"""Publish dependency module.
+
+Record which publishes a publish was built from, and walk the dependency
+graph both ways::
+
+    add_dependencies([(lookdev.id, model.id), (lookdev.id, texture.id)])
+    downstream(model.id)  # Every publish to rebuild when model changes.
+
+Transitive queries are single recursive CTEs walking the dependency table
+primary key upstream, or its dependent index downstream. Results of hot
+publishes can be cached in process, a cached closure is reused while no
+dependency changed, which costs a single scalar query on the change log.
+Edges of archived publishes are moved out with them, see atlas_db.archive,
+and cycles are tolerated.
+"""
+
+from __future__ import annotations
+
+import threading
+
+from collections import OrderedDict
+from itertools import batched
+from typing import TYPE_CHECKING
+
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import literal
+from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy.dialects.sqlite import insert
+
+from atlas_db.changes import log_bulk_changes
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import CHANGE_DELETE
+from atlas_db.models import CHANGE_INSERT
+from atlas_db.models import CHANGE_UPDATE
+from atlas_db.models import ChangeLog
+from atlas_db.models import PublishDependency
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy import Select
+
+
+BATCH_SIZE = 10000
+# Closures kept in cache, least recently used ones are dropped first.
+CACHE_SIZE = 1024
+
+UPSTREAM = "upstream"
+DOWNSTREAM = "downstream"
+
+_lock = threading.Lock()
+# (revision, closure ids) by (direction, publish id, max depth).
+_closure_cache: OrderedDict[tuple, tuple[int, tuple[int, ...]]] = OrderedDict()
+
+
+def _check_edges(edges: Iterable[tuple[int, int]]):
+    for publish_id, dependency_id in edges:
+        if publish_id == dependency_id:
+            msg = f"Publish {publish_id} cannot depend on itself."
+            raise ValueError(msg)
+
+
+def add_dependencies(
+    edges: Iterable[tuple[int, int]], batch_size: int = BATCH_SIZE
+) -> int:
+    """Add (publish id, dependency id) edges, return added edge count.
+
+    Existing edges are ignored. Edges are inserted by batches of batch_size in
+    their own transaction.
+
+    Raises:
+        ValueError: a publish depends on itself.
+    """
+    statement = insert(PublishDependency.__table__).on_conflict_do_nothing()
+    added = 0
+    for batch in batched(edges, batch_size, strict=False):
+        _check_edges(batch)
+        with DbCommitContext() as db:
+            result = db.execute(
+                statement,
+                [
+                    {"publish_id": publish_id, "dependency_id": dependency_id}
+                    for publish_id, dependency_id in batch
+                ],
+            )
+            if result.rowcount:
+                log_bulk_changes(
+                    db,
+                    PublishDependency,
+                    {publish_id for publish_id, _ in batch},
+                    CHANGE_INSERT,
+                )
+        added += result.rowcount
+    return added
+
+
+def remove_dependencies(
+    edges: Iterable[tuple[int, int]], batch_size: int = BATCH_SIZE
+) -> int:
+    """Remove (publish id, dependency id) edges, return removed edge count."""
+    removed = 0
+    for batch in batched(edges, batch_size, strict=False):
+        with DbCommitContext() as db:
+            result = db.execute(
+                delete(PublishDependency).where(
+                    tuple_(
+                        PublishDependency.publish_id, PublishDependency.dependency_id
+                    ).in_(batch)
+                )
+            )
+            if result.rowcount:
+                log_bulk_changes(
+                    db,
+                    PublishDependency,
+                    {publish_id for publish_id, _ in batch},
+                    CHANGE_DELETE,
+                )
+        removed += result.rowcount
+    return removed
+
+
+def set_dependencies(publish_id: int, dependency_ids: Iterable[int]):
+    """Replace dependencies of publish by given ones.
+
+    Raises:
+        ValueError: publish depends on itself.
+    """
+    rows = [
+        {"publish_id": publish_id, "dependency_id": dependency_id}
+        for dependency_id in set(dependency_ids)
+    ]
+    _check_edges((row["publish_id"], row["dependency_id"]) for row in rows)
+    with DbCommitContext() as db:
+        db.execute(
+            delete(PublishDependency).where(PublishDependency.publish_id == publish_id)
+        )
+        if rows:
+            db.execute(insert(PublishDependency), rows)
+        log_bulk_changes(db, PublishDependency, [publish_id], CHANGE_UPDATE)
+
+
+def dependencies(publish_id: int) -> list[int]:
+    """Return ids of publishes given publish directly depends on."""
+    with DbQueryContext() as db:
+        return db.scalars(
+            select(PublishDependency.dependency_id)
+            .where(PublishDependency.publish_id == publish_id)
+            .order_by(PublishDependency.dependency_id)
+        ).all()
+
+
+def dependents(publish_id: int) -> list[int]:
+    """Return ids of publishes directly depending on given publish."""
+    with DbQueryContext() as db:
+        return db.scalars(
+            select(PublishDependency.publish_id)
+            .where(PublishDependency.dependency_id == publish_id)
+            .order_by(PublishDependency.publish_id)
+        ).all()
+
+
+def _closure_statement(publish_id: int, direction: str, max_depth: int | None) -> Select:
+    """Return recursive statement selecting closure ids of publish."""
+    if direction == UPSTREAM:
+        source, target = PublishDependency.publish_id, PublishDependency.dependency_id
+    elif direction == DOWNSTREAM:
+        source, target = PublishDependency.dependency_id, PublishDependency.publish_id
+    else:
+        msg = f"Unknown dependency direction {direction!r}."
+        raise ValueError(msg)
+
+    if max_depth is None:
+        # UNION drops already reached ids, which also stops on cycles.
+        closure = (
+            select(target.label("id")).where(source == publish_id).cte(recursive=True)
+        )
+        closure = closure.union(
+            select(target).join(closure, source == closure.c.id),
+        )
+        return select(closure.c.id).order_by(closure.c.id)
+
+    closure = (
+        select(target.label("id"), literal(1).label("depth"))
+        .where(source == publish_id)
+        .cte(recursive=True)
+    )
+    closure = closure.union(
+        select(target, closure.c.depth + 1)
+        .join(closure, source == closure.c.id)
+        .where(closure.c.depth < max_depth),
+    )
+    return select(closure.c.id).distinct().order_by(closure.c.id)
+
+
+def graph_revision() -> int:
+    """Return last logged dependency change sequence, 0 if none."""
+    with DbQueryContext() as db:
+        sequence = db.scalar(
+            select(func.max(ChangeLog.sequence)).where(
+                ChangeLog.entity_type == PublishDependency.__tablename__
+            )
+        )
+    return sequence or 0
+
+
+def closure(
+    publish_id: int,
+    direction: str = DOWNSTREAM,
+    max_depth: int | None = None,
+    cache: bool = False,
+) -> list[int]:
+    """Return sorted ids of publishes transitively reached from publish.
+
+    Upstream direction follows dependencies, downstream direction follows
+    dependents. Walk stops after max_depth edges if given. Publish itself is
+    only returned when it is part of a cycle. With cache, closure is kept in
+    process and reused while the dependency graph did not change.
+    """
+    statement = _closure_statement(publish_id, direction, max_depth)
+    if not cache:
+        with DbQueryContext() as db:
+            return db.scalars(statement).all()
+
+    key = (direction, publish_id, max_depth)
+    revision = graph_revision()
+    with _lock:
+        cached = _closure_cache.get(key)
+        if cached is not None and cached[0] == revision:
+            _closure_cache.move_to_end(key)
+            return list(cached[1])
+
+    with DbQueryContext() as db:
+        ids = db.scalars(statement).all()
+
+    with _lock:
+        _closure_cache[key] = (revision, tuple(ids))
+        _closure_cache.move_to_end(key)
+        while len(_closure_cache) > CACHE_SIZE:
+            _closure_cache.popitem(last=False)
+
+    return ids
+
+
+def upstream(
+    publish_id: int, max_depth: int | None = None, cache: bool = False
+) -> list[int]:
+    """Return ids of publishes given publish transitively depends on."""
+    return closure(publish_id, UPSTREAM, max_depth, cache)
+
+
+def downstream(
+    publish_id: int, max_depth: int | None = None, cache: bool = False
+) -> list[int]:
+    """Return ids of publishes transitively depending on given publish."""
+    return closure(publish_id, DOWNSTREAM, max_depth, cache)
+
+
+def clear_cache():
+    """Forget every cached closure."""
+    with _lock:
+        _closure_cache.clear()
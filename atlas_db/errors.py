@@ -42,3 +42,24 @@ class DbTaskAlreadyExistError(Exception):
 
 class DbPublishTypeAlreadyExistError(Exception):
     """Raised when trying to create publish type that already exist."""
+
+class DbPublishAlreadyExistError(Exception):
+    """Raised when trying to register publish path that already exist."""
+
+class DbTooManyQueriesError(AssertionError):
+    """Raised when a block runs more queries than allowed."""
+
+class DbProjectMetaConflictError(Exception):
+    """Raised when project meta was edited since it was read."""
+
+class DbEntityConflictError(Exception):
+    """Raised when entity was updated since it was read."""
+
+class DbServiceError(Exception):
+    """Raised when local query service request fails."""
+
+class DbSchemaVersionError(Exception):
+    """Raised when database schema is newer than this atlas_db version."""
+
+class DbInvalidCursorError(Exception):
+    """Raised when page cursor is malformed or from another page order."""
@@ -1,41 +1,321 @@
 """Database helper module."""
 from __future__ import annotations
 
+from collections import Counter
+from itertools import batched
+from typing import TYPE_CHECKING
+from typing import Any
+
+from sqlalchemy import delete
+from sqlalchemy import insert
+from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy import update
+from sqlalchemy.orm.attributes import set_committed_value
+
+from atlas_db import stats
+from atlas_db.archive import check_path_available
+from atlas_db.archive import next_version
+from atlas_db.changes import log_bulk_changes
+from atlas_db.context import DbCommitContext
 from atlas_db.context import DbQueryContext
+from atlas_db.errors import DbAssetAlreadyExistError
+from atlas_db.errors import DbEntityConflictError
 from atlas_db.errors import MissingDbAssetTypeError
 from atlas_db.errors import MissingDbProjectError
+from atlas_db.errors import MissingDbPublishTypeError
+from atlas_db.errors import MissingDbTaskError
 from atlas_db.errors import MissingDbTaskTypeError
+from atlas_db.models import CHANGE_INSERT
+from atlas_db.models import CHANGE_UPDATE
+from atlas_db.models import Asset
 from atlas_db.models import AssetType
 from atlas_db.models import Base
 from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishType
+from atlas_db.models import Task
 from atlas_db.models import TaskType
+from atlas_db.models import asset_type_task_template
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Sequence
+
+    from sqlalchemy.orm import Session
 
 
-def entity_by_code(entity: type[Base], code: str):
-    """Get entity by his type and code."""
+# Asset keys looked up by query, bound parameters stay well under sqlite limit.
+KEY_CHUNK_SIZE = 400
+
+
+def entity_by_code(entity: type[Base], code: str, include_inactive: bool = False):
+    """Get entity by his type and code, active one unless include_inactive."""
     with DbQueryContext() as db:
         db.expire_on_commit = False
-        value = db.query(entity).where(entity.code == code).first()
+        query = db.query(entity).where(entity.code == code)
+        if not include_inactive:
+            query = query.where(entity.active)
+        value = query.first()
 
     return value
 
-def get_project(code: str) -> Project:
+def active_entities(entity: type[Base], include_inactive: bool = False) -> list[Base]:
+    """Get entities of given type, active ones unless include_inactive."""
+    with DbQueryContext() as db:
+        db.expire_on_commit = False
+        query = db.query(entity)
+        if not include_inactive:
+            query = query.where(entity.active)
+        entities = query.all()
+
+    return entities
+
+def get_project(code: str, include_inactive: bool = False) -> Project:
     """Get project by code."""
-    project = entity_by_code(Project, code)
+    project = entity_by_code(Project, code, include_inactive)
     if not project:
         raise MissingDbProjectError
     return project
 
-def get_asset_type(code: str) -> AssetType:
+def get_asset_type(code: str, include_inactive: bool = False) -> AssetType:
     """Get asset type by code."""
-    asset_type = entity_by_code(AssetType, code)
+    asset_type = entity_by_code(AssetType, code, include_inactive)
     if not asset_type:
         raise MissingDbAssetTypeError
     return asset_type
 
-def get_task_type(code: str) -> TaskType:
+def get_task_type(code: str, include_inactive: bool = False) -> TaskType:
     """Get task type by code."""
-    task_type = entity_by_code(TaskType, code)
+    task_type = entity_by_code(TaskType, code, include_inactive)
     if not task_type:
         raise MissingDbTaskTypeError
     return task_type
+
+def set_task_templates(asset_type_code: str, task_type_codes: Sequence[str]):
+    """Set task types created by default with each asset of given asset type."""
+    with DbCommitContext() as db:
+        asset_type_id = db.scalar(
+            select(AssetType.id).where(AssetType.code == asset_type_code)
+        )
+        if asset_type_id is None:
+            msg = f"Asset type {asset_type_code!r} does not exist."
+            raise MissingDbAssetTypeError(msg)
+
+        task_type_ids = db.scalars(
+            select(TaskType.id).where(TaskType.code.in_(task_type_codes))
+        ).all()
+        if len(task_type_ids) != len(set(task_type_codes)):
+            msg = f"Some of task types {list(task_type_codes)} do not exist."
+            raise MissingDbTaskTypeError(msg)
+
+        db.execute(
+            delete(asset_type_task_template).where(
+                asset_type_task_template.c.asset_type_id == asset_type_id
+            )
+        )
+        if task_type_ids:
+            db.execute(
+                insert(asset_type_task_template),
+                [
+                    {"asset_type_id": asset_type_id, "task_type_id": task_type_id}
+                    for task_type_id in task_type_ids
+                ],
+            )
+
+def create_assets(project_code: str, assets: Iterable[tuple[str, str]]) -> list[int]:
+    """Create assets with their template tasks, return created asset ids.
+
+    Assets are given as (asset code, asset type code) pairs. Project, asset
+    types and task templates are resolved once for the whole batch, and assets
+    and tasks are inserted with one statement each, whatever the asset count.
+
+    Raises:
+        DbAssetAlreadyExistError: an asset exists already, or is given twice.
+    """
+    assets = list(assets)
+    if not assets:
+        return []
+    repeated = [asset for asset, count in Counter(assets).items() if count > 1]
+    if repeated:
+        msg = f"Assets {sorted(repeated)} are given more than once."
+        raise DbAssetAlreadyExistError(msg)
+    asset_type_codes = {asset_type_code for _, asset_type_code in assets}
+
+    with DbCommitContext() as db:
+        project_id = db.scalar(select(Project.id).where(Project.code == project_code))
+        if project_id is None:
+            msg = f"Project {project_code!r} does not exist."
+            raise MissingDbProjectError(msg)
+
+        asset_type_id_by_code = dict(
+            db.execute(
+                select(AssetType.code, AssetType.id).where(
+                    AssetType.code.in_(asset_type_codes)
+                )
+            ).all()
+        )
+        missing = asset_type_codes - set(asset_type_id_by_code)
+        if missing:
+            msg = f"Asset types {sorted(missing)} do not exist."
+            raise MissingDbAssetTypeError(msg)
+
+        rows = [
+            {
+                "code": code,
+                "project_id": project_id,
+                "asset_type_id": asset_type_id_by_code[asset_type_code],
+            }
+            for code, asset_type_code in assets
+        ]
+        existing = [
+            code
+            for chunk in batched(rows, KEY_CHUNK_SIZE, strict=False)
+            for code in db.scalars(
+                select(Asset.code).where(
+                    Asset.project_id == project_id,
+                    tuple_(Asset.code, Asset.asset_type_id).in_(
+                        [(row["code"], row["asset_type_id"]) for row in chunk]
+                    ),
+                )
+            )
+        ]
+        if existing:
+            msg = f"Assets {sorted(existing)} already exist in {project_code!r}."
+            raise DbAssetAlreadyExistError(msg)
+
+        task_type_ids_by_asset_type: dict[int, list[int]] = {}
+        for asset_type_id, task_type_id in db.execute(
+            select(
+                asset_type_task_template.c.asset_type_id,
+                asset_type_task_template.c.task_type_id,
+            ).where(
+                asset_type_task_template.c.asset_type_id.in_(
+                    asset_type_id_by_code.values()
+                )
+            )
+        ):
+            task_type_ids_by_asset_type.setdefault(asset_type_id, []).append(
+                task_type_id
+            )
+
+        asset_ids = db.scalars(
+            insert(Asset).returning(Asset.id, sort_by_parameter_order=True), rows
+        ).all()
+
+        task_rows = [
+            {"asset_id": asset_id, "task_type_id": task_type_id}
+            for asset_id, row in zip(asset_ids, rows, strict=True)
+            for task_type_id in task_type_ids_by_asset_type.get(row["asset_type_id"], [])
+        ]
+        task_ids = []
+        if task_rows:
+            task_ids = db.scalars(
+                insert(Task).returning(Task.id, sort_by_parameter_order=True),
+                task_rows,
+            ).all()
+
+        log_bulk_changes(db, Asset, asset_ids, CHANGE_INSERT)
+        log_bulk_changes(db, Task, task_ids, CHANGE_INSERT)
+
+    return asset_ids
+
+def update_entity(entity: Base, **values: Any):
+    """Update entity columns with a single conditional UPDATE.
+
+    The row is only updated if its version is still the one entity was read
+    with, then entity attributes and version are set without reloading it.
+    Publish size rollup follows publish active, size, task and type changes.
+    Project meta is edited with project_meta.update_project instead.
+
+    Raises:
+        DbEntityConflictError: entity was updated or deleted meanwhile.
+    """
+    entity_type = type(entity)
+    with DbCommitContext() as db:
+        # Publish leaves its previous rollup row, then enters its new one.
+        rollup = (
+            entity_type is Publish
+            and stats.ROLLUP_COLUMNS & values.keys()
+            and stats.is_rollup_enabled(db)
+        )
+        if rollup:
+            deltas = stats.publish_rollup_deltas(db, Publish, [entity.id], -1)
+        result = db.execute(
+            update(entity_type)
+            .where(
+                entity_type.id == entity.id,
+                entity_type.version_id == entity.version_id,
+            )
+            .values(**values, version_id=entity_type.version_id + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            msg = (
+                f"{entity_type.__name__} {entity.id} was updated or deleted "
+                f"since version {entity.version_id} was read."
+            )
+            raise DbEntityConflictError(msg)
+
+        log_bulk_changes(db, entity_type, [entity.id], CHANGE_UPDATE)
+        if rollup:
+            for key, (size, count) in stats.publish_rollup_deltas(
+                db, Publish, [entity.id]
+            ).items():
+                previous_size, previous_count = deltas.get(key, (0, 0))
+                deltas[key] = (previous_size + size, previous_count + count)
+            stats.apply_rollup_delta(db, deltas)
+
+    for name, value in values.items():
+        set_committed_value(entity, name, value)
+    set_committed_value(entity, "version_id", entity.version_id + 1)
+
+def add_publish(
+    db: Session,
+    task_id: int,
+    publish_type_code: str,
+    path: str,
+    size: int,
+    release: str,
+    code: str | None = None,
+) -> Publish:
+    """Add next version publish of task and publish type in db transaction, return it.
+
+    Version is computed by the insert statement itself, so concurrent
+    registrations of the same task never get the same version. Used by
+    aio.register_publish and writer.register_publish.
+
+    Raises:
+        MissingDbTaskError: task does not exist.
+        MissingDbPublishTypeError: publish type does not exist.
+        DbPublishAlreadyExistError: path is used by a publish, archived or not.
+    """
+    if db.scalar(select(Task.id).where(Task.id == task_id)) is None:
+        msg = f"Task {task_id} does not exist."
+        raise MissingDbTaskError(msg)
+    publish_type_id = db.scalar(
+        select(PublishType.id).where(PublishType.code == publish_type_code)
+    )
+    if publish_type_id is None:
+        msg = f"Publish type {publish_type_code!r} does not exist."
+        raise MissingDbPublishTypeError(msg)
+
+    check_path_available(db, path)
+
+    publish = db.scalar(
+        insert(Publish)
+        .values(
+            code=code or publish_type_code,
+            path=path,
+            version=next_version(task_id, publish_type_id),
+            release=release,
+            size=size,
+            publish_type_id=publish_type_id,
+            task_id=task_id,
+        )
+        .returning(Publish)
+    )
+    log_bulk_changes(db, Publish, [publish.id], CHANGE_INSERT)
+    stats.apply_rollup_delta(db, {(task_id, publish_type_id): (size, 1)})
+    return publish
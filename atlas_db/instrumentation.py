@@ -0,0 +1,228 @@
+"""Database query instrumentation module.
+
+Record every statement sent by atlas_db engines, with its latency, affected
+row count and call site, aggregated by normalized SQL::
+
+    instrumentation.enable(slow_threshold=0.1)
+    ...
+    for stats in instrumentation.report()[:10]:
+        print(stats.total_time, stats.count, stats.sql)
+"""
+
+from __future__ import annotations
+
+import contextlib
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+
+from collections import Counter
+from typing import TYPE_CHECKING
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from atlas_db.errors import DbTooManyQueriesError
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+slow_query_logger = logging.getLogger("atlas_db.slow_query")
+
+_SQLALCHEMY_DIR = os.path.dirname(os.path.dirname(os.path.abspath(event.__file__)))
+_IGNORED_FILES = {os.path.abspath(__file__)}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_PARAMS_LIST_RE = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_VALUES_LIST_RE = re.compile(r"(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+")
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+_lock = threading.Lock()
+_local = threading.local()
+_stats_by_sql: dict[str, QueryStats] = {}
+_slow_threshold: float | None = None
+
+
+class QueryStats:
+    """Aggregated statistics of one normalized statement."""
+
+    __slots__ = ("sql", "count", "total_time", "max_time", "rows", "call_sites")
+
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # Rows affected by data modifications, None for statements returning rows.
+        self.rows: int | None = None
+        self.call_sites: Counter[str] = Counter()
+
+    @property
+    def mean_time(self) -> float:
+        """Return mean statement time in seconds."""
+        return self.total_time / self.count if self.count else 0.0
+
+    def as_dict(self) -> dict:
+        """Return statistics as json serializable dict."""
+        return {
+            "sql": self.sql,
+            "count": self.count,
+            "total_time": self.total_time,
+            "mean_time": self.mean_time,
+            "max_time": self.max_time,
+            "rows": self.rows,
+            "call_sites": dict(self.call_sites),
+        }
+
+
+def normalize_sql(statement: str) -> str:
+    """Return statement with literals and parameter lists collapsed."""
+    sql = _WHITESPACE_RE.sub(" ", statement).strip()
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PARAMS_LIST_RE.sub("(...)", sql)
+    sql = _VALUES_LIST_RE.sub(r"\1", sql)
+    return sql
+
+
+def call_site() -> str:
+    """Return first caller frame outside of sqlalchemy and this module."""
+    frame = inspect.currentframe()
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        # Skip sqlalchemy generated code too, named like "<string>".
+        if not filename.startswith("<"):
+            filename = os.path.abspath(filename)
+            if (
+                not filename.startswith(_SQLALCHEMY_DIR)
+                and filename not in _IGNORED_FILES
+            ):
+                return f"{filename}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+def _query_counters() -> list[list[int]]:
+    """Return current thread query counters stack, used by max_queries."""
+    if not hasattr(_local, "counters"):
+        _local.counters = []
+    return _local.counters
+
+
+def _before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _many):
+    conn.info.setdefault("atlas_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, _context, executemany):
+    elapsed = time.perf_counter() - conn.info["atlas_query_start"].pop()
+    for counter in _query_counters():
+        counter[0] += 1
+
+    sql = normalize_sql(statement)
+    site = call_site()
+    # Sqlite only knows row count of statements without result rows, rows
+    # returned by queries are fetched later and not counted.
+    rows = cursor.rowcount if cursor.description is None else -1
+
+    with _lock:
+        stats = _stats_by_sql.get(sql)
+        if stats is None:
+            stats = _stats_by_sql[sql] = QueryStats(sql)
+        stats.count += 1
+        stats.total_time += elapsed
+        stats.max_time = max(stats.max_time, elapsed)
+        if rows >= 0:
+            stats.rows = (stats.rows or 0) + rows
+        stats.call_sites[site] += 1
+
+    if _slow_threshold is not None and elapsed >= _slow_threshold:
+        slow_query_logger.warning(
+            "Slow query (%.1f ms, %s) at %s: %s %s",
+            elapsed * 1000.0,
+            "executemany" if executemany else "execute",
+            site,
+            _WHITESPACE_RE.sub(" ", statement),
+            parameters if not executemany else f"[{len(parameters)} rows]",
+        )
+
+
+def _handle_error(context):
+    # Failed statement has no after_cursor_execute, drop its start time.
+    if context.connection is not None and context.execution_context is not None:
+        starts = context.connection.info.get("atlas_query_start")
+        if starts:
+            starts.pop()
+
+
+def is_enabled() -> bool:
+    """Return True if instrumentation is enabled."""
+    return event.contains(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def enable(slow_threshold: float | None = None):
+    """Record statements of every engine, log ones slower than slow_threshold seconds."""
+    global _slow_threshold
+    _slow_threshold = slow_threshold
+    if is_enabled():
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+def disable():
+    """Stop recording statements, recorded statistics are kept."""
+    if not is_enabled():
+        return
+    event.remove(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.remove(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.remove(Engine, "handle_error", _handle_error)
+
+
+def reset():
+    """Clear recorded statistics."""
+    with _lock:
+        _stats_by_sql.clear()
+
+
+def report(sort_by: str = "total_time") -> list[QueryStats]:
+    """Return recorded statement statistics, sorted by given attribute descending."""
+    with _lock:
+        stats = list(_stats_by_sql.values())
+    return sorted(stats, key=lambda item: getattr(item, sort_by), reverse=True)
+
+
+@contextlib.contextmanager
+def max_queries(count: int) -> Iterator[list[int]]:
+    """Raise DbTooManyQueriesError if block runs more than count queries.
+
+    Only queries of current thread are counted. Yield a one item list holding
+    the running query count. Instrumentation is enabled for the block if needed.
+    """
+    was_enabled = is_enabled()
+    if not was_enabled:
+        enable(_slow_threshold)
+
+    counter = [0]
+    counters = _query_counters()
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        # Lists are equal by value, nested blocks must remove their own counter.
+        if counters[-1] is counter:
+            counters.pop()
+        else:
+            del counters[next(i for i, item in enumerate(counters) if item is counter)]
+        if not was_enabled:
+            disable()
+
+    if counter[0] > count:
+        msg = f"{counter[0]} queries run, {count} allowed."
+        raise DbTooManyQueriesError(msg)
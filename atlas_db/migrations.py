@@ -0,0 +1,369 @@
+"""Schema migration module.
+
+Database schema version is stored in schema_version table. Each engine
+upgrades its database once, when created by context.get_engine:
+
+- missing tables are created, new databases are stamped with the last
+  version and need no migration,
+- migrations newer than the stored version alter existing tables, in the
+  same transaction.
+
+Migrations are only ever appended to MIGRATIONS, a released migration is not
+edited. New tables need no migration, only new columns and indexes of
+existing tables do. Data changes on big tables are queued as backfills by
+their migration, and run apart, by batches of rows in their own short
+transaction, so readers and writers are never locked out for long::
+
+    python -m atlas_db.migrations --backfill
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from sqlalchemy import delete
+from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from atlas_db.errors import DbSchemaVersionError
+from atlas_db.models import Asset
+from atlas_db.models import AssetType
+from atlas_db.models import BackfillProgress
+from atlas_db.models import Base
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishSizeRollup
+from atlas_db.models import PublishType
+from atlas_db.models import SchemaVersion
+from atlas_db.models import Task
+from atlas_db.models import TaskType
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+    from sqlalchemy import Column
+    from sqlalchemy import Connection
+    from sqlalchemy import Engine
+
+
+BACKFILL_BATCH_SIZE = 5000
+# Pause between backfill batches in seconds, lets other writers in.
+BACKFILL_PAUSE = 0.01
+
+
+class Migration(NamedTuple):
+    """Schema change from version - 1 to version."""
+
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+class Backfill(NamedTuple):
+    """Data change walking a table by key, apply handles keys in (low, high]."""
+
+    name: str
+    description: str
+    key: Column
+    apply: Callable[[Connection, int, int], None]
+
+
+def _has_column(connection: Connection, table_name: str, name: str) -> bool:
+    columns = inspect(connection).get_columns(table_name)
+    return any(column["name"] == name for column in columns)
+
+
+def _add_column(connection: Connection, table_name: str, name: str, ddl: str):
+    """Add column of given DDL type and constraints, unless it already exists.
+
+    Databases created by atlas_db versions without migrations can already have
+    columns of later migrations.
+    """
+    if not _has_column(connection, table_name, name):
+        connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {ddl}")
+
+
+def _create_index(connection: Connection, entity_type: type[Base], name: str):
+    """Create model index of given name, unless it already exists."""
+    (index,) = (index for index in entity_type.__table__.indexes if index.name == name)
+    index.create(connection, checkfirst=True)
+
+
+def _queue_backfill(connection: Connection, name: str):
+    """Queue backfill of given name, run by run_backfills."""
+    connection.execute(
+        sqlite_insert(BackfillProgress)
+        .values(name=name, last_key=0, done=False)
+        .on_conflict_do_update(
+            index_elements=["name"], set_={"last_key": 0, "done": False}
+        )
+    )
+
+
+def _add_meta_revision(connection: Connection):
+    _add_column(
+        connection, Project.__tablename__, "meta_revision", "INTEGER NOT NULL DEFAULT 0"
+    )
+
+
+def _add_version_ids(connection: Connection):
+    for entity_type in (Project, AssetType, Asset, TaskType, Task, PublishType, Publish):
+        _add_column(
+            connection,
+            entity_type.__tablename__,
+            "version_id",
+            "INTEGER NOT NULL DEFAULT 1",
+        )
+
+
+def _add_active_indexes(connection: Connection):
+    _create_index(connection, Asset, "ix_asset_active_lookup")
+    _create_index(connection, Task, "ix_task_active_lookup")
+    _create_index(connection, Publish, "ix_publish_active_latest")
+
+
+def _add_publish_content(connection: Connection):
+    _add_column(connection, Publish.__tablename__, "checksum", "VARCHAR")
+    _add_column(connection, Publish.__tablename__, "mtime_ns", "INTEGER")
+    _add_column(connection, Publish.__tablename__, "canonical_id", "INTEGER")
+    _create_index(connection, Publish, "ix_publish_content")
+
+
+def _queue_rollup_backfill(connection: Connection):
+    _queue_backfill(connection, "publish_size_rollup")
+
+
+def _add_asset_page_index(connection: Connection):
+    _create_index(connection, Asset, "ix_asset_active_page")
+
+
+# Partial indexes filtered on active rows, see _fix_active_indexes.
+ACTIVE_INDEXES = (
+    (Asset, "ix_asset_active_lookup"),
+    (Asset, "ix_asset_active_page"),
+    (Task, "ix_task_active_lookup"),
+    (Publish, "ix_publish_active_latest"),
+)
+
+
+def _fix_active_indexes(connection: Connection):
+    """Recreate active partial indexes with the "active = 1" predicate.
+
+    Sqlite only uses a partial index when the query has its WHERE term, and
+    queries filtering on Model.active render "active = 1", never "active".
+    """
+    for entity_type, name in ACTIVE_INDEXES:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {name}")
+        _create_index(connection, entity_type, name)
+
+
+def _add_publish_autoincrement(connection: Connection):
+    """Rebuild publish table with AUTOINCREMENT, so publish ids are never reused.
+
+    Without it, sqlite gives new rows the highest id + 1, the ids of the last
+    publishes once they are archived. Sqlite cannot alter it in place: the table
+    is renamed, created again and filled back, references of other tables to
+    publish are kept by legacy_alter_table. Sequence starts after the highest
+    publish id, archived ones included.
+    """
+    table = Publish.__table__
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+    connection.exec_driver_sql("ALTER TABLE publish RENAME TO publish_old")
+    connection.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+    for index in table.indexes:
+        connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    table.create(connection)
+    columns = ", ".join(column.name for column in table.columns)
+    connection.exec_driver_sql(
+        f"INSERT INTO publish ({columns}) SELECT {columns} FROM publish_old"
+    )
+    connection.exec_driver_sql("DROP TABLE publish_old")
+    connection.exec_driver_sql("DELETE FROM sqlite_sequence WHERE name = 'publish'")
+    connection.exec_driver_sql(
+        "INSERT INTO sqlite_sequence (name, seq) SELECT 'publish', max("
+        "(SELECT coalesce(max(id), 0) FROM publish), "
+        "(SELECT coalesce(max(id), 0) FROM publish_archive))"
+    )
+
+
+MIGRATIONS: tuple[Migration, ...] = (
+    Migration(1, "Add project meta revision", _add_meta_revision),
+    Migration(2, "Add entity version ids", _add_version_ids),
+    Migration(3, "Add active entity partial indexes", _add_active_indexes),
+    Migration(4, "Add publish checksum, mtime and canonical id", _add_publish_content),
+    Migration(5, "Fill publish size rollup", _queue_rollup_backfill),
+    Migration(6, "Add active asset paging index", _add_asset_page_index),
+    Migration(7, "Match active partial indexes to active filters", _fix_active_indexes),
+    Migration(8, "Never reuse publish ids", _add_publish_autoincrement),
+)
+HEAD_VERSION = MIGRATIONS[-1].version
+
+
+def _fill_rollup(connection: Connection, low: int, high: int):
+    """Recompute publish size rollup of tasks in (low, high]."""
+    connection.execute(
+        delete(PublishSizeRollup).where(
+            PublishSizeRollup.task_id > low, PublishSizeRollup.task_id <= high
+        )
+    )
+    connection.execute(
+        insert(PublishSizeRollup).from_select(
+            ["task_id", "publish_type_id", "total_size", "count"],
+            select(
+                Publish.task_id,
+                Publish.publish_type_id,
+                func.sum(Publish.size),
+                func.count(Publish.id),
+            )
+            .where(Publish.active, Publish.task_id > low, Publish.task_id <= high)
+            .group_by(Publish.task_id, Publish.publish_type_id),
+        )
+    )
+
+
+BACKFILLS: dict[str, Backfill] = {
+    backfill.name: backfill
+    for backfill in (
+        Backfill(
+            "publish_size_rollup",
+            "Publish size rollup of tasks published before it existed",
+            Task.id,
+            _fill_rollup,
+        ),
+    )
+}
+
+
+def schema_version(connection: Connection) -> int:
+    """Return database schema version, 0 for databases older than migrations."""
+    return connection.scalar(select(func.max(SchemaVersion.version))) or 0
+
+
+def upgrade(connection: Connection) -> list[Migration]:
+    """Bring database schema to head version, return applied migrations.
+
+    Runs in connection transaction, so a failed migration leaves the database
+    untouched.
+
+    Raises:
+        DbSchemaVersionError: database schema is newer than head version.
+    """
+    is_new = not inspect(connection).has_table(Project.__tablename__)
+    Base.metadata.create_all(connection)
+    if is_new:
+        connection.execute(insert(SchemaVersion), [{"version": HEAD_VERSION}])
+        return []
+
+    version = schema_version(connection)
+    if version > HEAD_VERSION:
+        msg = (
+            f"Database schema version is {version}, atlas_db only knows versions "
+            f"up to {HEAD_VERSION}: upgrade atlas_db."
+        )
+        raise DbSchemaVersionError(msg)
+
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        migration.upgrade(connection)
+        connection.execute(insert(SchemaVersion), [{"version": migration.version}])
+        applied.append(migration)
+    return applied
+
+
+def pending_backfills(engine: Engine | None = None) -> list[str]:
+    """Return names of queued backfills not done yet."""
+    from atlas_db.context import get_engine
+
+    with (engine or get_engine()).connect() as connection:
+        return connection.scalars(
+            select(BackfillProgress.name)
+            .where(~BackfillProgress.done)
+            .order_by(BackfillProgress.name)
+        ).all()
+
+
+def _run_batch(connection: Connection, backfill: Backfill, batch_size: int) -> bool:
+    """Apply next batch of backfill, return False when backfill is done."""
+    low = connection.scalar(
+        select(BackfillProgress.last_key).where(BackfillProgress.name == backfill.name)
+    )
+    keys = select(backfill.key).where(backfill.key > low).order_by(backfill.key)
+    high = connection.scalar(keys.offset(batch_size - 1).limit(1))
+    if high is None:
+        high = connection.scalar(select(func.max(backfill.key)).where(backfill.key > low))
+    if high is None:
+        connection.execute(
+            update(BackfillProgress)
+            .where(BackfillProgress.name == backfill.name)
+            .values(done=True)
+        )
+        return False
+
+    backfill.apply(connection, low, high)
+    connection.execute(
+        update(BackfillProgress)
+        .where(BackfillProgress.name == backfill.name)
+        .values(last_key=high)
+    )
+    return True
+
+
+def run_backfills(
+    batch_size: int = BACKFILL_BATCH_SIZE,
+    pause: float = BACKFILL_PAUSE,
+    engine: Engine | None = None,
+) -> dict[str, int]:
+    """Run queued backfills to completion, return batch count by backfill.
+
+    Each batch and its progress are committed together, an interrupted
+    backfill resumes after its last committed batch.
+    """
+    from atlas_db.context import get_engine
+
+    engine = engine or get_engine()
+    batches = {}
+    for name in pending_backfills(engine):
+        backfill = BACKFILLS[name]
+        batches[name] = 0
+        while True:
+            with engine.begin() as connection:
+                if not _run_batch(connection, backfill, batch_size):
+                    break
+            batches[name] += 1
+            time.sleep(pause)
+    return batches
+
+
+def main(argv: list[str] | None = None):
+    """Print schema version and run queued backfills from command line."""
+    parser = argparse.ArgumentParser(description="Atlas database migrations.")
+    parser.add_argument("--backfill", action="store_true", help="Run queued backfills.")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from atlas_db.context import get_engine
+
+    engine = get_engine()
+    with engine.connect() as connection:
+        print(f"Schema version {schema_version(connection)} of {HEAD_VERSION}.")
+
+    if args.backfill:
+        for name, count in run_backfills(args.batch_size, engine=engine).items():
+            print(f"Backfill {name}: {count} batches.")
+    for name in pending_backfills(engine):
+        print(f"Pending backfill {name}: {BACKFILLS[name].description}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,17 +6,27 @@ from datetime import datetime
 from typing import Any
 
 from sqlalchemy import JSON
+from sqlalchemy import Column
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import Table
+from sqlalchemy import event
 from sqlalchemy import func
+from sqlalchemy import insert
+from sqlalchemy import inspect
+from sqlalchemy import text
 from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import MappedAsDataclass
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import declared_attr
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
 
 from atlas_db.errors import MissingDbAssetError
+from atlas_db.errors import MissingDbPublishError
 from atlas_db.errors import MissingDbTaskError
 
 
@@ -27,7 +37,20 @@ class Base(MappedAsDataclass, DeclarativeBase):
         super().__init__(*args, **kwargs)
 
 
-class Project(Base):
+class VersionedMixin(MappedAsDataclass):
+    """Versioned entity, its version_id is checked and incremented on each update.
+
+    Conditional updates use it to detect concurrent writers.
+    """
+
+    version_id: Mapped[int] = mapped_column(default=1, init=False)
+
+    @declared_attr.directive
+    def __mapper_args__(cls) -> dict[str, Any]:  # noqa: N805
+        return {"version_id_col": cls.__table__.c.version_id}
+
+
+class Project(VersionedMixin, Base):
     """Project table."""
 
     __tablename__ = "project"
@@ -48,26 +71,33 @@ class Project(Base):
         default=dict,
         nullable=False,
     )
+    # Incremented on each meta change, to invalidate resolved environments.
+    meta_revision: Mapped[int] = mapped_column(default=0, init=False)
 
     active: Mapped[bool] = mapped_column(default=True)
 
-    def assets(self) -> list[Asset]:
-        """Get asset list related to project."""
+    def assets(self, include_inactive: bool = False) -> list[Asset]:
+        """Get asset list related to project, active ones unless include_inactive."""
         from atlas_db.context import DbQueryContext
 
         with DbQueryContext() as db:
             db.expire_on_commit = False
             assets = db.query(Asset).join(Project).filter(Asset.project == self)
+            if not include_inactive:
+                assets = assets.filter(Asset.active)
+            assets = assets.all()
 
-        return list(assets)
+        return assets
 
-    def get_asset(self, code: str, asset_type: AssetType) -> Asset:
-        """Get asset by his code."""
+    def get_asset(
+        self, code: str, asset_type: AssetType, include_inactive: bool = False
+    ) -> Asset:
+        """Get asset by his code, active one unless include_inactive."""
         from atlas_db.context import DbQueryContext
 
         with DbQueryContext() as db:
             db.expire_on_commit = False
-            asset = (
+            query = (
                 db.query(Asset)
                 .join(Project)
                 .join(AssetType)
@@ -76,15 +106,26 @@ class Project(Base):
                     Asset.code == code,
                     Asset.asset_type == asset_type,
                 )
-                .first()
             )
+            if not include_inactive:
+                query = query.filter(Asset.active)
+            asset = query.first()
         if not asset:
             raise MissingDbAssetError
 
         return asset
 
 
-class AssetType(Base):
+# Task types created by default with each asset of an asset type.
+asset_type_task_template = Table(
+    "asset_type_task_template",
+    Base.metadata,
+    Column("asset_type_id", ForeignKey("asset_type.id"), primary_key=True),
+    Column("task_type_id", ForeignKey("task_type.id"), primary_key=True),
+)
+
+
+class AssetType(VersionedMixin, Base):
     """Asset type table."""
 
     __tablename__ = "asset_type"
@@ -99,14 +140,36 @@ class AssetType(Base):
     name: Mapped[str] = mapped_column(unique=True, nullable=False)
 
     asset: Mapped[Asset] = relationship(back_populates="asset_type", init=False)
+    task_templates: Mapped[list[TaskType]] = relationship(
+        secondary=asset_type_task_template,
+        init=False,
+        uselist=True,
+    )
 
     active: Mapped[bool] = mapped_column(default=True)
 
 
-class Asset(Base):
+class Asset(VersionedMixin, Base):
     """Asset table."""
 
     __tablename__ = "asset"
+    __table_args__ = (
+        # Partial index, active asset lookups do not scan inactive ones.
+        Index(
+            "ix_asset_active_lookup",
+            "project_id",
+            "asset_type_id",
+            "code",
+            sqlite_where=text("active = 1"),
+        ),
+        # Partial index, project assets are paged by code, see atlas_db.paging.
+        Index(
+            "ix_asset_active_page",
+            "project_id",
+            "code",
+            sqlite_where=text("active = 1"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, autoincrement=True, index=True, init=False
@@ -132,19 +195,21 @@ class Asset(Base):
         """Return asset name."""
         return self.code
 
-    def get_task(self, task_type: TaskType) -> Task:
-        """Get specific task from his task_type code or task_type."""
+    def get_task(self, task_type: TaskType, include_inactive: bool = False) -> Task:
+        """Get specific task from his task_type, active one unless include_inactive."""
         from atlas_db.context import DbQueryContext
 
         with DbQueryContext() as db:
             db.expire_on_commit = False
-            task = (
+            query = (
                 db.query(Task)
                 .join(Asset)
                 .join(TaskType)
                 .filter(Task.asset == self, Task.task_type == task_type)
-                .first()
             )
+            if not include_inactive:
+                query = query.filter(Task.active)
+            task = query.first()
 
         if not task:
             raise MissingDbTaskError
@@ -152,8 +217,7 @@ class Asset(Base):
         return task
 
 
-
-class TaskType(Base):
+class TaskType(VersionedMixin, Base):
     """Task type table."""
 
     __tablename__ = "task_type"
@@ -169,10 +233,19 @@ class TaskType(Base):
     active: Mapped[bool] = mapped_column(default=True)
 
 
-class Task(Base):
+class Task(VersionedMixin, Base):
     """Task table."""
 
     __tablename__ = "task"
+    __table_args__ = (
+        # Partial index, active task lookups do not scan inactive ones.
+        Index(
+            "ix_task_active_lookup",
+            "asset_id",
+            "task_type_id",
+            sqlite_where=text("active = 1"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, autoincrement=True, index=True, init=False
@@ -180,7 +253,7 @@ class Task(Base):
     asset_id: Mapped[int] = mapped_column(ForeignKey("asset.id"), init=False)
     task_type_id: Mapped[int] = mapped_column(ForeignKey("task_type.id"), init=False)
 
-    asset: Mapped[Asset] = relationship(back_populates="task")
+    asset: Mapped[Asset] = relationship(back_populates="tasks")
     task_type: Mapped[TaskType] = relationship(back_populates="task")
     publish: Mapped[list[Publish]] = relationship(
         back_populates="task",
@@ -196,8 +269,33 @@ class Task(Base):
         """Wrap name from task_type code."""
         return self.task_type.name
 
+    def get_latest_publish(
+        self, publish_type: PublishType, include_inactive: bool = False
+    ) -> Publish:
+        """Get last version publish of given publish type.
 
-class PublishType(Base):
+        Inactive publishes are skipped unless include_inactive.
+        """
+        from atlas_db.context import DbQueryContext
+
+        with DbQueryContext() as db:
+            db.expire_on_commit = False
+            # Version stream of task and publish type, see Publish.version_stream.
+            query = db.query(Publish).filter(
+                Publish.task_id == self.id,
+                Publish.publish_type_id == publish_type.id,
+            )
+            if not include_inactive:
+                query = query.filter(Publish.active)
+            publish = query.order_by(Publish.version.desc()).first()
+
+        if not publish:
+            raise MissingDbPublishError
+
+        return publish
+
+
+class PublishType(VersionedMixin, Base):
     """Publish type table."""
 
     __tablename__ = "publish_type"
@@ -214,10 +312,24 @@ class PublishType(Base):
     active: Mapped[bool] = mapped_column(default=True)
 
 
-class Publish(Base):
+class Publish(VersionedMixin, Base):
     """Publish table."""
 
     __tablename__ = "publish"
+    __table_args__ = (
+        # Partial index, latest active publish is its last entry.
+        Index(
+            "ix_publish_active_latest",
+            "task_id",
+            "publish_type_id",
+            "version",
+            sqlite_where=text("active = 1"),
+        ),
+        # Same size publishes are duplicate candidates, see atlas_db.dedup.
+        Index("ix_publish_content", "size", "checksum"),
+        # Ids of archived publishes are never given to new ones.
+        {"sqlite_autoincrement": True},
+    )
 
     id: Mapped[int] = mapped_column(
         primary_key=True, autoincrement=True, index=True, init=False
@@ -227,6 +339,11 @@ class Publish(Base):
     version: Mapped[int] = mapped_column(nullable=False)
     release: Mapped[str] = mapped_column(nullable=False)
     size: Mapped[int]
+    # Content hash and modification time of path files, set by atlas_db.verify.
+    checksum: Mapped[str | None] = mapped_column(default=None, init=False)
+    mtime_ns: Mapped[int | None] = mapped_column(default=None, init=False)
+    # Id of the first publish with the same content, set by atlas_db.dedup.
+    canonical_id: Mapped[int | None] = mapped_column(default=None, init=False)
 
     publish_type_id: Mapped[int] = mapped_column(ForeignKey("publish_type.id"))
     task_id: Mapped[int] = mapped_column(ForeignKey("task.id"))
@@ -240,3 +357,196 @@ class Publish(Base):
         default=None,
     )
     active: Mapped[bool] = mapped_column(default=True)
+
+    @classmethod
+    def version_stream(cls) -> tuple[Any, ...]:
+        """Return columns of a version stream, publishes versioned together.
+
+        Versions are numbered by task and publish type, whatever the publish
+        code. Latest publish lookups, storage latest size and archive retention
+        all rank versions within these columns.
+        """
+        return (cls.task_id, cls.publish_type_id)
+
+
+class PublishDependency(Base):
+    """Publish dependency table, edges from a publish to a publish it uses."""
+
+    __tablename__ = "publish_dependency"
+    __table_args__ = (
+        # Downstream traversal, publishes using a publish.
+        Index("ix_publish_dependency_dependent", "dependency_id", "publish_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+    publish_id: Mapped[int] = mapped_column(ForeignKey("publish.id"), primary_key=True)
+    dependency_id: Mapped[int] = mapped_column(ForeignKey("publish.id"), primary_key=True)
+
+
+class PublishArchive(Base):
+    """Archived publish table, superseded publishes moved out of publish table."""
+
+    __tablename__ = "publish_archive"
+    __table_args__ = (
+        Index("ix_publish_archive_task", "task_id", "publish_type_id", "version"),
+    )
+
+    # Same id as the publish it was moved from.
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    code: Mapped[str] = mapped_column(nullable=False)
+    path: Mapped[str] = mapped_column(nullable=False, unique=True)
+    version: Mapped[int] = mapped_column(nullable=False)
+    release: Mapped[str] = mapped_column(nullable=False)
+    size: Mapped[int]
+    checksum: Mapped[str | None]
+    mtime_ns: Mapped[int | None]
+    canonical_id: Mapped[int | None]
+
+    publish_type_id: Mapped[int] = mapped_column(ForeignKey("publish_type.id"))
+    task_id: Mapped[int] = mapped_column(ForeignKey("task.id"))
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    active: Mapped[bool]
+    version_id: Mapped[int]
+
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        insert_default=func.now(),
+        default=None,
+    )
+
+
+class PublishDependencyArchive(Base):
+    """Archived publish dependency table, edges of archived publishes."""
+
+    __tablename__ = "publish_dependency_archive"
+    __table_args__ = (
+        Index("ix_publish_dependency_archive_dependent", "dependency_id", "publish_id"),
+        {"sqlite_with_rowid": False},
+    )
+
+    publish_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    dependency_id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+
+
+class PublishSizeRollup(Base):
+    """Active publish size and count by task and publish type."""
+
+    __tablename__ = "publish_size_rollup"
+
+    task_id: Mapped[int] = mapped_column(ForeignKey("task.id"), primary_key=True)
+    publish_type_id: Mapped[int] = mapped_column(
+        ForeignKey("publish_type.id"), primary_key=True
+    )
+    total_size: Mapped[int] = mapped_column(default=0)
+    count: Mapped[int] = mapped_column(default=0)
+
+
+class ChangeLog(Base):
+    """Append only log of entity changes, ordered by sequence."""
+
+    __tablename__ = "change_log"
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+    sequence: Mapped[int] = mapped_column(
+        primary_key=True, autoincrement=True, init=False
+    )
+    entity_type: Mapped[str] = mapped_column(nullable=False, index=True)
+    entity_id: Mapped[int] = mapped_column(nullable=False)
+    operation: Mapped[str] = mapped_column(nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        insert_default=func.now(),
+        default=None,
+    )
+
+
+class SchemaVersion(Base):
+    """Applied schema migration versions, see atlas_db.migrations."""
+
+    __tablename__ = "schema_version"
+
+    version: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+    applied_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        insert_default=func.now(),
+        default=None,
+    )
+
+
+class BackfillProgress(Base):
+    """Online backfill progress, batches resume after last_key."""
+
+    __tablename__ = "backfill_progress"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    last_key: Mapped[int] = mapped_column(default=0)
+    done: Mapped[bool] = mapped_column(default=False)
+
+
+class Setting(Base):
+    """Database wide settings, shared by every process using the database."""
+
+    __tablename__ = "setting"
+
+    name: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[str]
+
+
+CHANGE_INSERT = "insert"
+CHANGE_UPDATE = "update"
+CHANGE_DELETE = "delete"
+
+# Tables derived from other tables, their changes are not logged. Publish
+# dependency changes are logged by atlas_db.dependencies, by dependent publish.
+UNLOGGED_TABLES = {
+    BackfillProgress.__tablename__,
+    ChangeLog.__tablename__,
+    PublishArchive.__tablename__,
+    PublishDependency.__tablename__,
+    PublishSizeRollup.__tablename__,
+    SchemaVersion.__tablename__,
+}
+
+
+def _has_column_changes(entity: Base) -> bool:
+    """Return True if one of entity column values changed, relationships ignored."""
+    state = inspect(entity)
+    return any(
+        state.attrs[column.key].history.has_changes()
+        for column in state.mapper.column_attrs
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _log_changes(session: Session, _flush_context):
+    """Append flushed entity changes to change log, in the flush transaction."""
+    changes = []
+    for entities, operation in (
+        (session.new, CHANGE_INSERT),
+        (session.dirty, CHANGE_UPDATE),
+        (session.deleted, CHANGE_DELETE),
+    ):
+        for entity in entities:
+            if not isinstance(entity, Base) or entity.__tablename__ in UNLOGGED_TABLES:
+                continue
+            if operation == CHANGE_UPDATE and not _has_column_changes(entity):
+                continue
+            changes.append(
+                {
+                    "entity_type": entity.__tablename__,
+                    "entity_id": entity.id,
+                    "operation": operation,
+                }
+            )
+
+    if changes:
+        session.connection().execute(insert(ChangeLog), changes)
+
+
+@event.listens_for(Project, "before_update")
+def _bump_meta_revision(_mapper, _connection, project: Project):
+    """Increment project meta revision when its meta changed."""
+    if inspect(project).attrs.meta.history.has_changes():
+        project.meta_revision += 1
@@ -0,0 +1,199 @@
+"""Entity paging module.
+
+Page through entities of any model, in a stable order::
+
+    page = paging.page(Asset, {"project_id": project.id}, limit=100)
+    while page.cursor is not None:
+        page = paging.page(
+            Asset, {"project_id": project.id}, after=page.cursor, limit=100
+        )
+
+Pages use keyset pagination on (sort key, primary key): a page selects rows
+after the last row of the previous one, held by an opaque cursor, instead of
+skipping rows with OFFSET. Deep pages cost the same as the first one when an
+index covers the filtered columns then the sort key, and is usable by the
+query: a partial index must be filtered on "active = 1", the condition
+rendered for active rows. Rows inserted or removed between two requests never
+shift the following pages.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+
+from datetime import datetime
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import NamedTuple
+
+from sqlalchemy import inspect
+from sqlalchemy import literal
+from sqlalchemy import select
+from sqlalchemy import tuple_
+from sqlalchemy import type_coerce
+from sqlalchemy.types import NullType
+
+from atlas_db.context import DbQueryContext
+from atlas_db.errors import DbInvalidCursorError
+
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+    from sqlalchemy import Column
+
+    from atlas_db.models import Base
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 10000
+
+# Column types sort keys can have. Cursors hold sort values as stored, sqlite
+# stores datetimes as text, in the format of whoever wrote them.
+_SORTABLE_TYPES = (int, str, bool, float, datetime)
+
+
+class Page(NamedTuple):
+    """Entities of a page, and cursor of the next page, None on the last one."""
+
+    items: list[Base]
+    cursor: str | None
+
+
+def _primary_key(model: type[Base]) -> Column:
+    (column,) = inspect(model).primary_key
+    return column
+
+
+def _column(model: type[Base], name: str) -> Column:
+    """Return model column of given attribute name.
+
+    Raises:
+        ValueError: model has no such column.
+    """
+    column = inspect(model).columns.get(name)
+    if column is None:
+        msg = f"{model.__name__} has no column {name!r}."
+        raise ValueError(msg)
+    return column
+
+
+def _sort_column(model: type[Base], name: str) -> Column:
+    """Return model column rows can be sorted by, for keyset pagination.
+
+    Raises:
+        ValueError: column does not exist, is nullable or has no orderable type.
+    """
+    column = _column(model, name)
+    if column.nullable or column.type.python_type not in _SORTABLE_TYPES:
+        msg = f"{model.__name__} cannot be paged by {name!r}, column is not sortable."
+        raise ValueError(msg)
+    return column
+
+
+def encode_cursor(order_by: str, descending: bool, value: Any, key: int) -> str:
+    """Return opaque cursor of a page starting after given sort value and key."""
+    payload = json.dumps([order_by, descending, value, key], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, sort_column: Column, descending: bool) -> tuple[Any, int]:
+    """Return (sort value, key) of cursor made for given sort column and direction.
+
+    Raises:
+        DbInvalidCursorError: cursor is malformed or from another order.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        order_by, cursor_descending, value, key = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as error:
+        msg = f"Malformed page cursor {cursor!r}."
+        raise DbInvalidCursorError(msg) from error
+
+    if order_by != sort_column.key or cursor_descending != descending:
+        msg = (
+            f"Page cursor is ordered by {order_by!r}, not by {sort_column.key!r}"
+            f"{' descending' if descending else ''}."
+        )
+        raise DbInvalidCursorError(msg)
+    # Json scalars only, None for a null sort value, bound as is by page.
+    if (
+        not isinstance(key, int)
+        or isinstance(key, bool)
+        or not (value is None or isinstance(value, (str, int, float, bool)))
+    ):
+        msg = f"Malformed page cursor {cursor!r}."
+        raise DbInvalidCursorError(msg)
+    return value, key
+
+
+def page(
+    model: type[Base],
+    filters: Mapping[str, Any] | None = None,
+    after: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+    order_by: str | None = None,
+    descending: bool = False,
+    include_inactive: bool = False,
+) -> Page:
+    """Return a page of at most limit entities, after cursor of previous page.
+
+    Filters map column names to a value, or to a list, tuple or set of
+    accepted values. Entities are sorted by order_by column then primary key,
+    primary key only by default. Inactive entities are skipped unless
+    include_inactive. A cursor is only valid with the order it was made with,
+    and is meant to be reused with the same filters.
+
+    Raises:
+        ValueError: limit is out of range, or a filter or order column is invalid.
+        DbInvalidCursorError: cursor is malformed or from another order.
+    """
+    if not 0 < limit <= MAX_LIMIT:
+        msg = f"Page limit must be between 1 and {MAX_LIMIT}, got {limit}."
+        raise ValueError(msg)
+
+    key_column = _primary_key(model)
+    sort_column = key_column if order_by is None else _sort_column(model, order_by)
+
+    # Sort value as stored, compared as is by next page.
+    stored_value = type_coerce(sort_column, NullType()).label("stored_value")
+    statement = select(model, stored_value)
+    for name, value in (filters or {}).items():
+        column = _column(model, name)
+        if isinstance(value, (list, tuple, set, frozenset)):
+            statement = statement.where(column.in_(value))
+        else:
+            statement = statement.where(column == value)
+    if not include_inactive and "active" in inspect(model).columns:
+        statement = statement.where(model.active)
+
+    if after is not None:
+        value, key = decode_cursor(after, sort_column, descending)
+        if sort_column is key_column:
+            condition = key_column < key if descending else key_column > key
+        else:
+            keyset = tuple_(sort_column, key_column)
+            bound = tuple_(literal(value), literal(key))
+            condition = keyset < bound if descending else keyset > bound
+        statement = statement.where(condition)
+
+    order = [sort_column, key_column] if sort_column is not key_column else [key_column]
+    if descending:
+        order = [column.desc() for column in order]
+    # One more row than asked tells if a next page exists.
+    statement = statement.order_by(*order).limit(limit + 1)
+
+    with DbQueryContext() as db:
+        db.expire_on_commit = False
+        rows = db.execute(statement).all()
+
+    items = [row[0] for row in rows[:limit]]
+    if len(rows) <= limit:
+        return Page(items, None)
+    last, value = rows[limit - 1]
+    cursor = encode_cursor(
+        sort_column.key, descending, value, getattr(last, key_column.key)
+    )
+    return Page(items, cursor)
@@ -0,0 +1,177 @@
+"""Publish path index module.
+
+Compact on disk index of every publish path, to know if a file is published
+and which publish it is without a database round trip. The file holds sorted
+64 bits path hashes followed by matching (publish id, version, size) records.
+It's memory mapped read only, so processes of a node share the same pages::
+
+    build_index("/shared/atlas/publish_paths.idx")
+    index = PublishPathIndex("/shared/atlas/publish_paths.idx")
+    entry = index.lookup("/show/P/chr/hero/model/v003/hero.abc")
+
+Hashes are not checked against full paths, the false positive probability is
+about count² / 2^65, negligible for a few tens of millions publishes.
+"""
+
+from __future__ import annotations
+
+import bisect
+import contextlib
+import hashlib
+import mmap
+import os
+import struct
+
+from typing import NamedTuple
+
+from sqlalchemy import func
+from sqlalchemy import select
+
+from atlas_db import context
+from atlas_db.models import ChangeLog
+from atlas_db.models import Publish
+
+
+MAGIC = b"ATLPIDX1"
+# Magic, publish count, database change sequence.
+HEADER = struct.Struct("<8sqq")
+# Publish id, version and size.
+RECORD = struct.Struct("<qqq")
+HASH_SIZE = 8
+BATCH_SIZE = 10000
+
+
+class PublishPathEntry(NamedTuple):
+    """Indexed publish of a path."""
+
+    id: int
+    version: int
+    size: int
+
+
+def path_hash(path: str) -> int:
+    """Return signed 64 bits hash of path."""
+    digest = hashlib.blake2b(path.encode("utf-8"), digest_size=HASH_SIZE).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def build_index(path: str, batch_size: int = BATCH_SIZE) -> int:
+    """Build publish path index file from database, return indexed publish count.
+
+    Rows are sorted by the database, so memory usage does not depend on the
+    publish count. New file atomically replaces previous one.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with context.get_engine().connect() as connection:
+        connection.connection.driver_connection.create_function(
+            "atlas_path_hash", 1, path_hash, deterministic=True
+        )
+        with connection.begin():
+            count = connection.scalar(select(func.count(Publish.id)))
+            sequence = connection.scalar(select(func.max(ChangeLog.sequence))) or 0
+            result = connection.execution_options(
+                stream_results=True, yield_per=batch_size
+            ).execute(
+                select(
+                    func.atlas_path_hash(Publish.path).label("hash"),
+                    Publish.id,
+                    Publish.version,
+                    Publish.size,
+                ).order_by("hash")
+            )
+
+            hash_offset = HEADER.size
+            record_offset = hash_offset + count * HASH_SIZE
+            written = 0
+            with open(temp_path, "wb") as stream:
+                stream.write(HEADER.pack(MAGIC, count, sequence))
+                stream.truncate(record_offset + count * RECORD.size)
+                for rows in result.partitions():
+                    stream.seek(hash_offset + written * HASH_SIZE)
+                    stream.write(struct.pack(f"<{len(rows)}q", *(row[0] for row in rows)))
+                    stream.seek(record_offset + written * RECORD.size)
+                    stream.write(b"".join(RECORD.pack(*row[1:]) for row in rows))
+                    written += len(rows)
+
+    os.replace(temp_path, path)
+    return written
+
+
+class PublishPathIndex:
+    """Read only memory mapped publish path index."""
+
+    def __init__(self, path: str):
+        self._path = path
+        self._stat: os.stat_result | None = None
+        self._file = None
+        self._mmap: mmap.mmap | None = None
+        self._hashes: memoryview | None = None
+        self._record_offset = 0
+        self.count = 0
+        self.version = 0
+        self._open()
+
+    def _open(self):
+        """Map index file."""
+        self.close()
+        self._file = open(self._path, "rb")  # noqa: SIM115
+        self._stat = os.fstat(self._file.fileno())
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self.version = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self.close()
+            msg = f"{self._path!r} is not a publish path index."
+            raise ValueError(msg)
+
+        hash_end = HEADER.size + self.count * HASH_SIZE
+        self._hashes = memoryview(self._mmap)[HEADER.size : hash_end].cast("q")
+        self._record_offset = hash_end
+
+    def close(self):
+        """Unmap index file."""
+        if self._hashes is not None:
+            self._hashes.release()
+            self._hashes = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def refresh(self) -> bool:
+        """Map index file again if it was rebuilt, return True if so."""
+        with contextlib.suppress(FileNotFoundError):
+            stat = os.stat(self._path)
+            if (stat.st_ino, stat.st_mtime_ns) != (
+                self._stat.st_ino,
+                self._stat.st_mtime_ns,
+            ):
+                self._open()
+                return True
+        return False
+
+    def lookup(self, path: str) -> PublishPathEntry | None:
+        """Return indexed publish of path, None if path is not published."""
+        value = path_hash(path)
+        row = bisect.bisect_left(self._hashes, value)
+        if row == self.count or self._hashes[row] != value:
+            return None
+        return PublishPathEntry._make(
+            RECORD.unpack_from(self._mmap, self._record_offset + row * RECORD.size)
+        )
+
+    def __contains__(self, path: str) -> bool:
+        value = path_hash(path)
+        row = bisect.bisect_left(self._hashes, value)
+        return row < self.count and self._hashes[row] == value
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
@@ -0,0 +1,218 @@
+"""Project environment module.
+
+Resolve project meta into a ready to use environment mapping. Resolved
+environments are cached by project and only resolved again when project meta
+revision changed, which costs a single scalar query.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+
+from typing import TYPE_CHECKING
+from typing import Any
+
+from sqlalchemy import select
+
+from atlas_const import c_db
+from atlas_db.context import DbQueryContext
+from atlas_db.errors import MissingDbProjectError
+from atlas_db.models import Project
+
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+
+
+# $NAME or ${NAME} references.
+_VARIABLE_RE = re.compile(r"\$(?:(\w+)|\{(\w+)\})")
+# Maximum nested references, protects from reference cycles.
+MAX_EXPANSION_DEPTH = 10
+
+_lock = threading.Lock()
+_env_by_code: dict[str, ProjectEnv] = {}
+
+
+class ProjectEnv:
+    """Resolved project environment."""
+
+    __slots__ = ("code", "name", "revision", "versions", "_env")
+
+    def __init__(
+        self,
+        code: str,
+        name: str,
+        revision: int,
+        versions: dict[str, str],
+        env: dict[str, str],
+    ):
+        self.code = code
+        self.name = name
+        self.revision = revision
+        self.versions = versions
+        self._env = env
+
+    @property
+    def root_path(self) -> str:
+        """Return project root path."""
+        return self._env["ATLAS_PROJECT_ROOT_PATH"]
+
+    def version(self, software: str) -> str | None:
+        """Return project version of given software, None if not set."""
+        return self.versions.get(software)
+
+    def get(self, name: str, default: str | None = None) -> str | None:
+        """Return resolved environment variable value."""
+        return self._env.get(name, default)
+
+    def environ(self) -> dict[str, str]:
+        """Return a copy of resolved environment, ready to update os.environ."""
+        return dict(self._env)
+
+
+def _version_variable(software: str) -> str:
+    """Return environment variable name of software version."""
+    return f"ATLAS_{re.sub(r'\W', '_', software).upper()}_VERSION"
+
+
+def expand(
+    value: str,
+    env: Mapping[str, str],
+    base_env: Mapping[str, str],
+    variable: str | None = None,
+) -> str:
+    """Expand $NAME and ${NAME} references from env, then from base_env.
+
+    References to variable itself, like PATH=$PATH:..., are expanded from
+    base_env only. Unknown references are left as is.
+    """
+
+    def _replace(match: re.Match) -> str:
+        name = match.group(1) or match.group(2)
+        if name == variable:
+            return base_env.get(name, "")
+        return env.get(name, base_env.get(name, match.group(0)))
+
+    for _ in range(MAX_EXPANSION_DEPTH):
+        if "$" not in value:
+            break
+        expanded = _VARIABLE_RE.sub(_replace, value)
+        if expanded == value:
+            break
+        value = expanded
+
+    return value
+
+
+def _expand_self(value: str, variable: str, base_env: Mapping[str, str]) -> str:
+    """Expand references to variable itself from base_env, empty if missing."""
+    return _VARIABLE_RE.sub(
+        lambda match: (
+            base_env.get(variable, "")
+            if (match.group(1) or match.group(2)) == variable
+            else match.group(0)
+        ),
+        value,
+    )
+
+
+def expand_env(env: Mapping[str, str], base_env: Mapping[str, str]) -> dict[str, str]:
+    """Return env with its references expanded, see expand.
+
+    Self references are expanded first, so variables referencing PATH of
+    PATH=$PATH:... get its extended value.
+    """
+    env = {key: _expand_self(value, key, base_env) for key, value in env.items()}
+    return {key: expand(value, env, base_env, key) for key, value in env.items()}
+
+
+def unexpanded_env(
+    code: str, name: str, meta: Mapping[str, Any]
+) -> tuple[dict[str, str], dict[str, str]]:
+    """Return (env, versions) of project meta, env references not expanded yet.
+
+    Meta env inherits from minimal project env defaults. Software versions are
+    exported as ATLAS_<SOFTWARE>_VERSION variables.
+    """
+    versions = {
+        str(software): str(version)
+        for software, version in {
+            **c_db.MINIMAL_PROJECT_ENV["versions"],
+            **meta.get("versions", {}),
+        }.items()
+    }
+    env = {
+        "ATLAS_PROJECT_CODE": code,
+        "ATLAS_PROJECT_NAME": name,
+        **{
+            _version_variable(software): version
+            for software, version in versions.items()
+        },
+        **{
+            str(key): str(value)
+            for key, value in {
+                **c_db.MINIMAL_PROJECT_ENV["env"],
+                **meta.get("env", {}),
+            }.items()
+        },
+    }
+    return env, versions
+
+
+def resolve_env(
+    code: str,
+    name: str,
+    meta: Mapping[str, Any],
+    base_env: Mapping[str, str] | None = None,
+) -> tuple[dict[str, str], dict[str, str]]:
+    """Return (env, versions) resolved from project meta.
+
+    References to other variables are expanded, from the project env first
+    then from base_env (current process environment by default).
+    """
+    env, versions = unexpanded_env(code, name, meta)
+    return expand_env(env, os.environ if base_env is None else base_env), versions
+
+
+def get_project_env(code: str) -> ProjectEnv:
+    """Return resolved environment of given project code.
+
+    Cached environment is returned while project meta revision and name did not
+    change, the name is exported as ATLAS_PROJECT_NAME.
+    """
+    with DbQueryContext() as db:
+        row = db.execute(
+            select(Project.meta_revision, Project.name).where(Project.code == code)
+        ).one_or_none()
+        if row is None:
+            msg = f"Project {code!r} does not exist."
+            raise MissingDbProjectError(msg)
+
+        with _lock:
+            project_env = _env_by_code.get(code)
+        if project_env is not None and (project_env.revision, project_env.name) == (
+            row.meta_revision,
+            row.name,
+        ):
+            return project_env
+
+        name, meta, revision = db.execute(
+            select(Project.name, Project.meta, Project.meta_revision).where(
+                Project.code == code
+            )
+        ).one()
+
+    env, versions = resolve_env(code, name, meta)
+    project_env = ProjectEnv(code, name, revision, versions, env)
+    with _lock:
+        _env_by_code[code] = project_env
+
+    return project_env
+
+
+def clear_cache():
+    """Forget every resolved project environment."""
+    with _lock:
+        _env_by_code.clear()
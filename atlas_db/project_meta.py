@@ -0,0 +1,232 @@
+"""Project metadata module.
+
+Edit project meta with JSON patch like operations instead of rewriting the
+whole document::
+
+    meta = parse_meta(text)
+    patch = diff_meta(project.meta, meta)
+    revision = patch_project_meta(project.id, patch, project.meta_revision)
+
+Patch operations are applied by the database in a single UPDATE, which fails
+with DbProjectMetaConflictError if meta was edited since expected revision.
+update_project applies a patch and other project columns together to a loaded
+project.
+"""
+
+from __future__ import annotations
+
+import json
+
+from typing import TYPE_CHECKING
+from typing import Any
+
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import update
+from sqlalchemy.ext.mutable import MutableDict
+from sqlalchemy.orm.attributes import set_committed_value
+
+from atlas_db.changes import log_bulk_changes
+from atlas_db.context import DbCommitContext
+from atlas_db.errors import DbEntityConflictError
+from atlas_db.errors import DbProjectMetaConflictError
+from atlas_db.errors import MissingDbProjectError
+from atlas_db.models import CHANGE_UPDATE
+from atlas_db.models import Project
+
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+
+OP_ADD = "add"
+OP_REPLACE = "replace"
+OP_REMOVE = "remove"
+
+
+def _reject_constant(value: str):
+    msg = f"Invalid JSON value {value!r}."
+    raise ValueError(msg)
+
+
+def _unique_keys(pairs: list[tuple[str, Any]]) -> dict[str, Any]:
+    result = dict(pairs)
+    if len(result) != len(pairs):
+        keys = [key for key, _ in pairs]
+        duplicates = sorted({key for key in keys if keys.count(key) > 1})
+        msg = f"Duplicate keys {duplicates}."
+        raise ValueError(msg)
+    return result
+
+
+def parse_meta(text: str) -> dict[str, Any]:
+    """Parse project meta JSON text.
+
+    Raises:
+        ValueError: text is not a JSON object, has duplicate keys, or NaN and
+            Infinity values.
+    """
+    meta = json.loads(
+        text, object_pairs_hook=_unique_keys, parse_constant=_reject_constant
+    )
+    if not isinstance(meta, dict):
+        msg = f"Project meta must be a JSON object, not {type(meta).__name__}."
+        raise ValueError(msg)
+    return meta
+
+
+def _pointer(parent: str, key: str) -> str:
+    """Return JSON pointer of key in parent pointer."""
+    return f"{parent}/{key.replace('~', '~0').replace('/', '~1')}"
+
+
+def _json_path(pointer: str) -> str:
+    """Return sqlite JSON path of JSON pointer."""
+    keys = [
+        key.replace("~1", "/").replace("~0", "~") for key in pointer.split("/")[1:]
+    ]
+    return "$" + "".join(f'."{key}"' for key in keys)
+
+
+def _is_patchable(key: str) -> bool:
+    """Return True if key can be addressed by a sqlite JSON path."""
+    return '"' not in key
+
+
+def _diff(old: Any, new: Any, pointer: str, patch: list[dict[str, Any]]):
+    if not (
+        isinstance(old, dict)
+        and isinstance(new, dict)
+        and all(_is_patchable(key) for key in old.keys() | new.keys())
+    ):
+        patch.append({"op": OP_REPLACE, "path": pointer, "value": new})
+        return
+
+    for key, value in old.items():
+        if key not in new:
+            patch.append({"op": OP_REMOVE, "path": _pointer(pointer, key)})
+        elif new[key] != value:
+            _diff(value, new[key], _pointer(pointer, key), patch)
+
+    for key, value in new.items():
+        if key not in old:
+            patch.append({"op": OP_ADD, "path": _pointer(pointer, key), "value": value})
+
+
+def diff_meta(old: dict[str, Any], new: dict[str, Any]) -> list[dict[str, Any]]:
+    """Return key level patch operations turning old meta into new meta.
+
+    Operations are JSON patch like dicts, with op (add, replace or remove),
+    path as JSON pointer, and value. Nested objects are compared key by key.
+    """
+    patch = []
+    if old != new:
+        _diff(old, new, "", patch)
+    return patch
+
+
+def _meta_expression(patch: Sequence[dict[str, Any]]):
+    """Return SQL expression applying patch to project meta column."""
+    expression = Project.meta
+    set_arguments = []
+    remove_paths = []
+    for operation in patch:
+        op, pointer = operation["op"], operation["path"]
+        if op in {OP_ADD, OP_REPLACE}:
+            value = func.json(json.dumps(operation["value"]))
+            if not pointer:
+                # Whole document, discard previous operations.
+                expression, set_arguments, remove_paths = value, [], []
+                continue
+            set_arguments.extend((_json_path(pointer), value))
+        elif op == OP_REMOVE:
+            remove_paths.append(_json_path(pointer))
+        else:
+            msg = f"Unsupported patch operation {op!r}."
+            raise ValueError(msg)
+
+    if set_arguments:
+        expression = func.json_set(expression, *set_arguments)
+    if remove_paths:
+        expression = func.json_remove(expression, *remove_paths)
+    return expression
+
+
+def patch_project_meta(
+    project_id: int, patch: Sequence[dict[str, Any]], revision: int
+) -> int:
+    """Apply patch to project meta and return new meta revision.
+
+    Raises:
+        MissingDbProjectError: project does not exist.
+        DbProjectMetaConflictError: meta revision is not the expected one,
+            meta was edited by someone else.
+    """
+    if not patch:
+        return revision
+
+    with DbCommitContext() as db:
+        result = db.execute(
+            update(Project)
+            .where(Project.id == project_id, Project.meta_revision == revision)
+            .values(
+                meta=_meta_expression(patch),
+                meta_revision=Project.meta_revision + 1,
+                version_id=Project.version_id + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            current = db.scalar(
+                select(Project.meta_revision).where(Project.id == project_id)
+            )
+            if current is None:
+                msg = f"Project {project_id} does not exist."
+                raise MissingDbProjectError(msg)
+            msg = (
+                f"Project {project_id} meta revision is {current}, "
+                f"not {revision}: it was edited meanwhile."
+            )
+            raise DbProjectMetaConflictError(msg)
+
+        log_bulk_changes(db, Project, [project_id], CHANGE_UPDATE)
+
+    return revision + 1
+
+
+def update_project(project: Project, patch: Sequence[dict[str, Any]], **values: Any):
+    """Apply meta patch and column values to project with a single conditional UPDATE.
+
+    The row is only updated if its version is still the one project was read
+    with, then project attributes, meta, meta revision and version are set
+    without reloading it, like helpers.update_entity.
+
+    Raises:
+        DbEntityConflictError: project was updated or deleted meanwhile.
+    """
+    if patch:
+        values["meta"] = _meta_expression(patch)
+        values["meta_revision"] = Project.meta_revision + 1
+    with DbCommitContext() as db:
+        row = db.execute(
+            update(Project)
+            .where(Project.id == project.id, Project.version_id == project.version_id)
+            .values(**values, version_id=Project.version_id + 1)
+            .returning(Project.meta, Project.meta_revision, Project.version_id)
+            .execution_options(synchronize_session=False)
+        ).one_or_none()
+        if row is None:
+            msg = (
+                f"Project {project.id} was updated or deleted "
+                f"since version {project.version_id} was read."
+            )
+            raise DbEntityConflictError(msg)
+
+        log_bulk_changes(db, Project, [project.id], CHANGE_UPDATE)
+
+    for name, value in values.items():
+        if name not in {"meta", "meta_revision"}:
+            set_committed_value(project, name, value)
+    set_committed_value(project, "meta", MutableDict.coerce("meta", row.meta))
+    set_committed_value(project, "meta_revision", row.meta_revision)
+    set_committed_value(project, "version_id", row.version_id)
@@ -0,0 +1,273 @@
+"""Entity search module.
+
+Substring search over entity codes and names, backed by a sqlite FTS5
+trigram index::
+
+    create_search_index()  # Once by database.
+    hits = search("chair", limit=20)
+    hits = search("*_chair_*", entity_types=[Asset])
+
+Index rows are written by database triggers, so every writer, bulk statements
+included, keeps it up to date. Only active entities are indexed. Queries of at
+least 3 characters are answered from the index, shorter ones scan it. The
+index lives in the main database only, searches never use a snapshot.
+"""
+
+from __future__ import annotations
+
+import re
+
+from typing import TYPE_CHECKING
+from typing import NamedTuple
+
+from sqlalchemy import and_
+from sqlalchemy import column
+from sqlalchemy import func
+from sqlalchemy import literal_column
+from sqlalchemy import select
+from sqlalchemy import table
+from sqlalchemy import text
+from sqlalchemy import union
+
+from atlas_db import context
+from atlas_db.models import Asset
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import TaskType
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from sqlalchemy import Connection
+
+    from atlas_db.models import Base
+
+
+SEARCH_TABLE = "search_index"
+DEFAULT_LIMIT = 50
+# Trigram index only answers queries of at least this length.
+MIN_INDEXED_LENGTH = 3
+# Matches ranked by search, broad queries stop collecting matches there.
+MAX_CANDIDATES = 1000
+
+# Indexed (entity type, column) by kind. Index row id is entity id times
+# KIND_COUNT plus kind, so trigger updates and deletes are row id lookups.
+FIELDS: tuple[tuple[type[Base], str], ...] = (
+    (Project, "code"),
+    (Project, "name"),
+    (Asset, "code"),
+    (TaskType, "name"),
+    (Publish, "code"),
+)
+KIND_COUNT = 8
+
+_WILDCARD_RE = re.compile(r"[*?]")
+
+_search_table = table(SEARCH_TABLE, column("rowid"), column("term"))
+
+
+class SearchHit(NamedTuple):
+    """Entity matching a search, with the matched column and its value."""
+
+    entity_type: type[Base]
+    entity_id: int
+    field: str
+    text: str
+
+
+def _fields_by_table() -> dict[str, list[tuple[int, str]]]:
+    """Return (kind, column) of indexed fields by table name."""
+    fields: dict[str, list[tuple[int, str]]] = {}
+    for kind, (entity_type, name) in enumerate(FIELDS):
+        fields.setdefault(entity_type.__tablename__, []).append((kind, name))
+    return fields
+
+
+def _index_ddl() -> list[str]:
+    """Return statements creating search table and its triggers."""
+    statements = [
+        (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} "
+            "USING fts5(term, tokenize='trigram')"
+        )
+    ]
+    for table_name, fields in _fields_by_table().items():
+        inserts = "".join(
+            f"INSERT INTO {SEARCH_TABLE}(rowid, term) "
+            f"SELECT new.id * {KIND_COUNT} + {kind}, new.{name} WHERE new.active; "
+            for kind, name in fields
+        )
+        deletes = "".join(
+            f"DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id * {KIND_COUNT} + {kind}; "
+            for kind, _ in fields
+        )
+        columns = ", ".join([*(name for _, name in fields), "active"])
+        trigger = f"CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_{table_name}"
+        statements.extend(
+            (
+                f"{trigger}_insert AFTER INSERT ON {table_name} BEGIN {inserts}END",
+                (
+                    f"{trigger}_update AFTER UPDATE OF {columns} ON {table_name} "
+                    f"BEGIN {deletes}{inserts}END"
+                ),
+                f"{trigger}_delete AFTER DELETE ON {table_name} BEGIN {deletes}END",
+            )
+        )
+    return statements
+
+
+def _fill_index(connection: Connection):
+    """Index every active entity, search table must be empty."""
+    for kind, (entity_type, name) in enumerate(FIELDS):
+        connection.execute(
+            text(
+                f"INSERT INTO {SEARCH_TABLE}(rowid, term) "
+                f"SELECT id * {KIND_COUNT} + {kind}, {name} "
+                f"FROM {entity_type.__tablename__} WHERE active"
+            )
+        )
+
+
+def is_search_enabled(connection: Connection | None = None) -> bool:
+    """Return True if search index exists in database."""
+    statement = text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"
+    ).bindparams(name=SEARCH_TABLE)
+    if connection is not None:
+        return connection.scalar(statement) is not None
+    with context.get_engine().connect() as connection:
+        return connection.scalar(statement) is not None
+
+
+def create_search_index(connection: Connection | None = None):
+    """Create and fill search index and its triggers, if it does not exist."""
+    if connection is None:
+        with context.get_engine().begin() as connection:
+            create_search_index(connection)
+        return
+
+    if is_search_enabled(connection):
+        return
+    for statement in _index_ddl():
+        connection.exec_driver_sql(statement)
+    _fill_index(connection)
+
+
+def rebuild_search_index():
+    """Index every active entity again, after index was corrupted or dropped rows."""
+    with context.get_engine().begin() as connection:
+        connection.exec_driver_sql(f"DELETE FROM {SEARCH_TABLE}")
+        _fill_index(connection)
+        connection.exec_driver_sql(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')"
+        )
+
+
+def drop_search_index():
+    """Remove search index and its triggers."""
+    with context.get_engine().begin() as connection:
+        for table_name in _fields_by_table():
+            for operation in ("insert", "update", "delete"):
+                connection.exec_driver_sql(
+                    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_{table_name}_{operation}"
+                )
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def _phrase(fragment: str) -> str:
+    """Return FTS5 phrase matching fragment as a substring."""
+    return '"{}"'.format(fragment.replace('"', '""'))
+
+
+def _match_condition(query: str):
+    """Return search table condition matching query.
+
+    Query is matched as a case insensitive substring, or as a glob pattern if
+    it holds * or ? wildcards. Other glob characters match themselves.
+    """
+    term = _search_table.c.term
+    if _WILDCARD_RE.search(query):
+        fragments = [
+            fragment
+            for fragment in _WILDCARD_RE.split(query)
+            if len(fragment) >= MIN_INDEXED_LENGTH
+        ]
+        # "[" opens a glob character set, "[[]" matches it literally.
+        pattern = query.lower().replace("[", "[[]")
+        condition = func.lower(term).op("GLOB")(pattern)
+        if fragments:
+            # Trigram lookup of literal parts, glob only filters found rows.
+            match = " AND ".join(_phrase(fragment) for fragment in fragments)
+            condition = and_(literal_column(SEARCH_TABLE).op("MATCH")(match), condition)
+        return condition
+
+    if len(query) >= MIN_INDEXED_LENGTH:
+        return literal_column(SEARCH_TABLE).op("MATCH")(_phrase(query))
+    return term.icontains(query, autoescape=True)
+
+
+def search(
+    query: str,
+    entity_types: Iterable[type[Base]] | None = None,
+    limit: int = DEFAULT_LIMIT,
+) -> list[SearchHit]:
+    """Return at most limit entities matching query, best matches first.
+
+    Exact matches come first, then prefix matches, then other matches, shorter
+    values first. Only the first MAX_CANDIDATES prefix matches and
+    MAX_CANDIDATES other matches are ranked, so broad queries cost the same as
+    narrow ones and still return exact matches. An entity matching with
+    several fields is returned once.
+    """
+    query = query.strip()
+    if not query:
+        return []
+
+    rowid = _search_table.c.rowid
+    needle = query.lower()
+    conditions = [_match_condition(query)]
+    if entity_types is not None:
+        types = set(entity_types)
+        kinds = [
+            kind for kind, (entity_type, _) in enumerate(FIELDS) if entity_type in types
+        ]
+        conditions.append((rowid % KIND_COUNT).in_(kinds))
+    # Prefix matches, exact ones included, are collected apart so broad queries keep
+    # them whatever their position in the index.
+    prefixed = func.lower(_search_table.c.term).startswith(needle, autoescape=True)
+    candidates = union(
+        *(
+            select(
+                select(rowid, _search_table.c.term)
+                .where(*conditions, *extra)
+                .limit(MAX_CANDIDATES)
+                .subquery()
+            )
+            for extra in ([prefixed], [])
+        )
+    ).subquery()
+
+    term = func.lower(candidates.c.term)
+    statement = (
+        select(candidates.c.rowid, candidates.c.term)
+        .order_by(
+            (term == needle).desc(),
+            term.startswith(needle, autoescape=True).desc(),
+            func.length(term),
+            candidates.c.rowid,
+        )
+        .limit(limit)
+    )
+
+    hits = []
+    seen = set()
+    with context.get_engine().connect() as connection:
+        for row_id, value in connection.execute(statement):
+            entity_id, kind = divmod(row_id, KIND_COUNT)
+            entity_type, field = FIELDS[kind]
+            if (entity_type, entity_id) in seen:
+                continue
+            seen.add((entity_type, entity_id))
+            hits.append(SearchHit(entity_type, entity_id, field, value))
+    return hits
@@ -0,0 +1,591 @@
+"""Local query service module.
+
+A daemon run on each render node, so short lived processes ask it instead of
+connecting to the database themselves::
+
+    python -m atlas_db.service --address unix:/tmp/atlas_db.sock
+
+    client = ServiceClient("unix:/tmp/atlas_db.sock")
+    asset = client.asset("P", "hero", "chr")
+
+Service keeps a warm async engine and a cache of lookup results, cleared when
+database change log moves. Identical concurrent requests share the same
+pending result, and cache misses received during a short batch window are
+fetched with a single query by lookup kind.
+
+Requests and responses are json lines, {"id", "op", "args"} and
+{"id", "result"} or {"id", "error": {"type", "message"}}. Rows are returned
+as column dicts.
+"""
+
+from __future__ import annotations
+
+import abc
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+
+from typing import TYPE_CHECKING
+from typing import Any
+
+from sqlalchemy import func
+from sqlalchemy import select
+from sqlalchemy import tuple_
+
+from atlas_db import aio
+from atlas_db import errors
+from atlas_db.models import Asset
+from atlas_db.models import AssetType
+from atlas_db.models import ChangeLog
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishType
+from atlas_db.models import Task
+from atlas_db.models import TaskType
+from atlas_db.project_env import ProjectEnv
+from atlas_db.project_env import expand_env
+from atlas_db.project_env import unexpanded_env
+
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+    from collections.abc import Callable
+    from collections.abc import Hashable
+    from collections.abc import Sequence
+
+
+logger = logging.getLogger("atlas_db.service")
+
+SERVICE_ADDRESS_ENV = "ATLAS_DB_SERVICE"
+DEFAULT_ADDRESS = f"unix:{os.path.join(tempfile.gettempdir(), 'atlas_db.sock')}"
+
+# Seconds misses are collected before being fetched together.
+BATCH_WINDOW = 0.002
+# Maximum keys fetched by a single query.
+MAX_BATCH_SIZE = 500
+# Seconds between database change log checks, new changes clear caches.
+CHANGES_POLL_INTERVAL = 1.0
+
+
+def get_address() -> str:
+    """Return service address from ATLAS_DB_SERVICE environment variable."""
+    return os.environ.get(SERVICE_ADDRESS_ENV) or DEFAULT_ADDRESS
+
+
+def parse_address(address: str) -> tuple[str, Any]:
+    """Return ("unix", path) or ("tcp", (host, port)) of service address.
+
+    Address is "unix:<socket path>" or "tcp:<host>:<port>".
+    """
+    kind, _, location = address.partition(":")
+    if kind == "unix" and location:
+        return kind, location
+    if kind == "tcp":
+        host, _, port = location.rpartition(":")
+        if host and port.isdigit():
+            return kind, (host, int(port))
+    msg = f"Invalid service address {address!r}."
+    raise ValueError(msg)
+
+
+def _missing(error_type: type[Exception], label: str) -> Callable[[Any], Exception]:
+    """Return missing key error factory of a lookup kind."""
+    return lambda key: error_type(f"{label} {key!r} does not exist.")
+
+
+class _Batcher:
+    """Cache, coalesce and batch lookups of one kind.
+
+    Fetch coroutine gets a list of keys and returns found rows by key.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[list[Hashable]], Awaitable[dict[Hashable, Any]]],
+        missing: Callable[[Hashable], Exception],
+        window: float,
+    ):
+        self._fetch = fetch
+        self._missing = missing
+        self._window = window
+        self._cache: dict[Hashable, Any] = {}
+        self._pending: dict[Hashable, asyncio.Future] = {}
+        self._queue: list[Hashable] = []
+        self._flush_task: asyncio.Task | None = None
+        # Incremented on clear, results fetched before are not cached.
+        self._generation = 0
+        self.stats = {"requests": 0, "hits": 0, "coalesced": 0, "queries": 0}
+
+    def clear(self):
+        """Forget cached results."""
+        self._cache.clear()
+        self._generation += 1
+
+    async def get(self, key: Hashable) -> Any:
+        """Return row of key, from cache, a pending request or next batch."""
+        self.stats["requests"] += 1
+        if key in self._cache:
+            self.stats["hits"] += 1
+            return self._cache[key]
+
+        future = self._pending.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            future = self._pending[key] = asyncio.get_running_loop().create_future()
+            self._queue.append(key)
+            if self._flush_task is None:
+                self._flush_task = asyncio.create_task(self._flush())
+        return await asyncio.shield(future)
+
+    async def _flush(self):
+        await asyncio.sleep(self._window)
+        keys, self._queue, self._flush_task = self._queue, [], None
+        generation = self._generation
+        for start in range(0, len(keys), MAX_BATCH_SIZE):
+            chunk = keys[start : start + MAX_BATCH_SIZE]
+            self.stats["queries"] += 1
+            try:
+                rows = await self._fetch(chunk)
+            except Exception as error:  # noqa: BLE001
+                for key in chunk:
+                    self._pending.pop(key).set_exception(error)
+                continue
+
+            for key in chunk:
+                future = self._pending.pop(key)
+                if key not in rows:
+                    future.set_exception(self._missing(key))
+                    continue
+                if generation == self._generation:
+                    self._cache[key] = rows[key]
+                future.set_result(rows[key])
+
+
+class LineServer(abc.ABC):
+    """Json lines request server, subclasses answer requests in handle.
+
+    Requests of a connection are handled concurrently, responses are written
+    as they complete.
+    """
+
+    def __init__(self, address: str):
+        self.address = address
+        self._server: asyncio.Server | None = None
+
+    @abc.abstractmethod
+    async def handle(self, op: str, args: Sequence[Any]) -> Any:
+        """Return result of op request."""
+
+    async def _respond(self, request: dict[str, Any], writer: asyncio.StreamWriter):
+        response: dict[str, Any] = {"id": request.get("id")}
+        try:
+            response["result"] = await self.handle(
+                request["op"], request.get("args", [])
+            )
+        except Exception as error:  # noqa: BLE001
+            response["error"] = {"type": type(error).__name__, "message": str(error)}
+        writer.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+
+    async def _on_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                task = asyncio.create_task(self._respond(json.loads(line), writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+            await writer.drain()
+        except (ConnectionError, json.JSONDecodeError) as error:
+            logger.warning("Client connection closed: %s", error)
+        finally:
+            writer.close()
+
+    async def _listen(self):
+        """Open server socket."""
+        kind, location = parse_address(self.address)
+        if kind == "unix":
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(location)
+            self._server = await asyncio.start_unix_server(self._on_client, location)
+        else:
+            self._server = await asyncio.start_server(self._on_client, *location)
+
+    async def _stop_listening(self):
+        """Close server socket and client connections."""
+        if self._server is not None:
+            self._server.close()
+            self._server.close_clients()
+            await self._server.wait_closed()
+
+
+class QueryService(LineServer):
+    """Local lookup service, see module docstring."""
+
+    def __init__(self, address: str | None = None, window: float = BATCH_WINDOW):
+        super().__init__(address or get_address())
+        self._poll_task: asyncio.Task | None = None
+        self._sequence = 0
+        self._batchers = {
+            "project": _Batcher(
+                self._fetch_projects,
+                _missing(errors.MissingDbProjectError, "Project"),
+                window,
+            ),
+            "asset": _Batcher(
+                self._fetch_assets, _missing(errors.MissingDbAssetError, "Asset"), window
+            ),
+            "task": _Batcher(
+                self._fetch_tasks, _missing(errors.MissingDbTaskError, "Task"), window
+            ),
+            "latest_publish": _Batcher(
+                self._fetch_latest_publishes,
+                _missing(errors.MissingDbPublishError, "Publish of task"),
+                window,
+            ),
+            "publish_by_path": _Batcher(
+                self._fetch_publishes_by_path,
+                _missing(errors.MissingDbPublishError, "Publish of path"),
+                window,
+            ),
+            "project_env": _Batcher(
+                self._fetch_project_envs,
+                _missing(errors.MissingDbProjectError, "Project"),
+                window,
+            ),
+        }
+
+    async def _fetch(self, statement) -> list[dict[str, Any]]:
+        """Return statement rows as column dicts."""
+        async with aio.AsyncDbQueryContext() as db:
+            return [dict(row) for row in (await db.execute(statement)).mappings()]
+
+    async def _fetch_projects(self, codes: list[str]) -> dict:
+        rows = await self._fetch(
+            select(Project.__table__).where(Project.code.in_(codes), Project.active)
+        )
+        return {row["code"]: row for row in rows}
+
+    async def _fetch_assets(self, keys: list[tuple[str, str, str]]) -> dict:
+        rows = await self._fetch(
+            select(
+                Asset.__table__,
+                Project.code.label("project_code"),
+                AssetType.code.label("asset_type_code"),
+            )
+            .join(Project)
+            .join(AssetType)
+            .where(
+                tuple_(Project.code, Asset.code, AssetType.code).in_(keys),
+                Asset.active,
+            )
+        )
+        return {
+            (row["project_code"], row["code"], row["asset_type_code"]): row
+            for row in rows
+        }
+
+    async def _fetch_tasks(self, keys: list[tuple[str, str, str, str]]) -> dict:
+        rows = await self._fetch(
+            select(
+                Task.__table__,
+                Project.code.label("project_code"),
+                Asset.code.label("asset_code"),
+                AssetType.code.label("asset_type_code"),
+                TaskType.code.label("task_type_code"),
+            )
+            .join(Asset, Task.asset_id == Asset.id)
+            .join(Project, Asset.project_id == Project.id)
+            .join(AssetType, Asset.asset_type_id == AssetType.id)
+            .join(TaskType, Task.task_type_id == TaskType.id)
+            .where(
+                tuple_(Project.code, Asset.code, AssetType.code, TaskType.code).in_(keys),
+                Task.active,
+                Asset.active,
+            )
+        )
+        return {
+            (
+                row["project_code"],
+                row["asset_code"],
+                row["asset_type_code"],
+                row["task_type_code"],
+            ): row
+            for row in rows
+        }
+
+    async def _fetch_latest_publishes(self, keys: list[tuple[int, str]]) -> dict:
+        ranked = (
+            select(
+                Publish.__table__,
+                PublishType.code.label("publish_type_code"),
+                func.row_number()
+                .over(
+                    partition_by=Publish.version_stream(),
+                    order_by=Publish.version.desc(),
+                )
+                .label("rank"),
+            )
+            .join(PublishType)
+            .where(tuple_(Publish.task_id, PublishType.code).in_(keys), Publish.active)
+            .subquery()
+        )
+        rows = await self._fetch(select(ranked).where(ranked.c.rank == 1))
+        return {
+            (row["task_id"], row["publish_type_code"]): {
+                key: value for key, value in row.items() if key != "rank"
+            }
+            for row in rows
+        }
+
+    async def _fetch_publishes_by_path(self, paths: list[str]) -> dict:
+        rows = await self._fetch(select(Publish.__table__).where(Publish.path.in_(paths)))
+        return {row["path"]: row for row in rows}
+
+    async def _fetch_project_envs(self, codes: list[str]) -> dict:
+        rows = await self._fetch(
+            select(Project.code, Project.name, Project.meta, Project.meta_revision).where(
+                Project.code.in_(codes), Project.active
+            )
+        )
+        result = {}
+        for row in rows:
+            # References are expanded by the client, against its own process
+            # environment.
+            env, versions = unexpanded_env(row["code"], row["name"], row["meta"])
+            result[row["code"]] = {
+                "code": row["code"],
+                "name": row["name"],
+                "revision": row["meta_revision"],
+                "versions": versions,
+                "env": env,
+            }
+        return result
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Return request, cache hit, coalesced request and query counts by op."""
+        return {op: dict(batcher.stats) for op, batcher in self._batchers.items()}
+
+    def clear(self):
+        """Forget every cached result."""
+        for batcher in self._batchers.values():
+            batcher.clear()
+
+    async def handle(self, op: str, args: Sequence[Any]) -> Any:
+        """Return result of op request."""
+        if op == "stats":
+            return self.stats()
+        batcher = self._batchers.get(op)
+        if batcher is None:
+            msg = f"Unknown service op {op!r}."
+            raise errors.DbServiceError(msg)
+        key = args[0] if len(args) == 1 else tuple(args)
+        return await batcher.get(key)
+
+    async def _poll_changes(self):
+        """Clear caches when database change log moves."""
+        while True:
+            await asyncio.sleep(CHANGES_POLL_INTERVAL)
+            try:
+                async with aio.AsyncDbQueryContext() as db:
+                    sequence = await db.scalar(select(func.max(ChangeLog.sequence))) or 0
+            except Exception:
+                logger.exception("Database change log check failed.")
+                continue
+            if sequence != self._sequence:
+                self._sequence = sequence
+                self.clear()
+
+    async def start(self):
+        """Open service socket and start watching database changes."""
+        async with aio.AsyncDbQueryContext() as db:
+            self._sequence = await db.scalar(select(func.max(ChangeLog.sequence))) or 0
+
+        await self._listen()
+        self._poll_task = asyncio.create_task(self._poll_changes())
+        logger.info("Atlas query service listening on %s", self.address)
+
+    async def close(self):
+        """Stop service and close database connections."""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._poll_task
+        await self._stop_listening()
+        await aio.dispose_engines()
+
+    async def serve_forever(self):
+        """Start service and serve until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+
+class LineClient:
+    """Blocking json lines client, keeping its connection open.
+
+    Server errors are raised as atlas_db.errors exceptions of the same name,
+    other errors as DbServiceError.
+    """
+
+    def __init__(self, address: str, timeout: float = 10.0):
+        self.address = address
+        self._timeout = timeout
+        self._socket: socket.socket | None = None
+        self._stream = None
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        kind, location = parse_address(self.address)
+        if kind == "unix":
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(self._timeout)
+            self._socket.connect(location)
+        else:
+            self._socket = socket.create_connection(location, timeout=self._timeout)
+        self._stream = self._socket.makefile("rb")
+
+    def close(self):
+        """Close service connection."""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def requests(self, op: str, args_list: Sequence[Sequence[Any]]) -> list[Any]:
+        """Send op requests in one write and return their results in order."""
+        with self._lock:
+            if self._socket is None:
+                self._connect()
+            ids = [next(self._ids) for _ in args_list]
+            payload = b"".join(
+                json.dumps({"id": request_id, "op": op, "args": list(args)}).encode()
+                + b"\n"
+                for request_id, args in zip(ids, args_list, strict=True)
+            )
+            try:
+                self._socket.sendall(payload)
+                responses = {}
+                while len(responses) < len(ids):
+                    line = self._stream.readline()
+                    if not line:
+                        msg = f"Service {self.address} closed connection."
+                        raise errors.DbServiceError(msg)
+                    response = json.loads(line)
+                    responses[response["id"]] = response
+            except (OSError, errors.DbServiceError):
+                self.close()
+                raise
+
+        results = []
+        for request_id in ids:
+            response = responses[request_id]
+            error = response.get("error")
+            if error is not None:
+                error_type = getattr(errors, error["type"], None)
+                if not isinstance(error_type, type) or not issubclass(
+                    error_type, Exception
+                ):
+                    error_type = errors.DbServiceError
+                raise error_type(error["message"])
+            results.append(response["result"])
+        return results
+
+    def request(self, op: str, *args: Any) -> Any:
+        """Send one op request and return its result."""
+        return self.requests(op, [args])[0]
+
+
+class ServiceClient(LineClient):
+    """Blocking client of local query service."""
+
+    def __init__(self, address: str | None = None, timeout: float = 10.0):
+        super().__init__(address or get_address(), timeout)
+
+    def project(self, code: str) -> dict[str, Any]:
+        """Return active project row of code."""
+        return self.request("project", code)
+
+    def asset(self, project_code: str, code: str, asset_type_code: str) -> dict[str, Any]:
+        """Return active asset row."""
+        return self.request("asset", project_code, code, asset_type_code)
+
+    def assets(self, project_code: str, keys: Sequence[tuple[str, str]]) -> list[dict]:
+        """Return active asset rows of (asset code, asset type code) pairs."""
+        return self.requests("asset", [(project_code, *key) for key in keys])
+
+    def task(
+        self,
+        project_code: str,
+        asset_code: str,
+        asset_type_code: str,
+        task_type_code: str,
+    ) -> dict[str, Any]:
+        """Return active task row."""
+        return self.request(
+            "task", project_code, asset_code, asset_type_code, task_type_code
+        )
+
+    def latest_publish(self, task_id: int, publish_type_code: str) -> dict[str, Any]:
+        """Return last version active publish row of task and publish type."""
+        return self.request("latest_publish", task_id, publish_type_code)
+
+    def publish_by_path(self, path: str) -> dict[str, Any]:
+        """Return publish row of path."""
+        return self.request("publish_by_path", path)
+
+    def project_env(self, code: str) -> ProjectEnv:
+        """Return project environment, expanded with current process environment."""
+        data = self.request("project_env", code)
+        return ProjectEnv(
+            data["code"],
+            data["name"],
+            data["revision"],
+            data["versions"],
+            expand_env(data["env"], os.environ),
+        )
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Return service request statistics."""
+        return self.request("stats")
+
+
+def main(argv: list[str] | None = None):
+    """Query service command line entry point."""
+    parser = argparse.ArgumentParser(description="Atlas local query service.")
+    parser.add_argument(
+        "--address",
+        default=get_address(),
+        help="unix:<socket path> or tcp:<host>:<port>, default from ATLAS_DB_SERVICE.",
+    )
+    parser.add_argument("--window", type=float, default=BATCH_WINDOW)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(QueryService(args.address, args.window).serve_forever())
+
+
+if __name__ == "__main__":
+    main()
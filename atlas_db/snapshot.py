@@ -0,0 +1,150 @@
+"""Database snapshot module.
+
+Export a read only copy of the catalog to a sqlite file. Processes that mostly
+read, like render farm jobs, set ATLAS_DB_SNAPSHOT environment variable to
+this file (or call use_snapshot), and make their reads in context.read_only
+blocks, so these query contexts never reach the database::
+
+    with context.read_only():
+        publish = task.get_latest_publish(publish_type)
+
+Other query contexts and commit contexts still use the database, reads
+deciding what to write never see an outdated snapshot.
+
+Snapshot version is the change log sequence counter when it was exported. It
+is kept by sqlite for the AUTOINCREMENT change log and never goes backwards,
+pruned changes included.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import os
+import sqlite3
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+
+from atlas_db import context
+from atlas_db.models import BackfillProgress
+from atlas_db.models import Base
+from atlas_db.models import ChangeLog
+from atlas_db.models import PublishArchive
+from atlas_db.models import PublishSizeRollup
+
+
+# Tables created empty in snapshot, they are only useful to writers, or cold.
+SKIPPED_TABLES = {
+    BackfillProgress.__tablename__,
+    ChangeLog.__tablename__,
+    PublishArchive.__tablename__,
+    PublishSizeRollup.__tablename__,
+}
+
+SNAPSHOT_INFO_TABLE = "snapshot_info"
+
+# Last sequence ever given to a change, 0 if none.
+_SEQUENCE_COUNTER_SQL = (
+    "SELECT coalesce(max(seq), 0) FROM main.sqlite_sequence "
+    f"WHERE name = '{ChangeLog.__tablename__}'"
+)
+
+
+def _database_file() -> str:
+    """Return database file path, snapshots are only supported on sqlite."""
+    url = make_url(context.get_db_path())
+    if url.get_backend_name() != "sqlite" or not url.database:
+        msg = f"Snapshot needs a sqlite database file, not {url!r}."
+        raise ValueError(msg)
+    return url.database
+
+
+def _database_sequence() -> int:
+    """Return database change sequence counter, even if a snapshot is in use."""
+    with context.get_engine().connect() as connection:
+        return connection.exec_driver_sql(_SEQUENCE_COUNTER_SQL).scalar()
+
+
+def export_snapshot(path: str) -> int:
+    """Write catalog snapshot to path and return its version.
+
+    Version is the change sequence counter of the copied database state. All
+    tables are copied in a single read transaction, then the file atomically
+    replaces previous snapshot: readers with the previous file opened keep
+    reading it until they reopen it.
+    """
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with contextlib.suppress(FileNotFoundError):
+        os.remove(temp_path)
+
+    engine = create_engine(f"sqlite:///{temp_path}")
+    Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    connection = sqlite3.connect(_database_file(), isolation_level=None)
+    try:
+        connection.execute("ATTACH DATABASE ? AS snapshot", (temp_path,))
+        connection.execute("BEGIN")
+        # First read of the transaction, copies below see the same changes.
+        (version,) = connection.execute(_SEQUENCE_COUNTER_SQL).fetchone()
+        for table in Base.metadata.sorted_tables:
+            if table.name in SKIPPED_TABLES:
+                continue
+            columns = ", ".join(f'"{column.name}"' for column in table.columns)
+            connection.execute(
+                f'INSERT INTO snapshot."{table.name}" ({columns}) '
+                f'SELECT {columns} FROM main."{table.name}"'
+            )
+        connection.execute(
+            f"CREATE TABLE snapshot.{SNAPSHOT_INFO_TABLE} "
+            "(version INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        connection.execute(
+            f"INSERT INTO snapshot.{SNAPSHOT_INFO_TABLE} VALUES (?, ?)",
+            (version, time.time()),
+        )
+        connection.execute("COMMIT")
+        connection.execute("DETACH DATABASE snapshot")
+    finally:
+        connection.close()
+
+    connection = sqlite3.connect(temp_path, isolation_level=None)
+    try:
+        connection.execute("ANALYZE")
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+
+    os.replace(temp_path, path)
+    return version
+
+
+def snapshot_version(path: str) -> tuple[int, float]:
+    """Return snapshot version and creation timestamp."""
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        version, created_at = connection.execute(
+            f"SELECT version, created_at FROM {SNAPSHOT_INFO_TABLE}"
+        ).fetchone()
+    finally:
+        connection.close()
+    return version, created_at
+
+
+def is_snapshot_stale(path: str) -> bool:
+    """Return True if database changed since snapshot was exported."""
+    version, _ = snapshot_version(path)
+    return _database_sequence() > version
+
+
+def use_snapshot(path: str | None):
+    """Serve read only query contexts from given snapshot file, or database if None.
+
+    Calling it again with the same path reopens the file, to read a snapshot
+    exported since.
+    """
+    previous = context.get_snapshot_path()
+    context.set_snapshot_path(path)
+    if previous is not None:
+        context.get_snapshot_engine(previous).dispose()
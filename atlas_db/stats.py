@@ -0,0 +1,328 @@
+"""Database storage statistics module."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from typing import TYPE_CHECKING
+
+from sqlalchemy import and_
+from sqlalchemy import case
+from sqlalchemy import delete
+from sqlalchemy import event
+from sqlalchemy import func
+from sqlalchemy import inspect
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Asset
+from atlas_db.models import AssetType
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishSizeRollup
+from atlas_db.models import PublishType
+from atlas_db.models import Setting
+from atlas_db.models import Task
+from atlas_db.models import TaskType
+
+
+if TYPE_CHECKING:
+    from collections.abc import Mapping
+    from collections.abc import Sequence
+
+    from sqlalchemy import Connection
+    from sqlalchemy import Row
+
+
+# Setting holding "1" when rollup is enabled, see enable_rollup.
+ROLLUP_SETTING = "publish_size_rollup"
+# Publish columns a publish rollup row depends on.
+ROLLUP_COLUMNS = frozenset({"active", "size", "task_id", "publish_type_id"})
+
+# Group name: (identity column, label column).
+GROUP_COLUMNS = {
+    "project": (Project.id, Project.code),
+    "asset_type": (AssetType.id, AssetType.code),
+    "asset": (Asset.id, Asset.code),
+    "task_type": (TaskType.id, TaskType.code),
+    "publish_type": (PublishType.id, PublishType.code),
+}
+
+
+def _group_columns(group_by: Sequence[str]) -> tuple[list, list]:
+    """Return identity and labelled columns for given group names."""
+    unknown = set(group_by) - set(GROUP_COLUMNS)
+    if unknown:
+        msg = f"Unknown storage group(s) {sorted(unknown)}, use {list(GROUP_COLUMNS)}."
+        raise ValueError(msg)
+
+    identities = [GROUP_COLUMNS[name][0] for name in group_by]
+    labels = [GROUP_COLUMNS[name][1].label(name) for name in group_by]
+    return identities, labels
+
+
+def storage_stats(
+    group_by: Sequence[str] = ("project",),
+    project_code: str | None = None,
+    active_only: bool = False,
+) -> list[Row]:
+    """Return publish storage statistics grouped by given group names.
+
+    Each row holds the group labels followed by total_size, count and
+    latest_size, the size of the last version of each version stream only
+    (see Publish.version_stream).
+    Everything is computed by the database in a single GROUP BY query.
+    """
+    identities, labels = _group_columns(group_by)
+
+    stream = Publish.version_stream()
+    latest_filter = [Publish.active] if active_only else []
+    latest = (
+        select(*stream, func.max(Publish.version).label("version"))
+        .where(*latest_filter)
+        .group_by(*stream)
+        .subquery()
+    )
+    latest_size = case((latest.c.version.is_not(None), Publish.size), else_=0)
+
+    statement = (
+        select(
+            *labels,
+            func.sum(Publish.size).label("total_size"),
+            func.count(Publish.id).label("count"),
+            func.sum(latest_size).label("latest_size"),
+        )
+        .select_from(Publish)
+        .join(Task, Publish.task_id == Task.id)
+        .join(TaskType, Task.task_type_id == TaskType.id)
+        .join(Asset, Task.asset_id == Asset.id)
+        .join(AssetType, Asset.asset_type_id == AssetType.id)
+        .join(Project, Asset.project_id == Project.id)
+        .join(PublishType, Publish.publish_type_id == PublishType.id)
+        .outerjoin(
+            latest,
+            and_(
+                *(latest.c[column.key] == column for column in stream),
+                latest.c.version == Publish.version,
+            ),
+        )
+        .group_by(*identities, *labels)
+        .order_by(*labels)
+    )
+    if active_only:
+        statement = statement.where(Publish.active)
+    if project_code is not None:
+        statement = statement.where(Project.code == project_code)
+
+    with DbQueryContext() as db:
+        rows = db.execute(statement).all()
+
+    return rows
+
+
+def rollup_stats(
+    group_by: Sequence[str] = ("project",),
+    project_code: str | None = None,
+) -> list[Row]:
+    """Return active publish storage statistics from the rollup table.
+
+    Rows hold the group labels followed by total_size and count. The rollup
+    table only has one row by task and publish type, so this query stays fast
+    whatever the publish count is. Rollup must be enabled (see enable_rollup).
+    """
+    identities, labels = _group_columns(group_by)
+    statement = (
+        select(
+            *labels,
+            func.sum(PublishSizeRollup.total_size).label("total_size"),
+            func.sum(PublishSizeRollup.count).label("count"),
+        )
+        .select_from(PublishSizeRollup)
+        .join(Task, PublishSizeRollup.task_id == Task.id)
+        .join(TaskType, Task.task_type_id == TaskType.id)
+        .join(Asset, Task.asset_id == Asset.id)
+        .join(AssetType, Asset.asset_type_id == AssetType.id)
+        .join(Project, Asset.project_id == Project.id)
+        .join(PublishType, PublishSizeRollup.publish_type_id == PublishType.id)
+        .group_by(*identities, *labels)
+        .order_by(*labels)
+    )
+    if project_code is not None:
+        statement = statement.where(Project.code == project_code)
+
+    with DbQueryContext() as db:
+        rows = db.execute(statement).all()
+
+    return rows
+
+
+def rebuild_rollup():
+    """Recompute rollup table from publish table.
+
+    Needed once after enabling rollup on an existing database, or after
+    writes made while it was disabled.
+    """
+    statement = (
+        select(
+            Publish.task_id,
+            Publish.publish_type_id,
+            func.sum(Publish.size),
+            func.count(Publish.id),
+        )
+        .where(Publish.active)
+        .group_by(Publish.task_id, Publish.publish_type_id)
+    )
+    with DbCommitContext() as db:
+        db.execute(delete(PublishSizeRollup))
+        db.execute(
+            insert(PublishSizeRollup).from_select(
+                ["task_id", "publish_type_id", "total_size", "count"],
+                statement,
+            )
+        )
+
+
+def _publish_deltas(session: Session) -> dict[tuple[int, int], list[int]]:
+    """Return size and count deltas by task and publish type for flushed publishes."""
+    deltas: dict[tuple[int, int], list[int]] = defaultdict(lambda: [0, 0])
+
+    def _add(key: tuple[int, int], size: int, sign: int):
+        delta = deltas[key]
+        delta[0] += sign * size
+        delta[1] += sign
+
+    def _previous(publish: Publish, name: str):
+        history = inspect(publish).attrs[name].history
+        return history.deleted[0] if history.deleted else getattr(publish, name)
+
+    for publish in session.new:
+        if isinstance(publish, Publish) and publish.active:
+            _add((publish.task_id, publish.publish_type_id), publish.size, 1)
+
+    for publish in session.deleted:
+        if isinstance(publish, Publish) and _previous(publish, "active"):
+            _add(
+                (_previous(publish, "task_id"), _previous(publish, "publish_type_id")),
+                _previous(publish, "size"),
+                -1,
+            )
+
+    for publish in session.dirty:
+        if not isinstance(publish, Publish) or not session.is_modified(publish):
+            continue
+        # Previous row state leaves the rollup, current one enters it.
+        if _previous(publish, "active"):
+            _add(
+                (_previous(publish, "task_id"), _previous(publish, "publish_type_id")),
+                _previous(publish, "size"),
+                -1,
+            )
+        if publish.active:
+            _add((publish.task_id, publish.publish_type_id), publish.size, 1)
+
+    return {key: delta for key, delta in deltas.items() if any(delta)}
+
+
+def is_rollup_enabled(db: Session | Connection | None = None) -> bool:
+    """Return True if rollup table is kept updated, see enable_rollup.
+
+    Flag is stored in the database, read in db transaction if given.
+    """
+    statement = select(Setting.value).where(Setting.name == ROLLUP_SETTING)
+    if db is not None:
+        return db.scalar(statement) == "1"
+    with DbQueryContext() as db:
+        return db.scalar(statement) == "1"
+
+
+def apply_rollup_delta(
+    db: Session | Connection, deltas: Mapping[tuple[int, int], Sequence[int]]
+):
+    """Add (size, count) deltas by (task id, publish type id) to rollup table.
+
+    Called by writers updating publish table without the ORM session, in their
+    own transaction. Does nothing when rollup is disabled.
+    """
+    if not deltas or not is_rollup_enabled(db):
+        return
+
+    table = PublishSizeRollup.__table__
+    statement = insert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=["task_id", "publish_type_id"],
+        set_={
+            "total_size": table.c.total_size + statement.excluded.total_size,
+            "count": table.c.count + statement.excluded.count,
+        },
+    )
+    db.execute(
+        statement,
+        [
+            {
+                "task_id": task_id,
+                "publish_type_id": publish_type_id,
+                "total_size": size,
+                "count": count,
+            }
+            for (task_id, publish_type_id), (size, count) in deltas.items()
+        ],
+    )
+
+
+def publish_rollup_deltas(
+    db: Session | Connection, model: type, ids: Sequence[int], sign: int = 1
+) -> dict[tuple[int, int], tuple[int, int]]:
+    """Return rollup deltas of active publishes of given ids, read from model table.
+
+    Sign is -1 for publishes about to leave the publish table.
+    """
+    statement = (
+        select(
+            model.task_id,
+            model.publish_type_id,
+            func.sum(model.size),
+            func.count(model.id),
+        )
+        .where(model.id.in_(ids), model.active)
+        .group_by(model.task_id, model.publish_type_id)
+    )
+    return {
+        (task_id, publish_type_id): (sign * size, sign * count)
+        for task_id, publish_type_id, size, count in db.execute(statement)
+    }
+
+
+def _on_after_flush(session: Session, _flush_context):
+    """Apply flushed publish deltas to rollup table."""
+    apply_rollup_delta(session.connection(), _publish_deltas(session))
+
+
+# Every ORM session flush is tracked, applied only when rollup is enabled.
+event.listen(Session, "after_flush", _on_after_flush)
+
+
+def _set_rollup_enabled(enabled: bool):
+    value = "1" if enabled else "0"
+    with DbCommitContext() as db:
+        db.execute(
+            insert(Setting)
+            .values(name=ROLLUP_SETTING, value=value)
+            .on_conflict_do_update(index_elements=["name"], set_={"value": value})
+        )
+
+
+def enable_rollup():
+    """Keep rollup table updated on publish insertion, edition or deletion.
+
+    Flag is stored in the database, so every process writing publishes keeps
+    the rollup updated from then on. ORM session flushes are tracked, other
+    publish writers of atlas_db call apply_rollup_delta.
+    """
+    _set_rollup_enabled(True)
+
+
+def disable_rollup():
+    """Stop rollup table updates, in every process."""
+    _set_rollup_enabled(False)
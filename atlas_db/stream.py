@@ -0,0 +1,118 @@
+"""Database streaming module."""
+
+from __future__ import annotations
+
+import csv
+
+from typing import TYPE_CHECKING
+
+from sqlalchemy import select
+
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Asset
+from atlas_db.models import AssetType
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import PublishType
+from atlas_db.models import Task
+from atlas_db.models import TaskType
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from sqlalchemy import Row
+    from sqlalchemy import Select
+
+
+DEFAULT_BATCH_SIZE = 10000
+
+PUBLISH_EXPORT_HEADERS = (
+    "id",
+    "project",
+    "asset_type",
+    "asset",
+    "task_type",
+    "publish_type",
+    "code",
+    "version",
+    "release",
+    "path",
+    "size",
+    "created_at",
+    "active",
+)
+
+
+def stream_rows(
+    statement: Select, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[list[Row]]:
+    """Yield statement result rows by batches of batch_size.
+
+    Rows are fetched with a server side cursor, only one batch is held in memory
+    at a time. Statement should select columns rather than models to get light
+    row tuples instead of ORM instances.
+    """
+    statement = statement.execution_options(
+        yield_per=batch_size,
+        stream_results=True,
+    )
+    with DbQueryContext() as db:
+        result = db.execute(statement)
+        yield from result.partitions()
+
+
+def publish_export_statement(project_code: str | None = None) -> Select:
+    """Return publish export statement, filtered by project if given."""
+    statement = (
+        select(
+            Publish.id,
+            Project.code,
+            AssetType.code,
+            Asset.code,
+            TaskType.code,
+            PublishType.code,
+            Publish.code,
+            Publish.version,
+            Publish.release,
+            Publish.path,
+            Publish.size,
+            Publish.created_at,
+            Publish.active,
+        )
+        .select_from(Publish)
+        .join(Task, Publish.task_id == Task.id)
+        .join(TaskType, Task.task_type_id == TaskType.id)
+        .join(Asset, Task.asset_id == Asset.id)
+        .join(AssetType, Asset.asset_type_id == AssetType.id)
+        .join(Project, Asset.project_id == Project.id)
+        .join(PublishType, Publish.publish_type_id == PublishType.id)
+        .order_by(Publish.id)
+    )
+    if project_code is not None:
+        statement = statement.where(Project.code == project_code)
+
+    return statement
+
+
+def export_publishes(
+    path: str,
+    project_code: str | None = None,
+    delimiter: str = ",",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Export publishes to a csv file and return exported row count.
+
+    Memory usage does not depend on the publish count: rows are written as soon
+    as their batch is fetched.
+    """
+    count = 0
+    statement = publish_export_statement(project_code)
+    with open(path, "w", newline="", encoding="utf-8") as stream:
+        writer = csv.writer(stream, delimiter=delimiter)
+        writer.writerow(PUBLISH_EXPORT_HEADERS)
+        for rows in stream_rows(statement, batch_size):
+            writer.writerows(rows)
+            count += len(rows)
+
+    return count
@@ -0,0 +1,316 @@
+"""Publish verification module.
+
+Stat and hash publish files to fill in publish size, checksum and mtime_ns::
+
+    report = verify_publishes("P")
+    print(report.summary())
+
+Files are hashed in parallel by a thread pool (hashlib releases the GIL while
+hashing), or a process pool, reading through a reused buffer per worker and
+memory mapping large files. Incremental runs skip files whose size and
+modification time did not change since their last verification.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import mmap
+import os
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
+from typing import NamedTuple
+
+from sqlalchemy import bindparam
+from sqlalchemy import select
+from sqlalchemy import update
+
+from atlas_db.changes import log_bulk_changes
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import CHANGE_UPDATE
+from atlas_db.models import Asset
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import Task
+from atlas_db.stats import apply_rollup_delta
+from atlas_db.stats import is_rollup_enabled
+from atlas_db.stats import publish_rollup_deltas
+
+
+BATCH_SIZE = 1000
+# Read buffer size of each worker.
+CHUNK_SIZE = 1 << 20
+# Files from this size on are memory mapped instead of read.
+MMAP_THRESHOLD = 64 << 20
+# Checksum is the hex blake2b digest of this size, in bytes.
+DIGEST_SIZE = 32
+
+_local = threading.local()
+
+_UPDATE_STATEMENT = (
+    update(Publish.__table__)
+    .where(Publish.__table__.c.id == bindparam("b_id"))
+    .values(
+        size=bindparam("b_size"),
+        mtime_ns=bindparam("b_mtime_ns"),
+        checksum=bindparam("b_checksum"),
+    )
+)
+
+
+class FileDigest(NamedTuple):
+    """Size, modification time and checksum of a publish file."""
+
+    publish_id: int
+    size: int | None = None
+    mtime_ns: int | None = None
+    checksum: str | None = None
+    error: str | None = None
+
+
+class VerifyReport:
+    """Publish verification result."""
+
+    def __init__(self):
+        self.checked = 0
+        self.skipped = 0
+        self.updated = 0
+        self.bytes_hashed = 0
+        self.elapsed = 0.0
+        # Ids of publishes whose checksum changed while size and mtime did not.
+        self.mismatched: list[int] = []
+        # (publish id, path, error) of files that could not be read.
+        self.errors: list[tuple[int, str, str]] = []
+
+    @property
+    def throughput(self) -> float:
+        """Return hashed gigabytes per second."""
+        if not self.elapsed:
+            return 0.0
+        return self.bytes_hashed / self.elapsed / 1e9
+
+    def summary(self) -> str:
+        """Return a one line summary of the report."""
+        return (
+            f"{self.checked} checked, {self.skipped} skipped, "
+            f"{self.updated} updated, {len(self.mismatched)} mismatched, "
+            f"{len(self.errors)} errors: {self.bytes_hashed / 1e9:.3f} GB "
+            f"in {self.elapsed:.3f} s ({self.throughput:.3f} GB/s)"
+        )
+
+
+def _buffer() -> memoryview:
+    """Return read buffer of current thread, allocated once."""
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = memoryview(bytearray(CHUNK_SIZE))
+    return buffer
+
+
+def file_digest(path: str) -> tuple[int, int, str]:
+    """Return (size, mtime_ns, checksum) of file at path.
+
+    Size and modification time are read from the opened file, so they match
+    the hashed content.
+
+    Raises:
+        OSError: file cannot be read.
+    """
+    digest = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb", buffering=0) as stream:
+        stat = os.fstat(stream.fileno())
+        if stat.st_size >= MMAP_THRESHOLD:
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                digest.update(mapped)
+        else:
+            buffer = _buffer()
+            while count := stream.readinto(buffer):
+                digest.update(buffer[:count])
+    return stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+def verify_row(row: tuple, incremental: bool) -> FileDigest | None:
+    """Return digest of publish row file, None if skipped as unchanged.
+
+    Row holds publish id, path, size, mtime_ns and checksum.
+    """
+    publish_id, path, size, mtime_ns, checksum = row
+    try:
+        if incremental and checksum is not None:
+            stat = os.stat(path)
+            if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                return None
+        return FileDigest(publish_id, *file_digest(path))
+    except OSError as error:
+        return FileDigest(publish_id, error=str(error))
+
+
+def _publish_statement(project_code: str | None, after: int, limit: int):
+    statement = (
+        select(
+            Publish.id,
+            Publish.path,
+            Publish.size,
+            Publish.mtime_ns,
+            Publish.checksum,
+        )
+        .where(Publish.id > after)
+        .order_by(Publish.id)
+        .limit(limit)
+    )
+    if project_code is not None:
+        statement = (
+            statement.join(Task, Publish.task_id == Task.id)
+            .join(Asset, Task.asset_id == Asset.id)
+            .join(Project, Asset.project_id == Project.id)
+            .where(Project.code == project_code)
+        )
+    return statement
+
+
+def write_digests(digests: list[FileDigest]):
+    """Store digests in publish table, with a single executemany."""
+    ids = [digest.publish_id for digest in digests]
+    with DbCommitContext() as db:
+        # Sizes of verified files replace their registered ones in the rollup.
+        deltas = {}
+        if is_rollup_enabled(db):
+            deltas = publish_rollup_deltas(db, Publish, ids, -1)
+        db.execute(
+            _UPDATE_STATEMENT,
+            [
+                {
+                    "b_id": digest.publish_id,
+                    "b_size": digest.size,
+                    "b_mtime_ns": digest.mtime_ns,
+                    "b_checksum": digest.checksum,
+                }
+                for digest in digests
+            ],
+        )
+        log_bulk_changes(db, Publish, ids, CHANGE_UPDATE)
+        if deltas:
+            for key, (size, count) in publish_rollup_deltas(db, Publish, ids).items():
+                previous_size, previous_count = deltas.get(key, (0, 0))
+                deltas[key] = (previous_size + size, previous_count + count)
+            apply_rollup_delta(db, deltas)
+
+
+def verify_publishes(
+    project_code: str | None = None,
+    incremental: bool = True,
+    workers: int | None = None,
+    processes: bool = False,
+    batch_size: int = BATCH_SIZE,
+    rebaseline: bool = False,
+) -> VerifyReport:
+    """Hash publish files, of given project or of all, and store their digests.
+
+    Publishes are read by batches of batch_size, hashed by workers threads,
+    or processes if processes, then changed digests are written back with one
+    statement per batch. With incremental, files already hashed are skipped
+    when their size and mtime are unchanged.
+
+    Checksums changed while size and mtime did not are reported as mismatched
+    and their stored checksum is kept, so every run reports them again, unless
+    rebaseline stores the new checksum.
+
+    Publish version_id is not bumped, verification does not conflict with user
+    edits. Storage rollup gets the size changes when enabled.
+    """
+    report = VerifyReport()
+    executor_type = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    start = time.perf_counter()
+    after = 0
+
+    with executor_type(max_workers=workers) as executor:
+        while True:
+            with DbQueryContext() as db:
+                rows = [
+                    tuple(row)
+                    for row in db.execute(
+                        _publish_statement(project_code, after, batch_size)
+                    )
+                ]
+            if not rows:
+                break
+            after = rows[-1][0]
+
+            changed = []
+            results = executor.map(
+                verify_row, rows, repeat(incremental), chunksize=16 if processes else 1
+            )
+            for row, digest in zip(rows, results, strict=True):
+                report.checked += 1
+                if digest is None:
+                    report.skipped += 1
+                    continue
+                if digest.error is not None:
+                    report.errors.append((row[0], row[1], digest.error))
+                    continue
+
+                report.bytes_hashed += digest.size
+                _, _, size, mtime_ns, checksum = row
+                if (digest.size, digest.mtime_ns, digest.checksum) == (
+                    size,
+                    mtime_ns,
+                    checksum,
+                ):
+                    continue
+                if (
+                    checksum is not None
+                    and digest.checksum != checksum
+                    and (digest.size, digest.mtime_ns) == (size, mtime_ns)
+                ):
+                    report.mismatched.append(digest.publish_id)
+                    if not rebaseline:
+                        continue
+                changed.append(digest)
+
+            if changed:
+                write_digests(changed)
+                report.updated += len(changed)
+
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+def main(argv: list[str] | None = None):
+    """Publish verification command line entry point."""
+    parser = argparse.ArgumentParser(description="Atlas publish verification.")
+    parser.add_argument("--project", help="Project code, every project if not set.")
+    parser.add_argument("--full", action="store_true", help="Hash unchanged files again.")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument(
+        "--processes", action="store_true", help="Hash in processes, not threads."
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument(
+        "--rebaseline",
+        action="store_true",
+        help="Store checksums of mismatched files as their new reference.",
+    )
+    args = parser.parse_args(argv)
+
+    report = verify_publishes(
+        args.project,
+        incremental=not args.full,
+        workers=args.workers,
+        processes=args.processes,
+        batch_size=args.batch_size,
+        rebaseline=args.rebaseline,
+    )
+    for publish_id, path, error in report.errors:
+        print(f"Publish {publish_id} {path}: {error}")
+    for publish_id in report.mismatched:
+        print(f"Publish {publish_id}: checksum changed, file may be corrupted.")
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
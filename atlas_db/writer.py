@@ -0,0 +1,297 @@
+"""Single writer module.
+
+Many local processes writing to the same sqlite database at once queue on
+its write lock, and hit "database is locked" errors and retry storms. In
+single writer mode, their writes are sent to one writer process instead,
+which applies queued writes together, one transaction by group::
+
+    python -m atlas_db.writer --address unix:/tmp/atlas_db_writer.sock
+
+    export ATLAS_DB_WRITER=unix:/tmp/atlas_db_writer.sock
+    publish = writer.register_publish(task_id, "abc", path, size, "r")
+
+Writes are named operations of WRITE_OPS, called with a commit context
+session and json arguments. Without ATLAS_DB_WRITER, write runs them
+directly in the calling process, so jobs work the same in both modes.
+
+Each write of a group runs in its own savepoint, a failing write is rolled
+back and reported alone. A write result is only returned once its group is
+committed. Groups grow with load: writes received while a group commits
+make the next one. Readers are not involved and keep reading the database,
+or its snapshot, directly.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import logging
+import os
+import tempfile
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+from typing import Any
+
+from sqlalchemy.exc import OperationalError
+
+from atlas_db import dependencies
+from atlas_db.context import DbCommitContext
+from atlas_db.context import get_engine
+from atlas_db.context import is_locked_error
+from atlas_db.context import run_in_transaction
+from atlas_db.errors import DbServiceError
+from atlas_db.helpers import add_publish
+from atlas_db.service import LineClient
+from atlas_db.service import LineServer
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Sequence
+
+    from sqlalchemy.orm import Session
+
+
+logger = logging.getLogger("atlas_db.writer")
+
+WRITER_ADDRESS_ENV = "ATLAS_DB_WRITER"
+DEFAULT_ADDRESS = f"unix:{os.path.join(tempfile.gettempdir(), 'atlas_db_writer.sock')}"
+
+# Seconds a group waits for more writes after its first one.
+GROUP_WINDOW = 0.001
+# Maximum writes committed by a single transaction.
+MAX_GROUP_SIZE = 1000
+
+# Write name: function applying it with a session and json arguments, and
+# returning a json result.
+WRITE_OPS: dict[str, Callable[..., Any]] = {}
+
+_local = threading.local()
+
+
+def get_address() -> str | None:
+    """Return writer address from ATLAS_DB_WRITER environment variable, if set."""
+    return os.environ.get(WRITER_ADDRESS_ENV) or None
+
+
+def write_op(name: str):
+    """Register decorated function as named write operation."""
+
+    def decorator(func: Callable[..., Any]):
+        WRITE_OPS[name] = func
+        return func
+
+    return decorator
+
+
+@write_op("register_publish")
+def _register_publish(
+    db: Session,
+    task_id: int,
+    publish_type_code: str,
+    path: str,
+    size: int,
+    release: str,
+    code: str | None = None,
+) -> dict[str, int]:
+    """Add next version publish, see helpers.add_publish."""
+    publish = add_publish(db, task_id, publish_type_code, path, size, release, code)
+    return {"id": publish.id, "version": publish.version}
+
+
+@write_op("add_dependencies")
+def _add_dependencies(_db: Session, edges: Sequence[Sequence[int]]) -> int:
+    return dependencies.add_dependencies(tuple(edge) for edge in edges)
+
+
+def apply_writes(
+    writes: Sequence[tuple[str, Sequence[Any]]],
+) -> list[tuple[Any, Exception | None]]:
+    """Apply (op, args) writes in one transaction, return (result, error) of each.
+
+    Whole group is run again when database is locked by another writer.
+    """
+
+    def _unit(_db: Session) -> list[tuple[Any, Exception | None]]:
+        outcomes = []
+        for op, args in writes:
+            try:
+                with DbCommitContext() as db:
+                    outcomes.append((WRITE_OPS[op](db, *args), None))
+            except OperationalError as error:
+                if is_locked_error(error):
+                    raise
+                outcomes.append((None, error))
+            except Exception as error:  # noqa: BLE001
+                outcomes.append((None, error))
+        return outcomes
+
+    return run_in_transaction(_unit)
+
+
+class WriterService(LineServer):
+    """Single writer service, see module docstring."""
+
+    def __init__(
+        self,
+        address: str | None = None,
+        window: float = GROUP_WINDOW,
+        max_group_size: int = MAX_GROUP_SIZE,
+    ):
+        super().__init__(address or get_address() or DEFAULT_ADDRESS)
+        self._window = window
+        self._max_group_size = max_group_size
+        self._queue: asyncio.Queue | None = None
+        self._writer_task: asyncio.Task | None = None
+        # Single thread, writes never run concurrently.
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="atlas_db_writer")
+        self._stats = {"writes": 0, "errors": 0, "groups": 0, "max_group_size": 0}
+
+    def stats(self) -> dict[str, int]:
+        """Return write, failed write, group and largest group counts."""
+        return dict(self._stats)
+
+    async def handle(self, op: str, args: Sequence[Any]) -> Any:
+        """Queue write op and return its result once committed."""
+        if op == "stats":
+            return self.stats()
+        if op not in WRITE_OPS:
+            msg = f"Unknown write op {op!r}."
+            raise DbServiceError(msg)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((op, args, future))
+        return await future
+
+    async def _write_groups(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = [await self._queue.get()]
+            if self._window:
+                await asyncio.sleep(self._window)
+            while len(group) < self._max_group_size and not self._queue.empty():
+                group.append(self._queue.get_nowait())
+
+            try:
+                outcomes = await loop.run_in_executor(
+                    self._executor,
+                    apply_writes,
+                    [(op, args) for op, args, _ in group],
+                )
+            except Exception as error:
+                logger.exception("Write group of %d writes failed.", len(group))
+                outcomes = [(None, error)] * len(group)
+
+            self._stats["groups"] += 1
+            self._stats["max_group_size"] = max(self._stats["max_group_size"], len(group))
+            for (_, _, future), (result, error) in zip(group, outcomes, strict=True):
+                self._stats["writes"] += 1
+                if future.done():
+                    continue
+                if error is None:
+                    future.set_result(result)
+                else:
+                    self._stats["errors"] += 1
+                    future.set_exception(error)
+
+    async def start(self):
+        """Open writer socket and start applying queued writes."""
+        # Schema upgrade runs once here, not on the first write group.
+        await asyncio.get_running_loop().run_in_executor(self._executor, get_engine)
+        self._queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._write_groups())
+        await self._listen()
+        logger.info("Atlas writer listening on %s", self.address)
+
+    async def close(self):
+        """Stop service, queued writes not applied yet fail."""
+        await self._stop_listening()
+        if self._writer_task is not None:
+            self._writer_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._writer_task
+        self._executor.shutdown()
+
+    async def serve_forever(self):
+        """Start service and serve until cancelled."""
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+
+class WriterClient(LineClient):
+    """Blocking client of single writer service."""
+
+    def __init__(self, address: str | None = None, timeout: float = 60.0):
+        super().__init__(address or get_address() or DEFAULT_ADDRESS, timeout)
+
+    def stats(self) -> dict[str, int]:
+        """Return writer statistics."""
+        return self.request("stats")
+
+
+def write(op: str, *args: Any) -> Any:
+    """Apply write op and return its result, through writer if ATLAS_DB_WRITER is set.
+
+    Otherwise op is run directly in its own transaction, retried when database
+    is locked.
+
+    Raises:
+        DbServiceError: op does not exist, or writer could not be reached.
+    """
+    address = get_address()
+    if address is None:
+        func = WRITE_OPS.get(op)
+        if func is None:
+            msg = f"Unknown write op {op!r}."
+            raise DbServiceError(msg)
+        return run_in_transaction(lambda db: func(db, *args))
+
+    client = getattr(_local, "client", None)
+    if client is None or client.address != address:
+        client = _local.client = WriterClient(address)
+    return client.request(op, *args)
+
+
+def register_publish(
+    task_id: int,
+    publish_type_code: str,
+    path: str,
+    size: int,
+    release: str,
+    code: str | None = None,
+) -> dict[str, int]:
+    """Add next version publish of task and publish type, return its id and version.
+
+    Goes through writer if ATLAS_DB_WRITER is set.
+    """
+    return write(
+        "register_publish", task_id, publish_type_code, path, size, release, code
+    )
+
+
+def main(argv: list[str] | None = None):
+    """Writer service command line entry point."""
+    parser = argparse.ArgumentParser(description="Atlas single writer service.")
+    parser.add_argument(
+        "--address",
+        default=get_address() or DEFAULT_ADDRESS,
+        help="unix:<socket path> or tcp:<host>:<port>, default from ATLAS_DB_WRITER.",
+    )
+    parser.add_argument("--window", type=float, default=GROUP_WINDOW)
+    parser.add_argument("--max-group-size", type=int, default=MAX_GROUP_SIZE)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(
+            WriterService(args.address, args.window, args.max_group_size).serve_forever()
+        )
+
+
+if __name__ == "__main__":
+    main()
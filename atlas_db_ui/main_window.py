@@ -5,10 +5,14 @@ from __future__ import annotations
 import sys
 
 from Qt import QtCore as qtc
+from Qt import QtGui as qtg
 from Qt import QtWidgets as qtw
 
 from atlas_db import __version__
+from atlas_db import search
+from atlas_db_ui import profiling
 from atlas_db_ui.widgets.entity_type import EntityTypesWidget
+from atlas_db_ui.widgets.search import SearchWidget
 
 
 class AtlasHelp(qtw.QDialog):
@@ -41,6 +45,48 @@ class AtlasHelp(qtw.QDialog):
         btn_ok.clicked.connect(self.accept)
 
 
+class AtlasProfileDialog(qtw.QDialog):
+    """Model profiling statistics window."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle("Model Profile")
+        self.resize(800, 400)
+
+        self._txt_profile = qtw.QPlainTextEdit(self)
+        self._txt_profile.setReadOnly(True)
+        fixed_font = qtg.QFontDatabase.systemFont(qtg.QFontDatabase.FixedFont)
+        self._txt_profile.setFont(fixed_font)
+
+        btn_refresh = qtw.QPushButton("Refresh")
+        btn_reset = qtw.QPushButton("Reset")
+        btn_ok = qtw.QPushButton("Ok")
+
+        lay_main = qtw.QVBoxLayout(self)
+        lay_btn = qtw.QHBoxLayout()
+        lay_btn.addWidget(btn_refresh)
+        lay_btn.addWidget(btn_reset)
+        lay_btn.addStretch()
+        lay_btn.addWidget(btn_ok)
+
+        lay_main.addWidget(self._txt_profile)
+        lay_main.addLayout(lay_btn)
+
+        btn_refresh.clicked.connect(self.refresh)
+        btn_reset.clicked.connect(self._on_btn_reset_clicked)
+        btn_ok.clicked.connect(self.accept)
+
+        self.refresh()
+
+    def refresh(self):
+        """Update profile text from recorded statistics."""
+        self._txt_profile.setPlainText(profiling.dump())
+
+    def _on_btn_reset_clicked(self):
+        profiling.reset()
+        self.refresh()
+
+
 class AtlasMainWindow(qtw.QMainWindow):
     """Atlas main window."""
 
@@ -58,13 +104,33 @@ class AtlasMainWindow(qtw.QMainWindow):
         act_entity_type.triggered.connect(self._manage_entity_type_triggered)
         act_tool.addAction(act_entity_type)
 
+        act_search_index = qtw.QAction("Build Search Index", self)
+        act_search_index.triggered.connect(self._build_search_index_triggered)
+        act_tool.addAction(act_search_index)
+
         self.menu.addMenu(act_tool)
 
+        act_debug = qtw.QMenu("Debug", self)
+
+        act_profile = qtw.QAction("Profile Models", self)
+        act_profile.setCheckable(True)
+        act_profile.setChecked(profiling.is_enabled())
+        act_profile.toggled.connect(self._profile_toggled)
+        act_debug.addAction(act_profile)
+
+        act_profile_dump = qtw.QAction("Show Model Profile", self)
+        act_profile_dump.triggered.connect(self._profile_dump_triggered)
+        act_debug.addAction(act_profile_dump)
+
+        self.menu.addMenu(act_debug)
 
         self.setMenuBar(self.menu)
 
         self.menu.addAction(act_help)
 
+        self._search = SearchWidget(self)
+        self.setCentralWidget(self._search)
+
     def _help_menu_triggered(self):
         dlg = AtlasHelp()
         dlg.exec()
@@ -73,6 +139,24 @@ class AtlasMainWindow(qtw.QMainWindow):
         dlg = EntityTypesWidget(self)
         dlg.show()
 
+    def _build_search_index_triggered(self):
+        qtw.QApplication.setOverrideCursor(qtc.Qt.WaitCursor)
+        try:
+            search.create_search_index()
+        finally:
+            qtw.QApplication.restoreOverrideCursor()
+        self._search.search()
+
+    def _profile_toggled(self, checked: bool):
+        if checked:
+            profiling.enable()
+        else:
+            profiling.disable()
+
+    def _profile_dump_triggered(self):
+        dlg = AtlasProfileDialog(self)
+        dlg.show()
+
 
 if __name__ == "__main__":
     qt_app = qtw.QApplication(sys.argv)
@@ -9,14 +9,17 @@ from Qt import QtCore as qtc
 from sqlalchemy.orm import Query
 from typing_extensions import override
 
-from atlas_db.context import DbCommitContext
 from atlas_db.context import DbQueryContext
+from atlas_db.errors import DbEntityConflictError
+from atlas_db.helpers import update_entity
 from atlas_db.models import Asset
 from atlas_db.models import AssetType
 from atlas_db.models import Base
 from atlas_db.models import Project
 from atlas_db.models import Task
 from atlas_db.models import TaskType
+from atlas_db_ui.profiling import profiled
+from atlas_db_ui.profiling import section
 
 EntityRole = qtc.Qt.UserRole + 1
 
@@ -97,26 +100,35 @@ class EntityItem:
 
 
 class EntityTreeModel(qtc.QAbstractItemModel):
-    """Entity tree model to show entities."""
+    """Entity tree model to show entities, active ones unless include_inactive."""
 
-    def __init__(self, entity_type: type[Base], *args, **kwargs):
+    def __init__(
+        self,
+        entity_type: type[Base],
+        *args,
+        include_inactive: bool = False,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self._entity_type = entity_type
         self._headers, query_args = COLUMN_BY_ENTITY_TYPE[entity_type]
         self._root_item = EntityItem(None, self._headers, None)
         self.entities: list[EntityItem] = []
 
-        with DbQueryContext() as db:
+        with section(self, "query"), DbQueryContext() as db:
             db.expire_on_commit = False
             query = (
                 db.query(self._entity_type, *query_args)
                 .select_from(Task)
                 .join(Asset)
                 .join(TaskType)
-
             )
+            if not include_inactive:
+                query = query.where(self._entity_type.active, Asset.active)
+            query = query.all()
 
-        self._set_items(query)
+        with section(self, "build"):
+            self._set_items(query)
 
     def _set_items(self, entities: list[Query]):
         """Set item in model."""
@@ -156,6 +168,7 @@ class EntityTreeModel(qtc.QAbstractItemModel):
         self.endResetModel()
 
     @override
+    @profiled
     def index(self, row: int, column: int, parent: qtc.QModelIndex | None = None):
         if parent is None:
             parent = qtc.QModelIndex()
@@ -173,6 +186,7 @@ class EntityTreeModel(qtc.QAbstractItemModel):
         return self.createIndex(row, column, child_item)
 
     @override
+    @profiled
     def parent(self, index: qtc.QModelIndex) -> qtc.QModelIndex:
         """Return parent of current node."""
         if not index.isValid():
@@ -186,6 +200,7 @@ class EntityTreeModel(qtc.QAbstractItemModel):
         return self.createIndex(child_item.parent.row(), 0, child_item.parent)
 
     @override
+    @profiled
     def rowCount(self, parent=...):
         parent_item = (
             self._root_item if not parent.isValid() else parent.internalPointer()
@@ -212,6 +227,7 @@ class EntityTreeModel(qtc.QAbstractItemModel):
         return super().flags(index)
 
     @override
+    @profiled
     def data(self, index, role=...):
         if not index.isValid():
             return None
@@ -236,15 +252,11 @@ class EntityTreeModel(qtc.QAbstractItemModel):
 
         entity: EntityItem = index.internalPointer()
         if role == qtc.Qt.CheckStateRole:
+            try:
+                update_entity(entity.data(0, EntityRole), active=value >= 1)
+            except DbEntityConflictError:
+                return False
             entity.columns[index.column()] = value >= 1
-            with DbCommitContext() as db:
-                db_entity = entity.data(0, EntityRole)
-                query = (
-                    db.query(self._entity_type)
-                    .where(self._entity_type.id == db_entity.id)
-                    .first()
-                )
-                query.active = value >= 1
 
             return True
         return False
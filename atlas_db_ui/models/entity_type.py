@@ -2,27 +2,94 @@
 
 from __future__ import annotations
 
+from typing import Any
 from typing import override
 
 from Qt import QtCore as qtc
 
-from atlas_db.context import DbCommitContext
+from atlas_db.changes import changes_since
+from atlas_db.changes import last_sequence
+from atlas_db.context import DbQueryContext
+from atlas_db.errors import DbEntityConflictError
+from atlas_db.helpers import update_entity
+from atlas_db.models import CHANGE_DELETE
 from atlas_db.models import Base
+from atlas_db_ui.profiling import profiled
+from atlas_db_ui.profiling import section
 
 
 ActiveRole = qtc.Qt.UserRole + 1
 
+# Database change polling interval in milliseconds.
+CHANGES_POLL_INTERVAL = 2000
 
-class EntityTypeTableModel(qtc.QAbstractTableModel):
-    """Entity table model object."""
+_ALIGN_CENTER = int(qtc.Qt.AlignCenter)
 
-    def __init__(self, entity_type: type[Base], *args, **kwargs):
+# Internal columns not shown in tables.
+HIDDEN_COLUMNS = {"version_id"}
+
+
+class EntityTypeTableModel(qtc.QAbstractTableModel):
+    """Entity table model object.
+
+    Cell values are copied from entities when they are set, in one list by
+    column, so data() never reads ORM attributes. Active column list holds
+    check states instead of booleans. Inactive entities are only loaded with
+    include_inactive.
+    """
+
+    def __init__(
+        self,
+        entity_type: type[Base],
+        *args,
+        include_inactive: bool = False,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self._entity_type = entity_type
+        self._include_inactive = include_inactive
         self._entities: list[Base] = []
-        self._column_names = entity_type.__table__.columns.keys()
+        self._column_names = [
+            column.key
+            for column in entity_type.__table__.columns
+            if column.key not in HIDDEN_COLUMNS
+        ]
+        self._active_column = (
+            self._column_names.index("active") if "active" in self._column_names else -1
+        )
+        self._values: list[list[Any]] = [[] for _ in self._column_names]
+        self._sequence = 0
+
+    def _row_values(self, entity: Base) -> list[Any]:
+        """Return entity cell values, by column."""
+        values = [getattr(entity, name, None) for name in self._column_names]
+        if self._active_column >= 0:
+            values[self._active_column] = (
+                qtc.Qt.Checked if entity.active else qtc.Qt.Unchecked
+            )
+        return values
+
+    def _set_row(self, row: int, entity: Base):
+        """Replace row entity and cell values."""
+        self._entities[row] = entity
+        for column, value in enumerate(self._row_values(entity)):
+            self._values[column][row] = value
+
+    def _append_rows(self, entities: list[Base]):
+        """Append entities and their cell values."""
+        self._entities.extend(entities)
+        rows = [self._row_values(entity) for entity in entities]
+        for column, values in enumerate(self._values):
+            values.extend(row[column] for row in rows)
+
+    def _remove_row(self, row: int):
+        """Remove row entity and cell values."""
+        del self._entities[row]
+        for values in self._values:
+            del values[row]
 
     @override
+    @profiled
     def rowCount(self, parent=...):
         return len(self._entities)
 
@@ -31,23 +98,22 @@ class EntityTypeTableModel(qtc.QAbstractTableModel):
         return len(self._column_names)
 
     @override
+    @profiled
     def data(self, index, role=...):
         if not index.isValid():
             return None
-        entity = self._entities[index.row()]
         column = index.column()
-        column_name = self._column_names[column]
 
-        if role == qtc.Qt.DisplayRole and column_name != "active":
-            return getattr(entity, column_name, None)
+        if role == qtc.Qt.DisplayRole and column != self._active_column:
+            return self._values[column][index.row()]
         if role == qtc.Qt.UserRole:
-            return entity
+            return self._entities[index.row()]
 
         if role == qtc.Qt.TextAlignmentRole:
-            return int(qtc.Qt.AlignCenter)
+            return _ALIGN_CENTER
 
-        if role == qtc.Qt.CheckStateRole and column_name == "active":
-            return qtc.Qt.Checked if entity.active else qtc.Qt.Unchecked
+        if role == qtc.Qt.CheckStateRole and column == self._active_column:
+            return self._values[column][index.row()]
 
         return None
 
@@ -58,12 +124,14 @@ class EntityTypeTableModel(qtc.QAbstractTableModel):
 
         entity = self._entities[index.row()]
         if role == qtc.Qt.CheckStateRole:
-            with DbCommitContext() as db:
-                loaded_entity = db.query(self._entity_type).where(
-                    self._entity_type.id == entity.id
-                ).first()
-                loaded_entity.active = bool(value)
-            entity.active = bool(value)
+            try:
+                update_entity(entity, active=bool(value))
+            except DbEntityConflictError:
+                # Someone else edited entity, show its current state.
+                self.sync()
+                return False
+            self._set_row(index.row(), entity)
+            self.dataChanged.emit(index, index, [role])
             return True
 
         return False
@@ -88,7 +156,9 @@ class EntityTypeTableModel(qtc.QAbstractTableModel):
     def set_entities(self, entities: list[Base]):
         """Set entities in model."""
         self.beginResetModel()
-        self._entities = entities
+        self._entities = []
+        self._values = [[] for _ in self._column_names]
+        self._append_rows(entities)
         self.endResetModel()
 
     def add_entity(self, entity: Base):
@@ -96,9 +166,9 @@ class EntityTypeTableModel(qtc.QAbstractTableModel):
         self.beginInsertRows(
             qtc.QModelIndex(),
             len(self._entities),
-            len(self._entities) + 1,
+            len(self._entities),
         )
-        self._entities.append(entity)
+        self._append_rows([entity])
         self.endInsertRows()
 
     def get_entity(self, code: str) -> Base | None:
@@ -110,6 +180,75 @@ class EntityTypeTableModel(qtc.QAbstractTableModel):
 
         return entity
 
+    def reload(self):
+        """Load entities from database, active ones unless include_inactive."""
+        sequence = last_sequence()
+        with section(self, "query"), DbQueryContext() as db:
+            query = db.query(self._entity_type)
+            if not self._include_inactive:
+                query = query.where(self._entity_type.active)
+            entities = query.all()
+
+        with section(self, "build"):
+            self.set_entities(entities)
+        self._sequence = sequence
+
+    def sync(self):
+        """Apply entity changes logged in database since last reload or sync.
+
+        Only changed rows are inserted, updated or removed, view selection and
+        scroll position are kept. Sync position only moves once rows are
+        updated, changes are read again by next sync if this one fails.
+        """
+        with section(self, "sync_changes"):
+            changes = changes_since(self._sequence, self._entity_type)
+        if not changes:
+            return
+
+        operation_by_id = {change.entity_id: change.operation for change in changes}
+        changed_ids = [
+            entity_id
+            for entity_id, operation in operation_by_id.items()
+            if operation != CHANGE_DELETE
+        ]
+        with section(self, "query"), DbQueryContext() as db:
+            query = db.query(self._entity_type).where(
+                self._entity_type.id.in_(changed_ids)
+            )
+            if not self._include_inactive:
+                query = query.where(self._entity_type.active)
+            loaded = query.all()
+        loaded_by_id = {entity.id: entity for entity in loaded}
+
+        # Removed rows, from last to first to keep previous row numbers valid.
+        removed_rows = [
+            row
+            for row, entity in enumerate(self._entities)
+            if entity.id in operation_by_id and entity.id not in loaded_by_id
+        ]
+        for row in reversed(removed_rows):
+            self.beginRemoveRows(qtc.QModelIndex(), row, row)
+            self._remove_row(row)
+            self.endRemoveRows()
+
+        # Updated rows.
+        last_column = len(self._column_names) - 1
+        for row, entity in enumerate(self._entities):
+            new_entity = loaded_by_id.pop(entity.id, None)
+            if new_entity is None:
+                continue
+            self._set_row(row, new_entity)
+            self.dataChanged.emit(self.index(row, 0), self.index(row, last_column))
+
+        # Inserted rows.
+        if loaded_by_id:
+            first = len(self._entities)
+            self.beginInsertRows(qtc.QModelIndex(), first, first + len(loaded_by_id) - 1)
+            self._append_rows(list(loaded_by_id.values()))
+            self.endInsertRows()
+
+        self._sequence = changes[-1].sequence
+
 
 class EntityTypeListModel(qtc.QAbstractListModel):
     """Entity table model object."""
@@ -120,11 +259,13 @@ class EntityTypeListModel(qtc.QAbstractListModel):
         self._entities: list[Base] = []
 
     @override
+    @profiled
     def rowCount(self, parent=...):
         return len(self._entities)
 
 
     @override
+    @profiled
     def data(self, index, role=...):
         if not index.isValid():
             return None
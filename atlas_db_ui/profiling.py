@@ -0,0 +1,123 @@
+"""Ui model profiling module.
+
+Count and time model methods called by Qt views, and model query and build
+sections. Profiling is off by default, enable it from the main window Debug
+menu, or by setting ATLAS_UI_PROFILE=1 environment variable.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import functools
+import logging
+import os
+import threading
+import time
+
+from typing import TYPE_CHECKING
+from typing import Any
+
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from collections.abc import Iterator
+
+
+logger = logging.getLogger("atlas_db_ui.profiling")
+
+_enabled = os.environ.get("ATLAS_UI_PROFILE") == "1"
+_lock = threading.Lock()
+# (model class name, method or section name): [call count, total time, max time]
+_stats: dict[tuple[str, str], list[float]] = {}
+
+
+def is_enabled() -> bool:
+    """Return True if profiling is enabled."""
+    return _enabled
+
+
+def enable():
+    """Start recording model calls."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stop recording model calls, recorded statistics are kept."""
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    """Clear recorded statistics."""
+    with _lock:
+        _stats.clear()
+
+
+def _record(owner: str, name: str, elapsed: float):
+    """Add one call of given elapsed time to statistics."""
+    with _lock:
+        stats = _stats.get((owner, name))
+        if stats is None:
+            _stats[owner, name] = [1, elapsed, elapsed]
+            return
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+
+
+def profiled(method: Callable[..., Any]) -> Callable[..., Any]:
+    """Decorate model method to count and time its calls when profiling."""
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not _enabled:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _record(type(self).__name__, name, time.perf_counter() - start)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def section(owner: object, name: str) -> Iterator[None]:
+    """Time block as named section of owner model, like query or build."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(type(owner).__name__, name, time.perf_counter() - start)
+
+
+def report() -> list[tuple[str, str, int, float, float]]:
+    """Return (model, name, calls, total time, max time) rows, slowest first."""
+    with _lock:
+        rows = [
+            (owner, name, int(count), total, maximum)
+            for (owner, name), (count, total, maximum) in _stats.items()
+        ]
+    return sorted(rows, key=lambda row: row[3], reverse=True)
+
+
+def dump() -> str:
+    """Return statistics as a text table, and log it."""
+    header = (
+        f"{'Model':<24}{'Call':<16}{'Count':>10}{'Total ms':>12}"
+        f"{'Mean us':>12}{'Max ms':>10}"
+    )
+    lines = [header]
+    for owner, name, count, total, maximum in report():
+        lines.append(
+            f"{owner:<24}{name:<16}{count:>10}{total * 1e3:>12.2f}"
+            f"{total / count * 1e6:>12.2f}{maximum * 1e3:>10.2f}"
+        )
+    text = "\n".join(lines)
+    logger.info("Model profile:\n%s", text)
+    return text
@@ -12,6 +12,7 @@ from atlas_db.context import DbQueryContext
 from atlas_db.errors import DbAssetTypeAlreadyExistError
 from atlas_db.models import AssetType
 from atlas_db.models import Base
+from atlas_db_ui.models.entity_type import CHANGES_POLL_INTERVAL
 from atlas_db_ui.models.entity_type import EntityTypeTableModel
 
 
@@ -66,7 +67,8 @@ class AssetTypeTableWidget(qtw.QWidget):
         self.setWindowTitle("Asset Type")
 
         self._view = qtw.QTableView(self)
-        self._model = EntityTypeTableModel(AssetType)
+        # Admin table, inactive entities are listed to be activated again.
+        self._model = EntityTypeTableModel(AssetType, include_inactive=True)
 
         self._view.setModel(self._model)
 
@@ -83,23 +85,24 @@ class AssetTypeTableWidget(qtw.QWidget):
         lay_main.addWidget(self._view)
         lay_main.addLayout(lay_btn)
 
+        self._timer = qtc.QTimer(self)
+        self._timer.setInterval(CHANGES_POLL_INTERVAL)
+
         btn_add.clicked.connect(self.add_entity)
         btn_refresh.clicked.connect(self.refresh)
+        self._timer.timeout.connect(self.refresh)
 
         # Init
-        self.refresh()
+        self._model.reload()
+        self._timer.start()
 
     def set_entities(self, entities: list[Base]):
         """Set entities to model."""
         self._model.set_entities(entities)
 
     def refresh(self):
-        """Update asset type table content."""
-        with DbQueryContext() as db:
-            query = db.query(AssetType)
-            entities = list(query)
-
-        self.set_entities(entities)
+        """Apply database changes to asset type table content."""
+        self._model.sync()
 
     def add_entity(self):
         """Add entity to model."""
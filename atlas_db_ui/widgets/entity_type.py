@@ -82,7 +82,8 @@ class EntityTableWidget(qtw.QWidget):
         self.setWindowTitle(f"{self._entity_type.__name__}")
 
         self._view = qtw.QTableView(self)
-        self._model = EntityTypeTableModel(entity_type)
+        # Admin table, inactive entities are listed to be activated again.
+        self._model = EntityTypeTableModel(entity_type, include_inactive=True)
 
         self._view.setModel(self._model)
 
@@ -10,7 +10,11 @@ from Qt import QtWidgets as qtw
 
 from atlas_const import c_db
 from atlas_db.context import DbCommitContext
+from atlas_db.errors import DbEntityConflictError
 from atlas_db.models import Project
+from atlas_db.project_meta import diff_meta
+from atlas_db.project_meta import parse_meta
+from atlas_db.project_meta import update_project
 from atlas_db_ui.models.entity_type import EntityTypeListModel
 
 
@@ -188,22 +192,29 @@ class ProjectEditableWidget(qtw.QWidget):
         if not metadata_text:
             return
 
-        metadata = eval(metadata_text)
+        try:
+            metadata = parse_meta(metadata_text)
+        except ValueError as error:
+            qtw.QMessageBox.critical(
+                self, "Invalid metadata", str(error), qtw.QMessageBox.Ok
+            )
+            return
 
         project = self._lst_projects.model().data(
             self._lst_projects.currentIndex(), role=qtc.Qt.UserRole
         )
-        with DbCommitContext() as db:
-            db.expire_on_commit = False
-            db_project = db.query(Project).filter(Project.id == project.id).first()
-
-            db_project.meta = metadata
-            db_project.code = code
-            db_project.name = name
-
-        project.meta = metadata
-        project.code = code
-        project.name = name
+        patch = diff_meta(project.meta, metadata)
+        try:
+            update_project(project, patch, code=code, name=name)
+        except DbEntityConflictError:
+            qtw.QMessageBox.critical(
+                self,
+                "Project edited meanwhile",
+                f"Project {project.code!r} was edited by someone else, "
+                "reload projects and edit it again.",
+                qtw.QMessageBox.Ok,
+            )
+            return
 
         self.ProjectEdited.emit()
         self._btn_locked.setChecked(True)
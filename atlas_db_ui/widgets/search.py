@@ -0,0 +1,107 @@
+"""Search widget module."""
+
+from __future__ import annotations
+
+import time
+
+from Qt import QtCore as qtc
+from Qt import QtWidgets as qtw
+
+from atlas_db import search
+from atlas_db.models import Asset
+from atlas_db.models import Project
+from atlas_db.models import Publish
+from atlas_db.models import TaskType
+
+
+# Delay in ms between last key stroke and search.
+SEARCH_DELAY = 150
+SEARCH_LIMIT = 200
+
+# Entity types filter, None searches them all.
+ENTITY_TYPE_FILTERS = (
+    ("All", None),
+    ("Project", [Project]),
+    ("Asset", [Asset]),
+    ("Task Type", [TaskType]),
+    ("Publish", [Publish]),
+)
+
+
+class SearchWidget(qtw.QWidget):
+    """Entity search box, with ranked results from atlas_db.search index."""
+
+    EntityActivated = qtc.Signal(str, int)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle("Search")
+        self._search_enabled = False
+
+        self._txt_query = qtw.QLineEdit(self)
+        self._txt_query.setPlaceholderText("Search codes and names, * and ? wildcards")
+        self._txt_query.setClearButtonEnabled(True)
+
+        self._cmb_entity_type = qtw.QComboBox(self)
+        for label, entity_types in ENTITY_TYPE_FILTERS:
+            self._cmb_entity_type.addItem(label, entity_types)
+
+        self._lst_results = qtw.QListWidget(self)
+        self._lbl_status = qtw.QLabel(self)
+
+        lay_main = qtw.QVBoxLayout(self)
+        lay_query = qtw.QHBoxLayout()
+        lay_query.addWidget(self._txt_query)
+        lay_query.addWidget(self._cmb_entity_type)
+
+        lay_main.addLayout(lay_query)
+        lay_main.addWidget(self._lst_results)
+        lay_main.addWidget(self._lbl_status)
+
+        self._timer = qtc.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SEARCH_DELAY)
+
+        self._txt_query.textChanged.connect(self._timer.start)
+        self._txt_query.returnPressed.connect(self.search)
+        self._cmb_entity_type.currentIndexChanged.connect(self.search)
+        self._lst_results.itemActivated.connect(self._on_result_activated)
+        self._timer.timeout.connect(self.search)
+
+    def search(self):
+        """Fill results with entities matching query."""
+        self._timer.stop()
+        self._lst_results.clear()
+        query = self._txt_query.text().strip()
+        if len(query) < search.MIN_INDEXED_LENGTH and not set(query) & {"*", "?"}:
+            self._lbl_status.clear()
+            return
+
+        if not self._search_enabled:
+            self._search_enabled = search.is_search_enabled()
+            if not self._search_enabled:
+                self._lbl_status.setText(
+                    "Search index does not exist, build it from Tool menu."
+                )
+                return
+
+        start = time.perf_counter()
+        hits = search.search(
+            query,
+            entity_types=self._cmb_entity_type.currentData(),
+            limit=SEARCH_LIMIT,
+        )
+        elapsed = (time.perf_counter() - start) * 1000.0
+
+        for hit in hits:
+            item = qtw.QListWidgetItem(
+                f"{hit.text}    ({hit.entity_type.__name__} {hit.field})"
+            )
+            item.setData(qtc.Qt.UserRole, (hit.entity_type.__tablename__, hit.entity_id))
+            self._lst_results.addItem(item)
+
+        self._lbl_status.setText(f"{len(hits)} results in {elapsed:.1f} ms")
+
+    def _on_result_activated(self, item: qtw.QListWidgetItem):
+        table_name, entity_id = item.data(qtc.Qt.UserRole)
+        self.EntityActivated.emit(table_name, entity_id)
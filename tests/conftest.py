@@ -0,0 +1,43 @@
+"""Shared fixtures, each test gets its own database file."""
+
+from __future__ import annotations
+
+import pytest
+
+from atlas_db import context
+from atlas_db import helpers
+from atlas_db.context import DbCommitContext
+from atlas_db.models import AssetType
+from atlas_db.models import Project
+from atlas_db.models import PublishType
+from atlas_db.models import TaskType
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    """Point contexts to an empty database file of the test."""
+    previous = context.get_db_path()
+    previous_snapshot = context.get_snapshot_path()
+    url = f"sqlite:///{tmp_path / 'atlas.db'}"
+    context.set_db_path(url)
+    context.set_snapshot_path(None)
+    yield url
+    context.set_db_path(previous)
+    context.set_snapshot_path(previous_snapshot)
+
+
+@pytest.fixture
+def catalog(db_url):
+    """Create project P with assets hero_0..hero_4, a mod task each, and abc type."""
+    with DbCommitContext() as db:
+        db.add_all(
+            [
+                Project("P", "Project P", {}),
+                AssetType("chr", "character"),
+                TaskType("mod", "modeling"),
+                PublishType("abc", "Alembic cache", ".abc"),
+            ]
+        )
+    helpers.set_task_templates("chr", ["mod"])
+    helpers.create_assets("P", [(f"hero_{index}", "chr") for index in range(5)])
+    return db_url
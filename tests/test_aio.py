@@ -0,0 +1,65 @@
+"""Async context tests."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from atlas_db import aio
+from atlas_db import migrations
+
+
+pytest.importorskip("aiosqlite")
+
+
+def _run(coroutine):
+    async def _main():
+        try:
+            return await coroutine
+        finally:
+            await aio.dispose_engines()
+
+    return asyncio.run(_main())
+
+
+def test_concurrent_get_engine_upgrades_once(db_url, monkeypatch):
+    calls = []
+    upgraded = []
+    upgrade = migrations.upgrade
+
+    def _upgrade(connection):
+        calls.append(connection)
+        applied = upgrade(connection)
+        upgraded.append(True)
+        return applied
+
+    monkeypatch.setattr(migrations, "upgrade", _upgrade)
+
+    async def _engine():
+        engine = await aio.get_engine()
+        # Engine is only returned once upgraded.
+        assert upgraded
+        return engine
+
+    async def _engines():
+        return await asyncio.gather(*(_engine() for _ in range(5)))
+
+    engines = _run(_engines())
+    assert len(set(map(id, engines))) == 1
+    assert len(calls) == 1
+
+
+def test_failed_upgrade_is_not_cached(db_url, monkeypatch):
+    def _upgrade(_connection):
+        raise RuntimeError("upgrade failed")
+
+    async def _engines():
+        with monkeypatch.context() as patch:
+            patch.setattr(migrations, "upgrade", _upgrade)
+            with pytest.raises(RuntimeError):
+                await aio.get_engine()
+        assert aio._engine_by_url == {}
+        return await aio.get_engine()
+
+    assert _run(_engines()) is not None
@@ -0,0 +1,47 @@
+"""Publish archive tests."""
+
+from __future__ import annotations
+
+from atlas_db import archive
+from atlas_db import dependencies
+from atlas_db import helpers
+from atlas_db.context import DbCommitContext
+
+
+def _publish(path: str) -> int:
+    with DbCommitContext() as db:
+        return helpers.add_publish(db, 1, "abc", path, 10, "r").id
+
+
+def test_archived_publish_id_is_never_reused(catalog):
+    model = _publish("/model")
+    lookdev = _publish("/lookdev")
+    dependencies.add_dependencies([(lookdev, model)])
+
+    assert archive.archive_publishes(
+        archive.RetentionPolicy(keep_versions=1, min_age_days=0)
+    ) == 1
+    assert dependencies.upstream(lookdev) == []
+
+    # Highest id is archived, the new publish does not inherit it nor its edges.
+    assert archive.archive_publishes(
+        archive.RetentionPolicy(keep_versions=0, min_age_days=0)
+    ) == 1
+    new = _publish("/new")
+    assert new > lookdev
+    assert dependencies.upstream(new) == []
+    assert dependencies.downstream(new) == []
+
+
+def test_restored_publishes_get_their_edges_back(catalog):
+    model = _publish("/model")
+    lookdev = _publish("/lookdev")
+    dependencies.add_dependencies([(lookdev, model)])
+    archive.archive_publishes(archive.RetentionPolicy(keep_versions=0, min_age_days=0))
+    assert dependencies.upstream(lookdev, cache=True) == []
+
+    # Edge waits for both of its publishes.
+    assert archive.restore_publishes([lookdev]) == 1
+    assert dependencies.upstream(lookdev, cache=True) == []
+    assert archive.restore_publishes([model]) == 1
+    assert dependencies.upstream(lookdev, cache=True) == [model]
@@ -0,0 +1,89 @@
+"""Commit context nesting and unit of work tests."""
+
+from __future__ import annotations
+
+import pytest
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from atlas_db import context
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.context import run_in_transaction
+from atlas_db.context import unit_of_work
+from atlas_db.models import TaskType
+
+
+def _task_type_codes() -> list[str]:
+    with DbQueryContext() as db:
+        return db.scalars(select(TaskType.code).order_by(TaskType.code)).all()
+
+
+def test_nested_context_error_only_rolls_back_savepoint(db_url):
+    with DbCommitContext() as outer:
+        outer.add(TaskType("mod", "modeling"))
+        with pytest.raises(ValueError), DbCommitContext() as inner:
+            assert inner is outer
+            inner.add(TaskType("rig", "rigging"))
+            inner.flush()
+            raise ValueError
+        with DbCommitContext() as inner:
+            inner.add(TaskType("lay", "layout"))
+        # Nothing is committed before the outer context exits.
+        assert _task_type_codes() == []
+
+    assert _task_type_codes() == ["lay", "mod"]
+    assert not context.in_transaction()
+
+
+def test_outer_context_error_rolls_back_nested_contexts(db_url):
+    with pytest.raises(ValueError), DbCommitContext() as outer:
+        outer.add(TaskType("mod", "modeling"))
+        with DbCommitContext() as inner:
+            inner.add(TaskType("rig", "rigging"))
+        raise ValueError
+
+    assert _task_type_codes() == []
+
+
+def test_unit_of_work_retries_when_locked(db_url):
+    calls = []
+
+    @unit_of_work(retries=2, backoff=0)
+    def add_task_type():
+        calls.append(True)
+        with DbCommitContext() as db:
+            db.add(TaskType(f"tt{len(calls)}", f"task type {len(calls)}"))
+            db.flush()
+        if len(calls) < 3:
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        return len(calls)
+
+    assert add_task_type() == 3
+    # Failed attempts were rolled back as a whole.
+    assert _task_type_codes() == ["tt3"]
+
+
+def test_run_in_transaction_raises_last_locked_error(db_url):
+    calls = []
+
+    def locked(_db):
+        calls.append(True)
+        raise OperationalError("INSERT", {}, Exception("database is locked"))
+
+    with pytest.raises(OperationalError):
+        run_in_transaction(locked, retries=2, backoff=0)
+    assert len(calls) == 3
+
+
+def test_run_in_transaction_does_not_retry_other_errors(db_url):
+    calls = []
+
+    def failing(_db):
+        calls.append(True)
+        raise OperationalError("INSERT", {}, Exception("no such table: nope"))
+
+    with pytest.raises(OperationalError):
+        run_in_transaction(failing, retries=2, backoff=0)
+    assert len(calls) == 1
@@ -0,0 +1,36 @@
+"""Entity table model tests, run offscreen."""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from sqlalchemy.exc import OperationalError
+
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+pytest.importorskip("Qt")
+
+from atlas_db import helpers
+from atlas_db.models import Asset
+from atlas_db_ui.models import entity_type
+
+
+def test_failed_sync_is_replayed(catalog, monkeypatch):
+    model = entity_type.EntityTypeTableModel(Asset)
+    model.reload()
+    helpers.create_assets("P", [("hero_5", "chr")])
+
+    def _locked():
+        raise OperationalError("SELECT", {}, Exception("database is locked"))
+
+    with monkeypatch.context() as patch:
+        patch.setattr(entity_type, "DbQueryContext", _locked)
+        with pytest.raises(OperationalError):
+            model.sync()
+    assert model.get_entity("hero_5") is None
+
+    model.sync()
+    assert model.get_entity("hero_5") is not None
+    assert model.rowCount() == 6
@@ -0,0 +1,110 @@
+"""Query plan tests, default active lookups use their partial index."""
+
+from __future__ import annotations
+
+import contextlib
+
+import pytest
+
+from sqlalchemy import event
+
+from atlas_db import context
+from atlas_db import helpers
+from atlas_db import migrations
+from atlas_db import paging
+from atlas_db.context import DbCommitContext
+from atlas_db.models import Asset
+from atlas_db.models import PublishType
+from atlas_db.models import Task
+
+
+@contextlib.contextmanager
+def _recorded_plans():
+    """Yield a list filled with the query plan of each statement run in block."""
+    engine = context.get_engine()
+    statements = []
+
+    def _record(_conn, _cursor, statement, parameters, _context, _executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _record)
+    plans = []
+    try:
+        yield plans
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            rows = connection.exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            ).all()
+            plans.append(" | ".join(row[-1] for row in rows))
+
+
+@pytest.fixture
+def published(catalog):
+    with DbCommitContext() as db:
+        for version in range(1, 4):
+            helpers.add_publish(db, 1, "abc", f"/p{version}", 10, "r")
+    return catalog
+
+
+def _get_asset():
+    helpers.get_project("P").get_asset("hero_1", helpers.get_asset_type("chr"))
+
+
+def _get_task():
+    helpers.entity_by_code(Asset, "hero_1").get_task(helpers.get_task_type("mod"))
+
+
+def _get_latest_publish():
+    with context.DbQueryContext() as db:
+        task = db.get(Task, 1)
+        publish_type = db.get(PublishType, 1)
+    task.get_latest_publish(publish_type)
+
+
+@pytest.mark.parametrize(
+    ("lookup", "index"),
+    [
+        (_get_asset, "ix_asset_active_lookup"),
+        (_get_task, "ix_task_active_lookup"),
+        (_get_latest_publish, "ix_publish_active_latest"),
+    ],
+    ids=["asset", "task", "latest_publish"],
+)
+def test_active_lookup_uses_partial_index(published, lookup, index):
+    with _recorded_plans() as plans:
+        lookup()
+    assert any(f"USING INDEX {index}" in plan for plan in plans), plans
+
+
+def test_deep_page_uses_paging_index(catalog):
+    cursor = paging.page(Asset, {"project_id": 1}, limit=2, order_by="code").cursor
+    with _recorded_plans() as plans:
+        paging.page(Asset, {"project_id": 1}, after=cursor, limit=2, order_by="code")
+
+    (plan,) = plans
+    assert "USING INDEX ix_asset_active_page (project_id=? AND code>?)" in plan, plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_migration_recreates_active_indexes(db_url):
+    engine = context.get_engine()
+    with engine.begin() as connection:
+        for _, name in migrations.ACTIVE_INDEXES:
+            connection.exec_driver_sql(f"DROP INDEX {name}")
+        connection.exec_driver_sql(
+            "CREATE INDEX ix_task_active_lookup ON task (asset_id, task_type_id) "
+            "WHERE active"
+        )
+        migrations._fix_active_indexes(connection)
+        sql = dict(
+            connection.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'index'"
+            ).all()
+        )
+    for _, name in migrations.ACTIVE_INDEXES:
+        assert sql[name].endswith("WHERE active = 1"), sql[name]
+
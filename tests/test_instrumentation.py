@@ -0,0 +1,39 @@
+"""Query instrumentation tests."""
+
+from __future__ import annotations
+
+import pytest
+
+from sqlalchemy import select
+from sqlalchemy import update
+
+from atlas_db import instrumentation
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Asset
+
+
+@pytest.fixture
+def recording(catalog):
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def _stats(prefix: str) -> instrumentation.QueryStats:
+    (stats,) = (
+        stats for stats in instrumentation.report() if stats.sql.startswith(prefix)
+    )
+    return stats
+
+
+def test_rows_count_affected_rows_only(recording):
+    with DbQueryContext() as db:
+        assert len(db.scalars(select(Asset.id)).all()) == 5
+    with DbCommitContext() as db:
+        db.execute(update(Asset).values(active=True))
+
+    assert _stats("SELECT asset.id").rows is None
+    assert _stats("UPDATE asset").rows == 5
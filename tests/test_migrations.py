@@ -0,0 +1,140 @@
+"""Schema migration tests, from a database created before migrations existed."""
+
+from __future__ import annotations
+
+import sqlite3
+
+from sqlalchemy import inspect
+from sqlalchemy import select
+
+from atlas_db import context
+from atlas_db import migrations
+from atlas_db import stats
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Publish
+from atlas_db.models import PublishSizeRollup
+
+
+# Schema of the first released atlas_db version, without migrations.
+BASELINE_SCHEMA = """
+CREATE TABLE project (
+    id INTEGER NOT NULL PRIMARY KEY, code VARCHAR NOT NULL UNIQUE,
+    name VARCHAR NOT NULL, meta JSON NOT NULL, active BOOLEAN NOT NULL
+);
+CREATE TABLE asset_type (
+    id INTEGER NOT NULL PRIMARY KEY, code VARCHAR NOT NULL UNIQUE,
+    name VARCHAR NOT NULL UNIQUE, active BOOLEAN NOT NULL
+);
+CREATE TABLE task_type (
+    id INTEGER NOT NULL PRIMARY KEY, code VARCHAR NOT NULL UNIQUE,
+    name VARCHAR NOT NULL UNIQUE, active BOOLEAN NOT NULL
+);
+CREATE TABLE publish_type (
+    id INTEGER NOT NULL PRIMARY KEY, code VARCHAR NOT NULL UNIQUE,
+    description VARCHAR NOT NULL, extension VARCHAR NOT NULL, active BOOLEAN NOT NULL
+);
+CREATE TABLE asset (
+    id INTEGER NOT NULL PRIMARY KEY, code VARCHAR NOT NULL,
+    asset_type_id INTEGER NOT NULL REFERENCES asset_type (id),
+    project_id INTEGER NOT NULL REFERENCES project (id), active BOOLEAN NOT NULL
+);
+CREATE TABLE task (
+    id INTEGER NOT NULL PRIMARY KEY, asset_id INTEGER NOT NULL REFERENCES asset (id),
+    task_type_id INTEGER NOT NULL REFERENCES task_type (id), active BOOLEAN NOT NULL
+);
+CREATE TABLE publish (
+    id INTEGER NOT NULL PRIMARY KEY, code VARCHAR NOT NULL, path VARCHAR NOT NULL UNIQUE,
+    version INTEGER NOT NULL, release VARCHAR NOT NULL, size INTEGER NOT NULL,
+    publish_type_id INTEGER NOT NULL REFERENCES publish_type (id),
+    task_id INTEGER NOT NULL REFERENCES task (id),
+    created_at DATETIME NOT NULL, active BOOLEAN NOT NULL
+);
+INSERT INTO project VALUES (1, 'P', 'Project P', '{}', 1);
+INSERT INTO asset_type VALUES (1, 'chr', 'character', 1);
+INSERT INTO task_type VALUES (1, 'mod', 'modeling', 1);
+INSERT INTO publish_type VALUES (1, 'abc', 'Alembic cache', '.abc', 1);
+INSERT INTO asset VALUES (1, 'hero', 1, 1, 1);
+INSERT INTO task VALUES (1, 1, 1, 1), (2, 1, 1, 1);
+INSERT INTO publish VALUES
+    (1, 'abc', '/t1_v1', 1, 'r', 10, 1, 1, '2024-01-01 00:00:00', 1),
+    (2, 'abc', '/t1_v2', 2, 'r', 20, 1, 1, '2024-01-01 00:00:00', 1),
+    (3, 'abc', '/t2_v1', 1, 'r', 30, 1, 2, '2024-01-01 00:00:00', 1),
+    (4, 'abc', '/t2_v2', 2, 'r', 40, 1, 2, '2024-01-01 00:00:00', 0);
+"""
+
+
+def _create_baseline(url: str):
+    connection = sqlite3.connect(url.removeprefix("sqlite:///"))
+    connection.executescript(BASELINE_SCHEMA)
+    connection.close()
+
+
+def test_new_database_is_stamped_with_head_version(db_url):
+    with context.get_engine().connect() as connection:
+        assert migrations.schema_version(connection) == migrations.HEAD_VERSION
+    assert migrations.pending_backfills() == []
+
+
+def test_upgrade_baseline_database(db_url):
+    _create_baseline(db_url)
+
+    engine = context.get_engine()
+
+    with engine.connect() as connection:
+        assert migrations.schema_version(connection) == migrations.HEAD_VERSION
+        inspector = inspect(connection)
+        columns = {column["name"] for column in inspector.get_columns("publish")}
+        indexes = {index["name"] for index in inspector.get_indexes("publish")}
+        project_columns = {column["name"] for column in inspector.get_columns("project")}
+        asset_indexes = {index["name"] for index in inspector.get_indexes("asset")}
+    assert {"version_id", "checksum", "mtime_ns", "canonical_id"} <= columns
+    assert {"ix_publish_active_latest", "ix_publish_content"} <= indexes
+    assert {"meta_revision", "version_id"} <= project_columns
+    assert {"ix_asset_active_lookup", "ix_asset_active_page"} <= asset_indexes
+
+    # Existing rows get the column defaults and are usable through the ORM.
+    with DbQueryContext() as db:
+        publish = db.get(Publish, 1)
+        assert publish.version_id == 1
+        assert publish.checksum is None
+
+    assert migrations.pending_backfills() == ["publish_size_rollup"]
+    assert migrations.run_backfills(batch_size=1, pause=0) == {"publish_size_rollup": 2}
+    assert migrations.pending_backfills() == []
+
+    with DbQueryContext() as db:
+        rollup = db.execute(
+            select(
+                PublishSizeRollup.task_id,
+                PublishSizeRollup.total_size,
+                PublishSizeRollup.count,
+            ).order_by(PublishSizeRollup.task_id)
+        ).all()
+    # Inactive publish of task 2 is not counted.
+    assert [tuple(row) for row in rollup] == [(1, 30, 2), (2, 30, 1)]
+    assert [tuple(row) for row in stats.rollup_stats()] == [("P", 60, 3)]
+
+
+def test_upgrade_is_idempotent(db_url):
+    _create_baseline(db_url)
+    with context.get_engine().begin() as connection:
+        assert migrations.upgrade(connection) == []
+
+
+def test_upgrade_never_reuses_publish_ids(db_url):
+    _create_baseline(db_url)
+    with context.get_engine().connect() as connection:
+        sql = dict(
+            connection.exec_driver_sql(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'table'"
+            ).all()
+        )
+        sequence = connection.exec_driver_sql(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'publish'"
+        ).scalar()
+        count = connection.exec_driver_sql("SELECT count(*) FROM publish").scalar()
+    assert "AUTOINCREMENT" in sql["publish"]
+    assert "publish_old" not in sql
+    assert "REFERENCES publish (id)" in sql["publish_dependency"]
+    assert sequence == 4
+    assert count == 4
@@ -0,0 +1,70 @@
+"""Keyset pagination tests."""
+
+from __future__ import annotations
+
+import base64
+import json
+
+import pytest
+
+from atlas_db import helpers
+from atlas_db import paging
+from atlas_db.errors import DbInvalidCursorError
+from atlas_db.models import Asset
+
+
+def _walk(**kwargs) -> list[Asset]:
+    items = []
+    cursor = None
+    while True:
+        page = paging.page(Asset, after=cursor, limit=2, **kwargs)
+        items.extend(page.items)
+        cursor = page.cursor
+        if cursor is None:
+            return items
+
+
+def _forge(*payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def test_pages_walk_every_entity_once(catalog):
+    assert [asset.code for asset in _walk()] == [f"hero_{index}" for index in range(5)]
+    assert [asset.code for asset in _walk(order_by="code", descending=True)] == [
+        f"hero_{index}" for index in reversed(range(5))
+    ]
+
+
+def test_inactive_entities_are_skipped(catalog):
+    helpers.update_entity(helpers.entity_by_code(Asset, "hero_2"), active=False)
+    assert [asset.code for asset in _walk(order_by="code")] == [
+        "hero_0",
+        "hero_1",
+        "hero_3",
+        "hero_4",
+    ]
+    assert len(_walk(order_by="code", include_inactive=True)) == 5
+
+
+def test_cursor_of_another_order_is_rejected(catalog):
+    cursor = paging.page(Asset, limit=2, order_by="code").cursor
+    with pytest.raises(DbInvalidCursorError):
+        paging.page(Asset, after=cursor, order_by="code", descending=True)
+    with pytest.raises(DbInvalidCursorError):
+        paging.page(Asset, after=cursor)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        _forge("code", False, "hero_1"),
+        _forge("code", False, ["hero_1"], 1),
+        _forge("code", False, {"code": "hero_1"}, 1),
+        _forge("code", False, "hero_1", "1"),
+        _forge("code", False, "hero_1", True),
+    ],
+)
+def test_malformed_cursor_is_rejected(catalog, cursor):
+    with pytest.raises(DbInvalidCursorError):
+        paging.page(Asset, after=cursor, order_by="code")
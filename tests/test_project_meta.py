@@ -0,0 +1,53 @@
+"""Project meta edition tests."""
+
+from __future__ import annotations
+
+import pytest
+
+from atlas_db import helpers
+from atlas_db.context import DbCommitContext
+from atlas_db.errors import DbEntityConflictError
+from atlas_db.errors import DbProjectMetaConflictError
+from atlas_db.models import Project
+from atlas_db.project_meta import diff_meta
+from atlas_db.project_meta import patch_project_meta
+from atlas_db.project_meta import update_project
+
+
+@pytest.fixture
+def project(db_url):
+    with DbCommitContext() as db:
+        db.add(Project("P", "Project P", {"fps": 24, "env": {"A": "1"}}))
+    return helpers.get_project("P")
+
+
+def test_save_project_with_meta_change(project):
+    meta = {"fps": 25, "env": {"A": "1", "B": "2"}}
+    update_project(project, diff_meta(project.meta, meta), code="P2", name="Renamed")
+
+    assert (project.code, project.name, project.meta) == ("P2", "Renamed", meta)
+    assert (project.meta_revision, project.version_id) == (1, 2)
+    stored = helpers.get_project("P2")
+    assert (stored.name, stored.meta) == ("Renamed", meta)
+    assert (stored.meta_revision, stored.version_id) == (1, 2)
+
+    # Loaded project stays usable for next edits.
+    update_project(project, diff_meta(project.meta, {"fps": 30}), name="Again")
+    assert helpers.get_project("P2").meta == {"fps": 30}
+
+
+def test_save_project_without_meta_change(project):
+    update_project(project, [], name="Renamed")
+    stored = helpers.get_project("P")
+    assert (stored.name, stored.meta_revision, stored.version_id) == ("Renamed", 0, 2)
+
+
+def test_save_stale_project_conflicts(project):
+    stale = helpers.get_project("P")
+    patch_project_meta(project.id, [{"op": "add", "path": "/x", "value": 1}], 0)
+
+    with pytest.raises(DbEntityConflictError):
+        update_project(stale, [], name="Renamed")
+    with pytest.raises(DbProjectMetaConflictError):
+        patch_project_meta(project.id, [{"op": "add", "path": "/y", "value": 1}], 0)
+    assert helpers.get_project("P").name == "Project P"
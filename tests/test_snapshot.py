@@ -0,0 +1,73 @@
+"""Catalog snapshot tests."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from sqlalchemy import select
+
+from atlas_db import aio
+from atlas_db import changes
+from atlas_db import context
+from atlas_db import helpers
+from atlas_db import snapshot
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Asset
+
+
+def _asset_codes(**kwargs) -> list[str]:
+    with DbQueryContext(**kwargs) as db:
+        return db.scalars(select(Asset.code).order_by(Asset.code)).all()
+
+
+@pytest.fixture
+def snapshot_path(catalog, tmp_path):
+    path = str(tmp_path / "snapshot.db")
+    snapshot.export_snapshot(path)
+    snapshot.use_snapshot(path)
+    yield path
+    snapshot.use_snapshot(None)
+
+
+def test_snapshot_stays_stale_after_pruning(snapshot_path):
+    version, _ = snapshot.snapshot_version(snapshot_path)
+    assert not snapshot.is_snapshot_stale(snapshot_path)
+
+    helpers.create_assets("P", [("hero_5", "chr")])
+    changes.prune_changes(changes.last_sequence())
+    assert changes.last_sequence() == 0
+    assert snapshot.is_snapshot_stale(snapshot_path)
+
+    assert snapshot.export_snapshot(snapshot_path) > version
+    assert not snapshot.is_snapshot_stale(snapshot_path)
+
+
+def test_only_read_only_queries_use_snapshot(snapshot_path):
+    helpers.create_assets("P", [("hero_5", "chr")])
+    exported = [f"hero_{index}" for index in range(5)]
+
+    # Duplicate checks and change polling see every committed change.
+    assert _asset_codes() == [*exported, "hero_5"]
+    assert helpers.entity_by_code(Asset, "hero_5") is not None
+
+    assert _asset_codes(read_only=True) == exported
+    with context.read_only():
+        assert _asset_codes() == exported
+    assert _asset_codes() == [*exported, "hero_5"]
+
+
+def test_async_read_only_queries_use_snapshot(snapshot_path):
+    pytest.importorskip("aiosqlite")
+    helpers.create_assets("P", [("hero_5", "chr")])
+
+    async def _count(**kwargs) -> int:
+        try:
+            async with aio.AsyncDbQueryContext(**kwargs) as db:
+                return len((await db.scalars(select(Asset.id))).all())
+        finally:
+            await aio.dispose_engines()
+
+    assert asyncio.run(_count()) == 6
+    assert asyncio.run(_count(read_only=True)) == 5
@@ -0,0 +1,54 @@
+"""Publish size rollup tests, rollup must match storage statistics."""
+
+from __future__ import annotations
+
+from atlas_db import context
+from atlas_db import helpers
+from atlas_db import stats
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Publish
+
+
+def _publish(task_id: int, path: str, size: int) -> Publish:
+    with DbCommitContext() as db:
+        return helpers.add_publish(db, task_id, "abc", path, size, "r")
+
+
+def _totals(rows) -> list[tuple]:
+    return [(row.project, row.total_size, row.count) for row in rows]
+
+
+def test_rollup_follows_publish_updates(catalog):
+    stats.enable_rollup()
+    publishes = [_publish(1, f"/p{size}", size) for size in (10, 20, 30)]
+
+    helpers.update_entity(publishes[0], active=False)
+    helpers.update_entity(publishes[1], size=25)
+    helpers.update_entity(publishes[2], task_id=2)
+    assert _totals(stats.rollup_stats()) == [("P", 55, 2)]
+    assert _totals(stats.rollup_stats()) == _totals(stats.storage_stats(active_only=True))
+
+    helpers.update_entity(publishes[0], active=True)
+    assert _totals(stats.rollup_stats()) == [("P", 65, 3)]
+    assert _totals(stats.rollup_stats()) == _totals(stats.storage_stats(active_only=True))
+
+
+def test_rollup_flag_is_shared_through_database(catalog):
+    assert not stats.is_rollup_enabled()
+
+    # Another process enables the rollup.
+    with context.get_engine().begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO setting (name, value) VALUES (?, '1')", (stats.ROLLUP_SETTING,)
+        )
+    assert stats.is_rollup_enabled()
+
+    _publish(1, "/p", 10)
+    with DbQueryContext() as db:
+        assert stats.is_rollup_enabled(db)
+    assert _totals(stats.rollup_stats()) == [("P", 10, 1)]
+
+    stats.disable_rollup()
+    _publish(1, "/q", 10)
+    assert _totals(stats.rollup_stats()) == [("P", 10, 1)]
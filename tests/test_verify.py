@@ -0,0 +1,41 @@
+"""Publish verification tests."""
+
+from __future__ import annotations
+
+import os
+
+from atlas_db import helpers
+from atlas_db import verify
+from atlas_db.context import DbCommitContext
+from atlas_db.context import DbQueryContext
+from atlas_db.models import Publish
+
+
+def _checksum(publish_id: int) -> str | None:
+    with DbQueryContext() as db:
+        return db.get(Publish, publish_id).checksum
+
+
+def test_mismatch_keeps_reference_checksum(catalog, tmp_path):
+    path = tmp_path / "model.abc"
+    path.write_bytes(b"good")
+    with DbCommitContext() as db:
+        publish_id = helpers.add_publish(db, 1, "abc", str(path), 4, "r").id
+    verify.verify_publishes(workers=1)
+    reference = _checksum(publish_id)
+
+    # Same size and mtime, different content.
+    stat = path.stat()
+    path.write_bytes(b"evil")
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+    for _ in range(2):
+        report = verify.verify_publishes(incremental=False, workers=1)
+        assert report.mismatched == [publish_id]
+        assert report.updated == 0
+        assert _checksum(publish_id) == reference
+
+    report = verify.verify_publishes(incremental=False, workers=1, rebaseline=True)
+    assert report.mismatched == [publish_id]
+    assert _checksum(publish_id) != reference
+    assert verify.verify_publishes(incremental=False, workers=1).mismatched == []
@@ -0,0 +1,68 @@
+"""Single writer tests."""
+
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+
+from atlas_db import writer
+from atlas_db.errors import DbPublishAlreadyExistError
+from atlas_db.errors import MissingDbTaskError
+
+
+def test_failing_write_does_not_fail_its_group(catalog):
+    outcomes = writer.apply_writes(
+        [
+            ("register_publish", (1, "abc", "/p1", 10, "r")),
+            ("register_publish", (999, "abc", "/p2", 10, "r")),
+            ("register_publish", (1, "abc", "/p1", 10, "r")),
+            ("register_publish", (1, "abc", "/p3", 10, "r")),
+        ]
+    )
+
+    results = [result for result, _ in outcomes]
+    errors = [type(error) if error else None for _, error in outcomes]
+    assert errors == [None, MissingDbTaskError, DbPublishAlreadyExistError, None]
+    assert results[0]["version"] == 1
+    assert results[3]["version"] == 2
+
+
+def test_concurrent_writes_are_grouped(catalog, tmp_path):
+    async def run():
+        service = writer.WriterService(f"unix:{tmp_path / 'writer.sock'}", window=0.05)
+        await service.start()
+        try:
+            results = await asyncio.gather(
+                *(
+                    service.handle("register_publish", (1, "abc", f"/p{index}", 10, "r"))
+                    for index in range(20)
+                )
+            )
+            with pytest.raises(MissingDbTaskError):
+                await service.handle("register_publish", (999, "abc", "/p", 10, "r"))
+            return results, service.stats()
+        finally:
+            await service.close()
+
+    results, stats = asyncio.run(run())
+
+    assert sorted(result["version"] for result in results) == list(range(1, 21))
+    assert stats == {"writes": 21, "errors": 1, "groups": 2, "max_group_size": 20}
+
+
+def test_client_goes_through_writer_service(catalog, tmp_path, monkeypatch):
+    address = f"unix:{tmp_path / 'writer.sock'}"
+
+    async def run():
+        service = writer.WriterService(address)
+        await service.start()
+        try:
+            monkeypatch.setenv(writer.WRITER_ADDRESS_ENV, address)
+            return await asyncio.to_thread(
+                writer.register_publish, 1, "abc", "/p1", 10, "r"
+            )
+        finally:
+            await service.close()
+
+    assert asyncio.run(run())["version"] == 1